@@ -4,7 +4,7 @@ from typing import Any, Dict, List
 
 from .base import tool
 from study_plan_service import generate_study_plan_with_bedrock
-from rag_service import build_context_from_document, call_bedrock_rag, summarize_document
+from rag_service import answer_document_question, call_bedrock_rag, summarize_document
 
 
 @tool
@@ -26,17 +26,9 @@ def generate_study_plan(req: Dict[str, Any]) -> Dict[str, Any]:
 @tool
 def rag_answer(question: str, s3_key: str, top_k: int = 5) -> Dict[str, Any]:
     """Answer a question from a document using RAG."""
-    context, sources = build_context_from_document(question, s3_key, top_k=top_k)
-    if not context:
-        # Try summary-based fallback
-        try:
-            summary = summarize_document(s3_key)
-        except Exception:
-            summary = ""
-        answer = call_bedrock_rag(question, summary or "")
-        return {"answer": answer, "sources": []}
-    answer = call_bedrock_rag(question, context)
-    return {"answer": answer, "sources": sources}
+    # Same path as /tutor/rag-answer, including the semantic answer cache
+    result = answer_document_question(question, s3_key, top_k=top_k)
+    return {"answer": result["answer"], "sources": result["sources"]}
 
 
 @tool
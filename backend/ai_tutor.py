@@ -1,29 +1,17 @@
 # ai_tutor.py
 import os
-import json
-import boto3
+from typing import Iterator
 from dotenv import load_dotenv
+import bedrock_gateway
 from s3_handler import upload_file_to_s3
 from dynamo_handler import save_chat_to_dynamo
 
 load_dotenv()
 
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
 
-bedrock = boto3.client(
-    "bedrock-runtime",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
-
-def process_user_query(user_id: str, user_message: str, attachment_path: str = None) -> str:
-    """Processes user input: uploads attachment, generates AI response, saves chat."""
-    print(f"🧠 Processing query for user: {user_id}")
-
+def _query_prompt(user_id: str, user_message: str, attachment_path: str = None):
+    """Upload the attachment (if any); returns (attachment URL, prompt)."""
     # Step 1: Upload attachment (if any)
     attachment_url = None
     if attachment_path:
@@ -40,25 +28,17 @@ def process_user_query(user_id: str, user_message: str, attachment_path: str = N
 
     Format the response as plain text.
     """
+    return attachment_url, context_prompt
+
+
+def process_user_query(user_id: str, user_message: str, attachment_path: str = None) -> str:
+    """Processes user input: uploads attachment, generates AI response, saves chat."""
+    print(f"🧠 Processing query for user: {user_id}")
+    attachment_url, context_prompt = _query_prompt(user_id, user_message, attachment_path)
 
     # Step 3: Call Bedrock LLM
     try:
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 800,
-            "temperature": 0.7,
-            "messages": [
-                {"role": "user", "content": context_prompt}
-            ]
-        })
-
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=body
-        )
-
-        result = json.loads(response["body"].read())
-        answer = result.get("content", [{}])[0].get("text", "").strip()
+        answer = bedrock_gateway.generate_text(BEDROCK_MODEL_ID, context_prompt, max_tokens=800, temperature=0.7)
 
         # Step 4: Save chat to DynamoDB
         save_chat_to_dynamo(user_id, user_message, answer, attachment_url)
@@ -71,6 +51,26 @@ def process_user_query(user_id: str, user_message: str, attachment_path: str = N
         return "Sorry, I encountered an issue while processing your query."
 
 
+def stream_user_query(user_id: str, user_message: str, attachment_path: str = None) -> Iterator[str]:
+    """Like ``process_user_query``, but yields the response as it is generated.
+
+    The chat is saved once the response is complete.
+    """
+    print(f"🧠 Streaming query for user: {user_id}")
+    attachment_url, context_prompt = _query_prompt(user_id, user_message, attachment_path)
+    parts = []
+    try:
+        for text in bedrock_gateway.stream_text(BEDROCK_MODEL_ID, context_prompt, max_tokens=800, temperature=0.7):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        print(f"❌ Bedrock stream failed: {e}")
+        if not parts:
+            yield "Sorry, I encountered an issue while processing your query."
+        return
+    save_chat_to_dynamo(user_id, user_message, "".join(parts).strip(), attachment_url)
+
+
 def generate_answer_with_context(question: str, context: str) -> str:
     """Generate an answer using provided external context (for RAG)."""
     system_instructions = (
@@ -82,20 +82,7 @@ def generate_answer_with_context(question: str, context: str) -> str:
     )
 
     try:
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 700,
-            "temperature": 0.2,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        })
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=body
-        )
-        result = json.loads(response["body"].read())
-        answer = result.get("content", [{}])[0].get("text", "").strip()
+        answer = bedrock_gateway.generate_text(BEDROCK_MODEL_ID, prompt, max_tokens=700, temperature=0.2)
         return answer or "I don't know based on the provided context."
     except Exception as e:
         return "I couldn't generate an answer with the provided context."
\ No newline at end of file
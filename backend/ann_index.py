@@ -0,0 +1,504 @@
+# ann_index.py
+"""FAISS index construction for the selectable retrieval modes.
+
+Modes:
+    flat      exact brute-force inner product (IndexFlatIP)
+    ivf_flat  inverted file over k-means cells, exact vectors in each cell
+    ivf_pq    inverted file with product-quantized vectors (smallest RAM)
+    hnsw      hierarchical navigable small-world graph (no training)
+
+Vector storage (all modes but ivf_pq, which is always PQ):
+    float32   full precision, 4 bytes per dimension
+    float16   half precision scalar quantizer, 2 bytes per dimension
+    int8      8-bit scalar quantizer trained per dimension, 1 byte per dimension
+    pq        product quantizer, ``pq_m`` bytes per vector (flat and ivf_flat)
+
+Every index is wrapped in IndexIDMap2 so chunk ids survive removal and
+reconstruction. IVF modes, int8 and pq storage are trained on the first
+``train_sample`` vectors that stream in; corpora too small to train a mode
+fall back to flat (and pq storage to int8).
+"""
+
+import os
+import math
+import time
+import shutil
+import logging
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - runtime dependency
+    faiss = None  # type: ignore
+
+
+logger = logging.getLogger("ann_index")
+
+INDEX_MODES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+TRAINED_MODES = ("ivf_flat", "ivf_pq")
+STORAGE_TYPES = ("float32", "float16", "int8", "pq")
+TRAINED_STORAGE = ("int8", "pq")
+
+_SQ_FACTORY = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# Filters admitting at most this many ids are searched exhaustively: flat and
+# HNSW indexes score the allowed vectors directly, IVF indexes probe every list.
+# Also the block size in which allowed vectors are reconstructed and scored
+NARROW_FILTER_IDS = 20000
+# HNSW beam width per requested hit under a filter (filtered-out nodes still use beam slots)
+_FILTERED_EF_PER_HIT = 8
+
+# FAISS k-means wants ~39 training points per centroid; PQ codebooks have 256 entries
+_POINTS_PER_CENTROID = 39
+_PQ_CENTROIDS = 256
+
+# Spill directories of out-of-core builds older than this were left by crashed builds
+_STALE_SPILL_SECONDS = 6 * 3600
+
+
+def _require_faiss() -> None:
+    if faiss is None:
+        raise RuntimeError("faiss-cpu is required. Install with: pip install faiss-cpu")
+
+
+def _largest_divisor_at_most(n: int, limit: int) -> int:
+    for m in range(max(1, min(n, limit)), 0, -1):
+        if n % m == 0:
+            return m
+    return 1
+
+
+def index_mode_of(index) -> str:
+    """Name of the mode an index was built with."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def index_storage_of(index) -> str:
+    """Name of the vector storage an index was built with."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "float16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "float32"
+
+
+def vector_code_bytes(index) -> int:
+    """Bytes each vector's code takes in ``index`` (ids and graph links excluded)."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, faiss.IndexIVF):
+        return int(inner.code_size)
+    return int(inner.sa_code_size())
+
+
+def supports_remove(index) -> bool:
+    return index_mode_of(index) != "hnsw"
+
+
+def selector_unsupported(index) -> bool:
+    """Whether ``index`` cannot search under an id selector (IndexPQ rejects any SearchParameters)."""
+    return index_mode_of(index) == "flat" and index_storage_of(index) == "pq"
+
+
+def search_parameters(
+    index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector=None,
+    filter_size: Optional[int] = None,
+    k: int = 10,
+):
+    """SearchParameters for ``index`` carrying nprobe/efSearch and an optional id selector.
+
+    ``filter_size`` is the number of ids ``selector`` admits; narrow filters
+    search every IVF list and widen the HNSW beam so they still return ``k`` hits.
+    """
+    mode = index_mode_of(index)
+    if mode in TRAINED_MODES:
+        params = faiss.SearchParametersIVF()
+        inner = faiss.downcast_index(index.index)
+        if selector is not None and filter_size is not None and filter_size <= NARROW_FILTER_IDS:
+            params.nprobe = inner.nlist
+        else:
+            params.nprobe = int(nprobe) if nprobe else inner.nprobe
+    elif mode == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        ef = int(ef_search) if ef_search else faiss.downcast_index(index.index).hnsw.efSearch
+        if selector is not None:
+            ef = max(ef, k * _FILTERED_EF_PER_HIT)
+        params.efSearch = ef
+    else:
+        if selector is None:
+            return None
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def search_allowed_exact(index, queries: np.ndarray, allowed: np.ndarray, k: int):
+    """Exact ``(distances, ids)`` of the top-k among ``allowed`` ids, or None if unsupported.
+
+    Reconstructs the allowed vectors (decoded from their codes under
+    float16, int8 or pq storage, so scores match the index's own) and
+    scores them by inner product, NARROW_FILTER_IDS vectors at a time. Used
+    for narrow filters, where graph search under a selector can run out of
+    admissible neighbours, and for every filter on flat+pq indexes, which
+    cannot search under a selector at all.
+    """
+    if index_mode_of(index) in TRAINED_MODES:
+        return None
+    if len(allowed) > NARROW_FILTER_IDS and not selector_unsupported(index):
+        return None
+    allowed = np.asarray(allowed, dtype="int64")
+    queries = np.asarray(queries, dtype="float32")
+    k = min(k, len(allowed))
+    best_scores = np.empty((len(queries), 0), dtype="float32")
+    best_ids = np.empty((len(queries), 0), dtype="int64")
+    for start in range(0, len(allowed), NARROW_FILTER_IDS):
+        block = allowed[start:start + NARROW_FILTER_IDS]
+        scores = np.concatenate([best_scores, queries @ index.reconstruct_batch(block).T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(block, (len(queries), len(block)))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+
+class IndexBuilder:
+    """Incrementally builds (or extends) an ID-mapped index in the chosen mode.
+
+    Vectors passed to ``add`` must already be unit-normalized. For trained
+    modes they are buffered until ``train_sample`` vectors have arrived, then
+    the index is trained on that sample and vectors stream straight in.
+    """
+
+    def __init__(
+        self,
+        mode: str = "flat",
+        train_sample: int = 50000,
+        nlist: int = 0,
+        nprobe: int = 16,
+        pq_m: int = 64,
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        storage: str = "float32",
+        index=None,
+    ):
+        _require_faiss()
+        if mode not in INDEX_MODES:
+            raise ValueError(f"index mode must be one of {', '.join(INDEX_MODES)}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"vector storage must be one of {', '.join(STORAGE_TYPES)}")
+        self.mode = index_mode_of(index) if index is not None else mode
+        self.storage = index_storage_of(index) if index is not None else ("pq" if mode == "ivf_pq" else storage)
+        self.train_sample = max(1, train_sample)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = index
+        self.params: Dict[str, Any] = {}
+        self._buffer: List[np.ndarray] = []
+        self._buffer_ids: List[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+        if not self.needs_training:
+            self.index = self._create(vectors.shape[1], None)
+            self.index.add_with_ids(vectors, ids)
+            return
+        self._buffer.append(vectors)
+        self._buffer_ids.append(ids)
+        self._buffered += len(vectors)
+        if self._buffered >= self.train_sample:
+            self._train_and_flush()
+
+    def finish(self):
+        if self.index is None and self._buffered:
+            self._train_and_flush()
+        return self.index
+
+    def discard(self) -> None:
+        """Drop anything buffered for an index that will not be finished (e.g. a cancelled build)."""
+        self._buffer, self._buffer_ids, self._buffered = [], [], 0
+
+    @property
+    def needs_training(self) -> bool:
+        return self.mode in TRAINED_MODES or self.storage in TRAINED_STORAGE
+
+    # -- internals ---------------------------------------------------------
+
+    def _train_and_flush(self) -> None:
+        sample = np.concatenate(self._buffer)
+        ids = np.concatenate(self._buffer_ids)
+        self._buffer, self._buffer_ids, self._buffered = [], [], 0
+        self.index = self._create(sample.shape[1], sample)
+        self.index.add_with_ids(sample, ids)
+
+    def _create(self, dim: int, sample: Optional[np.ndarray], corpus_size: Optional[int] = None):
+        mode = self.mode
+        n = 0 if sample is None else len(sample)
+        # FAISS wants 39 training points per centroid for each of the 256 PQ sub-quantizer centroids
+        pq_trainable = n >= _PQ_CENTROIDS * _POINTS_PER_CENTROID
+        if mode in TRAINED_MODES:
+            nlist = self.nlist or int(4 * math.sqrt(max(1, corpus_size or n)))
+            nlist = min(nlist, n // _POINTS_PER_CENTROID)
+            if nlist < 2 or (mode == "ivf_pq" and not pq_trainable):
+                logger.warning("Only %d vectors available to train %s; falling back to flat", n, mode)
+                mode = self.mode = "flat"
+        if self.storage == "pq" and (mode == "hnsw" or not pq_trainable):
+            # FAISS' HNSW+PQ only supports L2, which would change what scores mean
+            logger.warning("pq storage is not available for %s with %d vectors; using int8", mode, n)
+            self.storage = "int8"
+        storage = self.storage
+        m = _largest_divisor_at_most(dim, self.pq_m)
+        codec = f"PQ{m}" if storage == "pq" else _SQ_FACTORY[storage]
+        if mode == "flat":
+            inner = faiss.index_factory(dim, codec, faiss.METRIC_INNER_PRODUCT)
+            self.params = {}
+        elif mode == "hnsw":
+            suffix = "" if storage == "float32" else f",{codec}"
+            inner = faiss.index_factory(dim, f"HNSW{self.hnsw_m}{suffix}", faiss.METRIC_INNER_PRODUCT)
+            hnsw = faiss.downcast_index(inner).hnsw
+            hnsw.efConstruction = self.ef_construction
+            hnsw.efSearch = self.ef_search
+            self.params = {"M": self.hnsw_m, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+        elif mode == "ivf_flat":
+            inner = faiss.index_factory(dim, f"IVF{nlist},{codec}", faiss.METRIC_INNER_PRODUCT)
+            self.params = {"nlist": nlist}
+        else:
+            inner = faiss.index_factory(dim, f"IVF{nlist},PQ{m}", faiss.METRIC_INNER_PRODUCT)
+            self.params = {"nlist": nlist}
+        if storage == "pq":
+            self.params["pq_m"] = m
+        self.params["storage"] = storage
+        if not inner.is_trained:
+            t0 = time.time()
+            inner.train(sample)
+            self.params["train_vectors"] = n
+            logger.info("Trained %s/%s on %d vectors in %d ms", mode, storage, n, int((time.time() - t0) * 1000))
+        if mode in TRAINED_MODES:
+            faiss.downcast_index(inner).nprobe = min(self.nprobe, nlist)
+            self.params["nprobe"] = min(self.nprobe, nlist)
+        return faiss.IndexIDMap2(inner)
+
+
+class OutOfCoreIndexBuilder(IndexBuilder):
+    """IndexBuilder that keeps the vector matrix on disk while building.
+
+    Modes that need training spill every vector to a float32 file on disk
+    (plus its id) instead of buffering. ``finish`` memory-maps the file,
+    trains on ``train_sample`` rows drawn uniformly from the whole corpus
+    (not just the first ones to arrive) and adds all rows in batches of
+    ``add_batch``. Vector memory peaks at the training sample, one batch
+    and the index itself, whatever the corpus size. Untrained modes stream
+    straight into the index as with IndexBuilder.
+
+    Only the vectors leave memory: the caller's docstore text and BM25
+    postings still grow with the corpus until they are saved.
+    """
+
+    def __init__(self, spill_dir: str, add_batch: int = 65536, seed: int = 0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.spill_dir = spill_dir
+        self.add_batch = max(1, add_batch)
+        self.seed = seed
+        self._dir: Optional[str] = None
+        self._vectors_file = None
+        self._ids_file = None
+        self._dim = 0
+        self._count = 0
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        if self.index is not None or not self.needs_training:
+            super().add(vectors, ids)
+            return
+        if self._dir is None:
+            self._open_spill()
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Vector width {vectors.shape[1]} does not match {self._dim}")
+        self._dim = vectors.shape[1]
+        self._vectors_file.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        self._ids_file.write(np.ascontiguousarray(ids, dtype="int64").tobytes())
+        self._count += len(vectors)
+
+    def finish(self):
+        if self._dir is None:
+            return super().finish()
+        try:
+            self._vectors_file.close()
+            self._ids_file.close()
+            matrix = np.memmap(self._vectors_file.name, dtype="float32", mode="r", shape=(self._count, self._dim))
+            ids = np.memmap(self._ids_file.name, dtype="int64", mode="r", shape=(self._count,))
+            rng = np.random.default_rng(self.seed)
+            rows = np.sort(rng.choice(self._count, size=min(self.train_sample, self._count), replace=False))
+            self.index = self._create(self._dim, np.ascontiguousarray(matrix[rows]), corpus_size=self._count)
+            t0 = time.time()
+            for start in range(0, self._count, self.add_batch):
+                end = min(self._count, start + self.add_batch)
+                self.index.add_with_ids(np.ascontiguousarray(matrix[start:end]), np.ascontiguousarray(ids[start:end]))
+            self.params["out_of_core"] = True
+            self.params["corpus_vectors"] = self._count
+            logger.info("Added %d spilled vectors in batches of %d in %d ms",
+                        self._count, self.add_batch, int((time.time() - t0) * 1000))
+            del matrix, ids
+        finally:
+            self.discard()
+        return self.index
+
+    def discard(self) -> None:
+        super().discard()
+        for f in (self._vectors_file, self._ids_file):
+            if f is not None and not f.closed:
+                f.close()
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+        self._dir = self._vectors_file = self._ids_file = None
+        self._count = 0
+
+    def _open_spill(self) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            if name.startswith("build-") and time.time() - os.path.getmtime(path) > _STALE_SPILL_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        self._dir = tempfile.mkdtemp(prefix="build-", dir=self.spill_dir)
+        self._vectors_file = open(os.path.join(self._dir, "vectors.f32"), "wb")
+        self._ids_file = open(os.path.join(self._dir, "ids.i64"), "wb")
+
+
+def recall_report(
+    index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    k: int = 10,
+    num_queries: int = 200,
+    seed: int = 0,
+    vectors_dtype: str = "float32",
+) -> Dict[str, Any]:
+    """Measure recall@k and latency of ``index`` against exact search over ``vectors``.
+
+    ``vectors`` are the vectors of the corpus (row i has id ``ids[i]``); a
+    random sample of them is used as queries. Each nprobe or efSearch
+    setting that makes sense for the index mode is reported.
+    ``vectors_dtype`` is the precision they were stored at before being
+    widened to float32: anything but float32 makes the ground truth itself
+    approximate, so it is reported as ``ground_truth_dtype``.
+    """
+    _require_faiss()
+    n = len(vectors)
+    if n == 0:
+        raise ValueError("no vectors to evaluate")
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(num_queries, n), replace=False)]
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth_rows = exact.search(queries, k)
+    truth = ids[truth_rows]
+
+    mode = index_mode_of(index)
+    settings: List[Dict[str, int]]
+    if mode in TRAINED_MODES:
+        nlist = faiss.downcast_index(index.index).nlist
+        probes = [p for p in (1, 2, 4, 8, 16, 32, 64, 128, 256) if p < nlist]
+        # Always end with an exhaustive probe (nprobe = nlist), the recall ceiling of the index
+        settings = [{"nprobe": p} for p in probes + [nlist]]
+    elif mode == "hnsw":
+        settings = [{"ef_search": ef} for ef in (16, 32, 64, 128, 256, 512)]
+    else:
+        settings = [{}]
+
+    rows = []
+    for setting in settings:
+        params = search_parameters(index, nprobe=setting.get("nprobe"), ef_search=setting.get("ef_search"))
+        latencies = []
+        found = 0
+        for i in range(len(queries)):
+            t0 = time.perf_counter()
+            _, labels = index.search(queries[i:i + 1], k, params=params)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            found += len(set(labels[0].tolist()) & set(truth[i].tolist()))
+        latencies.sort()
+        rows.append({
+            **setting,
+            f"recall_at_{k}": round(found / (len(queries) * k), 4),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+        })
+    return {
+        "mode": mode,
+        "storage": index_storage_of(index),
+        "code_bytes_per_vector": vector_code_bytes(index),
+        "k": k,
+        "queries": len(queries),
+        "vectors": n,
+        "ground_truth_dtype": vectors_dtype,
+        "results": rows,
+    }
+
+
+def storage_comparison(
+    vectors: np.ndarray,
+    k: int = 10,
+    num_queries: int = 200,
+    pq_m: int = 64,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Recall@k and memory of each vector storage against full-precision exact search.
+
+    Builds an exhaustive (flat) index of ``vectors`` per storage type, so the
+    numbers isolate quantization loss from ANN search loss.
+    """
+    _require_faiss()
+    n, dim = vectors.shape
+    if n == 0:
+        raise ValueError("no vectors to evaluate")
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(num_queries, n), replace=False)]
+    baseline_bytes = dim * 4
+    truth = None
+    rows = []
+    for storage in STORAGE_TYPES:
+        builder = IndexBuilder("flat", train_sample=n, pq_m=pq_m, storage=storage)
+        builder.add(vectors, np.arange(n, dtype="int64"))
+        index = builder.finish()
+        if builder.storage != storage:
+            continue
+        _, labels = index.search(queries, k)
+        if truth is None:
+            truth = labels
+        found = sum(len(set(row.tolist()) & set(expected.tolist())) for row, expected in zip(labels, truth))
+        code_bytes = vector_code_bytes(index)
+        rows.append({
+            "storage": storage,
+            f"recall_at_{k}": round(found / (len(queries) * k), 4),
+            "code_bytes_per_vector": code_bytes,
+            "mb_per_million": round(code_bytes * 1e6 / 2**20, 1),
+            "compression": round(baseline_bytes / code_bytes, 1),
+        })
+    return {"k": k, "queries": len(queries), "vectors": n, "dim": dim, "results": rows}
@@ -0,0 +1,141 @@
+# answer_cache.py
+"""Semantic cache of generated RAG answers.
+
+Answers are stored with the unit-normalized embedding of the question that
+produced them, under a scope string naming what the answer was grounded on
+(an index generation plus retrieval settings, or one document version). A
+later question in the same scope whose embedding has cosine similarity of at
+least ``threshold`` with a cached one reuses its answer, so paraphrases
+("what is inertia" / "define inertia") skip retrieval and generation.
+
+Entries expire after ``ttl_seconds`` and the least recently used are evicted
+beyond ``max_entries``. ``invalidate`` drops whole scopes, e.g. every
+``index:`` scope when a new index generation is published.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "value", "expires_at")
+
+    def __init__(self, scope: str, vector: np.ndarray, value: Dict[str, Any], expires_at: float):
+        self.scope = scope
+        self.vector = vector
+        self.value = value
+        self.expires_at = expires_at
+
+
+class SemanticAnswerCache:
+    """Scoped nearest-neighbour cache of answers with TTL and LRU eviction."""
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 900, max_entries: int = 4096):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._scopes: Dict[str, List[int]] = {}
+        # Stacked vectors per scope, rebuilt lazily after the scope changes
+        self._matrices: Dict[str, Tuple[np.ndarray, List[int]]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype="float32").ravel()
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm > 0 else v
+
+    def lookup(self, scope: str, vector) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Cached ``(value, similarity)`` for the closest question in ``scope``, or None."""
+        q = self._normalize(vector)
+        with self._lock:
+            self._expire(scope)
+            ids = self._scopes.get(scope)
+            if not ids:
+                self.misses += 1
+                return None
+            matrix, row_ids = self._matrix(scope)
+            if matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            sims = matrix @ q
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = row_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id].value, similarity
+
+    def put(self, scope: str, vector, value: Dict[str, Any]) -> None:
+        entry = _Entry(scope, self._normalize(vector), value, time.time() + self.ttl_seconds)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._scopes.setdefault(scope, []).append(entry_id)
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self._forget(evicted_id, evicted.scope)
+                self.evictions += 1
+
+    def invalidate(self, prefix: str = "") -> int:
+        """Drop every scope starting with ``prefix``; returns the number of entries removed."""
+        with self._lock:
+            removed = 0
+            for scope in [s for s in self._scopes if s.startswith(prefix)]:
+                for entry_id in self._scopes.pop(scope):
+                    if self._entries.pop(entry_id, None) is not None:
+                        removed += 1
+                self._matrices.pop(scope, None)
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+
+    def _matrix(self, scope: str) -> Tuple[np.ndarray, List[int]]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            ids = list(self._scopes[scope])
+            cached = self._matrices[scope] = (np.vstack([self._entries[i].vector for i in ids]), ids)
+        return cached
+
+    def _expire(self, scope: str) -> None:
+        now = time.time()
+        for entry_id in [i for i in self._scopes.get(scope, ()) if self._entries[i].expires_at <= now]:
+            del self._entries[entry_id]
+            self._forget(entry_id, scope)
+
+    def _forget(self, entry_id: int, scope: str) -> None:
+        ids = self._scopes.get(scope)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._scopes[scope]
+        self._matrices.pop(scope, None)
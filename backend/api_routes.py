@@ -2,6 +2,7 @@
 import os
 import json
 import re
+import time
 import uuid
 import boto3
 from numpy import append
@@ -14,6 +15,9 @@ from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from typing import Literal, List
 from dotenv import load_dotenv
+import aws_async
+import bedrock_gateway
+from sse import sse_response, stream_events, stream_events_async
 from study_plan_service import generate_study_plan_with_bedrock
 from notes_service import save_refined_note
 from agents.tutor_agent import tutor_agent
@@ -130,28 +134,23 @@ class NoteInput(BaseModel):
 
 # Other existing models would go here...
 
-def get_bedrock_runtime_client():
-    """Get Bedrock runtime client."""
-    return boto3.client(
-        service_name="bedrock-runtime",
-        region_name=os.getenv("AWS_REGION", "us-east-1"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-
 # Authentication helper functions
 def generate_token(sub: str, role: Literal["student", "teacher"], name: str, user_id: str) -> str:
     exp = datetime.utcnow() + timedelta(minutes=JWT_EXPIRE_MIN)
     payload = {"sub": sub, "role": role, "name": name, "uid": user_id, "exp": exp}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
-def email_exists(table, email: str) -> bool:
-    resp = table.get_item(Key={"email": email})
+# DynamoDB calls run on the aws_async I/O pool and bcrypt on its CPU pool, never on the event loop
+async def email_exists(table, email: str) -> bool:
+    resp = await aws_async.run_io(table.get_item, Key={"email": email})
     return "Item" in resp
 
-def put_user(table, name: str, email: str, password: str, role: str):
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+async def put_user(table, name: str, email: str, password: str, role: str):
     user_id = str(uuid.uuid4())
-    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    password_hash = await aws_async.run_cpu(hash_password, password)
     item = {
         "email": email,
         "name": name,
@@ -160,20 +159,20 @@ def put_user(table, name: str, email: str, password: str, role: str):
         "id": user_id,
         "role": role,
     }
-    table.put_item(Item=item)
+    await aws_async.run_io(table.put_item, Item=item)
     return item
 
-def verify_user(table, email: str, password: str):
-    resp = table.get_item(Key={"email": email})
+async def verify_user(table, email: str, password: str):
+    resp = await aws_async.run_io(table.get_item, Key={"email": email})
     user = resp.get("Item")
     if not user:
         return None
-    if not bcrypt.checkpw(password.encode("utf-8"), user.get("password", "").encode("utf-8")):
+    if not await aws_async.run_cpu(bcrypt.checkpw, password.encode("utf-8"), user.get("password", "").encode("utf-8")):
         return None
     return user
 
-# Authentication dependency
-def require_auth(creds: HTTPAuthorizationCredentials = Depends(security)):
+# Authentication dependency (async: a sync dependency would take a threadpool slot per request)
+async def require_auth(creds: HTTPAuthorizationCredentials = Depends(security)):
     token = creds.credentials
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
@@ -182,7 +181,7 @@ def require_auth(creds: HTTPAuthorizationCredentials = Depends(security)):
     return payload
 
 @app.post("/tutor/generate-study-plan")
-def generate_study_plan(req: StudyPlanRequest):
+async def generate_study_plan(req: StudyPlanRequest):
     """Generate a personalized study plan using AWS Bedrock LLM based on student requirements."""
     try:
         # Calculate days until exam
@@ -209,7 +208,7 @@ def generate_study_plan(req: StudyPlanRequest):
             "use_google_calendar": req.use_google_calendar
         }
         
-        return generate_study_plan_with_bedrock(study_plan_request, days_until)
+        return await aws_async.run_io(generate_study_plan_with_bedrock, study_plan_request, days_until)
 
     except Exception as e:
         print(f"❌ Error generating study plan: {e}")
@@ -217,32 +216,32 @@ def generate_study_plan(req: StudyPlanRequest):
 
 # Authentication endpoints
 @app.post("/auth/student/signup")
-def student_signup(req: SignupRequest):
-    if email_exists(students_table, req.email):
+async def student_signup(req: SignupRequest):
+    if await email_exists(students_table, req.email):
         raise HTTPException(status_code=409, detail="Email already exists")
-    user = put_user(students_table, req.name, req.email, req.password, "student")
+    user = await put_user(students_table, req.name, req.email, req.password, "student")
     token = generate_token(req.email, "student", req.name, user["id"]) 
     return {"ok": True, "token": token, "user": {"id": user["id"], "name": user["name"], "email": user["email"], "role": "student"}}
 
 @app.post("/auth/student/login")
-def student_login(req: LoginRequest):
-    user = verify_user(students_table, req.email, req.password)
+async def student_login(req: LoginRequest):
+    user = await verify_user(students_table, req.email, req.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = generate_token(user["email"], "student", user.get("name", ""), user.get("id", ""))
     return {"ok": True, "token": token, "user": {"id": user.get("id", ""), "name": user.get("name", ""), "email": user["email"], "role": "student"}}
 
 @app.post("/auth/teacher/signup")
-def teacher_signup(req: SignupRequest):
-    if email_exists(teachers_table, req.email):
+async def teacher_signup(req: SignupRequest):
+    if await email_exists(teachers_table, req.email):
         raise HTTPException(status_code=409, detail="Email already exists")
-    user = put_user(teachers_table, req.name, req.email, req.password, "teacher")
+    user = await put_user(teachers_table, req.name, req.email, req.password, "teacher")
     token = generate_token(req.email, "teacher", req.name, user["id"]) 
     return {"ok": True, "token": token, "user": {"id": user["id"], "name": user["name"], "email": user["email"], "role": "teacher"}}
 
 @app.post("/auth/teacher/login")
-def teacher_login(req: LoginRequest):
-    user = verify_user(teachers_table, req.email, req.password)
+async def teacher_login(req: LoginRequest):
+    user = await verify_user(teachers_table, req.email, req.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = generate_token(user["email"], "teacher", user.get("name", ""), user.get("id", ""))
@@ -250,10 +249,10 @@ def teacher_login(req: LoginRequest):
 
 # Quiz endpoints
 @app.post("/quiz/generate")
-def quiz_generate(req: QuizRequest, user=Depends(require_auth)):
+async def quiz_generate(req: QuizRequest, user=Depends(require_auth)):
     # Import quiz generator
-    from quiz_generator import generate_quiz
-    questions = generate_quiz(
+    from quiz_generator import generate_quiz_async
+    questions = await generate_quiz_async(
         class_level=req.class_level,
         subject=req.subject,
         topic=req.topic,
@@ -263,7 +262,7 @@ def quiz_generate(req: QuizRequest, user=Depends(require_auth)):
     return {"questions": questions}
 
 @app.post("/quiz/recommendations")
-def quiz_recommendations(req: RecommendationsRequest, user=Depends(require_auth)):
+async def quiz_recommendations(req: RecommendationsRequest, user=Depends(require_auth)):
     # Import recommendation engine
     from recommendation_engine import generate_recommendations
     # Convert pydantic models to simple dicts for the engine
@@ -278,7 +277,8 @@ def quiz_recommendations(req: RecommendationsRequest, user=Depends(require_auth)
         }
         for r in req.results
     ]
-    recs = generate_recommendations(
+    recs = await aws_async.run_io(
+        generate_recommendations,
         result_dicts,
         subject=req.subject,
         topic=req.topic,
@@ -289,7 +289,7 @@ def quiz_recommendations(req: RecommendationsRequest, user=Depends(require_auth)
 
 # Teacher endpoints
 @app.get("/teacher/students")
-def get_teacher_students(user=Depends(require_auth)):
+async def get_teacher_students(user=Depends(require_auth)):
     if user.get("role") != "teacher":
         raise HTTPException(status_code=403, detail="Forbidden")
     # Minimal sample payload to replace frontend mocks; integrate DB later
@@ -303,7 +303,7 @@ def get_teacher_students(user=Depends(require_auth)):
     }
 
 @app.get("/teacher/heatmap")
-def get_teacher_heatmap(user=Depends(require_auth)):
+async def get_teacher_heatmap(user=Depends(require_auth)):
     if user.get("role") != "teacher":
         raise HTTPException(status_code=403, detail="Forbidden")
     return {
@@ -318,7 +318,7 @@ def get_teacher_heatmap(user=Depends(require_auth)):
     }
 
 @app.get("/teacher/interventions")
-def get_teacher_interventions(user=Depends(require_auth)):
+async def get_teacher_interventions(user=Depends(require_auth)):
     if user.get("role") != "teacher":
         raise HTTPException(status_code=403, detail="Forbidden")
     return {
@@ -331,58 +331,85 @@ def get_teacher_interventions(user=Depends(require_auth)):
 
 # Tutor endpoints
 @app.post("/tutor/rag-answer")
-def tutor_rag_answer(req: TutorRAGRequest):
-    # Import RAG service
-    from rag_service import build_context_from_document, call_bedrock_rag
-    # Build context from the referenced document
+async def tutor_rag_answer(req: TutorRAGRequest):
+    # Retrieval, generation and the semantic answer cache live in rag_service
+    from rag_service import answer_document_question_async
     try:
-        context, sources = build_context_from_document(req.question, req.s3_key, top_k=5)
+        return await answer_document_question_async(req.question, req.s3_key, top_k=5)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to build context: {e}")
 
-    if not context:
-        # Fallback 1: try to summarize document and use as context
-        try:
-            from rag_service import summarize_document
-            summary_ctx = summarize_document(req.s3_key)
-        except Exception:
-            summary_ctx = ""
-        # Fallback 2: call LLM with whatever minimal context we have
-        answer = generate_answer_with_context(req.question, summary_ctx or "")
-        return {"answer": answer, "sources": []}
-
-    # Use Bedrock via rag_service to handle model families
-    answer = call_bedrock_rag(req.question, context)
-    return {"answer": answer, "sources": sources}
+@app.post("/tutor/rag-answer/stream")
+async def tutor_rag_answer_stream(req: TutorRAGRequest):
+    """/tutor/rag-answer as Server-Sent Events; sources arrive in the trailing ``done`` event."""
+    from rag_service import stream_document_answer_async
+    t0 = time.time()
+    try:
+        # Retrieval happens here, so a missing document is still a 400 rather than a stream error
+        tokens, finish = await stream_document_answer_async(req.question, req.s3_key, top_k=5)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to build context: {e}")
+    return sse_response(stream_events_async(tokens, finish, t0))
 
 @app.post("/tutor/doc-summary")
-def tutor_doc_summary(req: DocSummaryRequest):
+async def tutor_doc_summary(req: DocSummaryRequest):
     try:
         from rag_service import summarize_document
-        summary = summarize_document(req.s3_key)
+        summary = await aws_async.run_io(summarize_document, req.s3_key)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to summarize: {e}")
     return {"summary": summary}
 
+@app.get("/tutor/doc-cache/stats")
+async def tutor_doc_cache_stats():
+    from rag_service import answer_cache, doc_cache
+    llm_cache = bedrock_gateway.response_cache()
+    return {
+        "doc_cache": doc_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+    }
+
 @app.post("/tutor/answer-with-context")
-def tutor_answer_with_context(req: AnswerWithContextRequest):
-    from rag_service import call_bedrock_rag
-    answer = call_bedrock_rag(req.question, req.context or "")
+async def tutor_answer_with_context(req: AnswerWithContextRequest):
+    from rag_service import call_bedrock_rag_async
+    answer = await call_bedrock_rag_async(req.question, req.context or "")
     return {"answer": answer, "sources": []}
 
+def _parse_flashcards(raw_text: str) -> list:
+    # Try to parse as JSON first
+    try:
+        cards = json.loads(raw_text)
+        if not isinstance(cards, list):
+            raise ValueError("Not a list")
+        return cards
+    except Exception:
+        pass
+    # Fallback: parse line by line
+    lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+    cards = []
+    for line in lines:
+        if ":" in line:
+            parts = line.split(":", 1)
+            if len(parts) == 2:
+                cards.append({"front": parts[0].strip(), "back": parts[1].strip()})
+        elif "?" in line:
+            chunks = line.split("?", 1)
+            if len(chunks) == 2:
+                cards.append({"front": chunks[0].strip() + "?", "back": chunks[1].strip()})
+    return cards
+
 @app.post("/tutor/flashcards")
-def tutor_flashcards(req: FlashcardsRequest):
+async def tutor_flashcards(req: FlashcardsRequest):
     subject = (req.subject or "").strip()
     topic = (req.topic or "").strip()
     if not subject or not topic:
         raise HTTPException(status_code=400, detail="subject and topic are required")
 
-    client = get_bedrock_runtime_client()
     model_id = os.getenv("BEDROCK_MODEL_ID", "").strip()
     if not model_id:
         raise HTTPException(status_code=500, detail="BEDROCK_MODEL_ID is not set in environment.")
 
-    family = (model_id.split(".")[0].lower() if "." in model_id else model_id.lower())
     system = (
         "You generate concise educational flashcards as JSON. Each card has 'front' and 'back'. "
         "Front is a question or term; back is a clear, student-friendly answer."
@@ -394,68 +421,11 @@ def tutor_flashcards(req: FlashcardsRequest):
     prompt = f"{system}\n\n{instruction}"
 
     try:
-        if family == "anthropic":
-            if "claude-3" in model_id or "claude-3-5" in model_id:
-                payload = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "messages": [
-                        {"role": "user", "content": [{"type": "text", "text": prompt}]}
-                    ],
-                    "max_tokens": 1024,
-                    "temperature": 0.3,
-                }
-            else:
-                payload = {
-                    "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
-                    "max_tokens_to_sample": 1024,
-                    "temperature": 0.3,
-                    "stop_sequences": ["\n\nHuman:"],
-                }
-        else:
-            payload = {
-                "inputText": prompt,
-                "textGenerationConfig": {"maxTokenCount": 1024, "temperature": 0.3, "topP": 0.9},
-            }
-
-        resp = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(payload).encode("utf-8"),
-            contentType="application/json",
-            accept="application/json",
+        raw_text = await aws_async.generate_text(
+            model_id, prompt, max_tokens=1024, temperature=0.3, top_p=0.9,
+            cache="flashcards", accept=lambda text: bool(_parse_flashcards(text)),
         )
-        data = json.loads(resp["body"].read())
-
-        # Parse response based on model family
-        if family == "anthropic":
-            if "content" in data and isinstance(data["content"], list) and data["content"]:
-                raw_text = "\n".join([part.get("text") or part.get("content") or "" for part in data["content"]])
-            else:
-                raw_text = data.get("completion", "")
-        else:
-            if isinstance(data, dict) and "results" in data and data["results"]:
-                raw_text = data["results"][0].get("outputText", "")
-            else:
-                raw_text = ""
-
-        # Try to parse as JSON first
-        try:
-            cards = json.loads(raw_text)
-            if not isinstance(cards, list):
-                raise ValueError("Not a list")
-        except:
-            # Fallback: parse line by line
-            lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-            cards = []
-            for line in lines:
-                if ":" in line:
-                    parts = line.split(":", 1)
-                    if len(parts) == 2:
-                        cards.append({"front": parts[0].strip(), "back": parts[1].strip()})
-                elif "?" in line:
-                    chunks = line.split("?", 1)
-                    if len(chunks) == 2:
-                        cards.append({"front": chunks[0].strip() + "?", "back": chunks[1].strip()})
-
+        cards = _parse_flashcards(raw_text)
         if not cards:
             raise RuntimeError("LLM did not return flashcards")
 
@@ -474,51 +444,49 @@ def tutor_flashcards(req: FlashcardsRequest):
         ][: req.num_cards]
         return {"flashcards": fallback, "warning": f"Bedrock error: {e}"}
 
-@app.post("/tutor/bedrock-answer")
-def tutor_bedrock_answer(req: BedrockAskRequest):
-    """Very simple endpoint that calls Bedrock LLM with the question only."""
+def _bedrock_answer_prompt(req: BedrockAskRequest):
+    """(model id, prompt) for /tutor/bedrock-answer."""
     question = (req.question or "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="question is required")
 
-    # Load model ID and create Bedrock client
     model_id = os.getenv("BEDROCK_MODEL_ID")
     if not model_id:
         raise HTTPException(status_code=500, detail="BEDROCK_MODEL_ID not set")
-    client = get_bedrock_runtime_client()
 
     # Minimal single prompt
-    prompt = f"Answer clearly and concisely:\n\nUser: {question}\nAssistant:"
-
-    payload = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-        "max_tokens": 300,
-        "temperature": 0.5,
-    }
+    return model_id, f"Answer clearly and concisely:\n\nUser: {question}\nAssistant:"
 
+@app.post("/tutor/bedrock-answer")
+async def tutor_bedrock_answer(req: BedrockAskRequest):
+    """Very simple endpoint that calls Bedrock LLM with the question only."""
+    model_id, prompt = _bedrock_answer_prompt(req)
     try:
-        response = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(payload),
-            contentType="application/json",
-            accept="application/json",
-        )
-
-        data = json.loads(response["body"].read())
-        # Works for Claude-3/Claude-3.5 — just grab text
-        answer = ""
-        if isinstance(data, dict):
-            parts = data.get("content") or []
-            if parts and isinstance(parts, list):
-                answer = "".join(p.get("text", "") for p in parts)
-            else:
-                answer = data.get("completion", "")
+        answer = await aws_async.generate_text(model_id, prompt, max_tokens=300, temperature=0.5)
         return {"answer": answer or "No response received."}
 
     except Exception as e:
         return {"answer": f"Error calling Bedrock: {str(e)}"}
 
+@app.post("/tutor/bedrock-answer/stream")
+async def tutor_bedrock_answer_stream(req: BedrockAskRequest):
+    """/tutor/bedrock-answer as Server-Sent Events (``token`` events, then ``done`` with timing)."""
+    model_id, prompt = _bedrock_answer_prompt(req)
+    tokens = aws_async.stream_text(model_id, prompt, max_tokens=300, temperature=0.5)
+    return sse_response(stream_events_async(tokens, lambda answer: {"model_id": model_id}))
+
+@app.post("/tutor/ask/stream")
+async def tutor_ask_stream(req: BedrockAskRequest, user=Depends(require_auth)):
+    """The NCERT tutor (ai_tutor) as Server-Sent Events; the chat is saved to the
+    user's history before the ``done`` event.
+    """
+    from ai_tutor import stream_user_query
+    question = (req.question or "").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="question is required")
+    # A sync generator: Starlette iterates it on the threadpool, off the event loop
+    return sse_response(stream_events(stream_user_query(user.get("uid") or user["sub"], question)))
+
 # =========================
 # Notes Routes
 # =========================
@@ -529,22 +497,19 @@ async def create_refined_note(note: NoteInput):
     Endpoint to refine a note using Bedrock LLM and save it in DynamoDB.
     """
     try:
-        saved_item = save_refined_note(note.user_id, note.raw_text)
+        saved_item = await aws_async.run_io(save_refined_note, note.user_id, note.raw_text)
         return {"message": "Note refined and saved successfully!", "item": saved_item}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Support endpoint
-@app.post("/support/ask")
-def support_ask(req: SupportAskRequest):
-    """Lightweight endpoint that proxies a user question to the Bedrock chat model."""
+def _support_prompt(req: SupportAskRequest):
+    """(model id, prompt) for /support/ask."""
     question = (req.question or "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="question is required")
 
-    client = get_bedrock_runtime_client()
-
-    # Resolve model id strictly from BEDROCK_MODEL_ID and derive family
+    # Resolve model id strictly from BEDROCK_MODEL_ID
     model_id = os.getenv("BEDROCK_MODEL_ID", "").strip()
     if not model_id:
         raise HTTPException(status_code=500, detail="BEDROCK_MODEL_ID is not set in environment.")
@@ -559,69 +524,38 @@ def support_ask(req: SupportAskRequest):
         context_prefix += f"Subject: {req.subject}\n"
     if req.topic:
         context_prefix += f"Topic: {req.topic}\n"
-    prompt = f"{system_instructions}\n\n{context_prefix}User question: {question}\nAssistant:"
-
-    # Build payload depending on the model family
-    family = (model_id.split(".")[0].lower() if "." in model_id else model_id.lower())
-    payload = {}
-    if family == "anthropic":
-        # Distinguish Claude 3/3.5 (messages API) vs Claude v1/v2 (prompt API)
-        if "claude-3" in model_id or "claude-3-5" in model_id:
-            payload = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": prompt}]
-                    }
-                ],
-                "max_tokens": 512,
-                "temperature": 0.4,
-            }
-        else:
-            payload = {
-                "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
-                "max_tokens_to_sample": 512,
-                "temperature": 0.4,
-                "stop_sequences": ["\n\nHuman:"],
-            }
-    else:
-        payload = {
-            "inputText": prompt,
-            "textGenerationConfig": {"maxTokenCount": 512, "temperature": 0.4, "topP": 0.9},
-        }
+    return model_id, f"{system_instructions}\n\n{context_prefix}User question: {question}\nAssistant:"
 
+@app.post("/support/ask")
+async def support_ask(req: SupportAskRequest):
+    """Lightweight endpoint that proxies a user question to the Bedrock chat model."""
+    model_id, prompt = _support_prompt(req)
     try:
-        resp = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(payload).encode("utf-8"),
-            contentType="application/json",
-            accept="application/json",
-        )
-        data = json.loads(resp["body"].read())
-        if family == "anthropic":
-            if "content" in data and isinstance(data["content"], list) and data["content"]:
-                answer = "\n".join([part.get("text") or part.get("content") or "" for part in data["content"]])
-            else:
-                answer = data.get("completion", "")
-        else:
-            if isinstance(data, dict) and "results" in data and data["results"]:
-                answer = data["results"][0].get("outputText", "")
-            else:
-                answer = ""
+        answer = await aws_async.generate_text(model_id, prompt, max_tokens=512, temperature=0.4, top_p=0.9)
         return {"answer": answer}
     except Exception as e:
         return {"answer": "I'm sorry, I couldn't process your question right now. Please try again."}
 
+@app.post("/support/ask/stream")
+async def support_ask_stream(req: SupportAskRequest):
+    """/support/ask as Server-Sent Events (``token`` events, then ``done`` with timing)."""
+    model_id, prompt = _support_prompt(req)
+    tokens = aws_async.stream_text(model_id, prompt, max_tokens=512, temperature=0.4, top_p=0.9)
+    return sse_response(stream_events_async(tokens, lambda answer: {"model_id": model_id}))
+
+@app.on_event("shutdown")
+async def close_async_clients():
+    await aws_async.close()
+
 # Health check endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy", "message": "AI Tutor API is running"}
 
 
 # Unified agent endpoint
 @app.post("/agent/ask")
-def agent_ask(payload: dict, user=Depends(require_auth)):
+async def agent_ask(payload: dict, user=Depends(require_auth)):
     """Route a generic tutoring request to the agent which will invoke tools as needed.
 
     Examples of payloads:
@@ -631,7 +565,7 @@ def agent_ask(payload: dict, user=Depends(require_auth)):
     - {"type": "answer_with_context", "question": "...", "context": "..."}
     """
     try:
-        result = tutor_agent.run(input=payload, context={"user": user})
+        result = await aws_async.run_io(tutor_agent.run, input=payload, context={"user": user})
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent error: {e}")
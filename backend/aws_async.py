@@ -0,0 +1,212 @@
+# aws_async.py
+"""Non-blocking AWS calls for async endpoints.
+
+Async endpoints must never block the event loop, and a sync endpoint holds
+one of Starlette's ~40 threadpool tokens for the whole 5-30 s of an LLM
+call. This module gives the async request path:
+
+* Bedrock on aiobotocore (in requirements.txt): ``invoke_json``,
+  ``generate_text`` and ``stream_text`` mirror bedrock_gateway but await
+  the HTTP response, so one worker holds up to
+  ASYNC_BEDROCK_MAX_CONNECTIONS slow generations at once without a thread
+  each. Payload builders, text extraction, the response cache and the
+  client settings (timeouts, retries) are shared with bedrock_gateway.
+* The thread fallback, used when aiobotocore is not importable or with
+  ``ASYNC_AWS_BACKEND=threads``, runs the sync gateway on the I/O pool
+  below. It is only a larger threadpool: every in-flight generation, and
+  every stream for its whole duration, holds one of AWS_IO_THREADS
+  threads, so a worker serves at most that many concurrent Bedrock calls
+  (minus the S3/DynamoDB work sharing the pool).
+* ``run_io(fn, ...)`` for the remaining blocking boto3 work (S3, DynamoDB):
+  a dedicated pool of AWS_IO_THREADS threads, separate from Starlette's.
+* ``run_cpu(fn, ...)`` for CPU-bound steps (bcrypt, FAISS search): a pool
+  of CPU_WORKERS threads. bcrypt and FAISS release the GIL; PDF parsing
+  already fans out to processes in pdf_extract.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import functools
+from contextlib import AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, TypeVar
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session as get_aio_session
+except Exception:  # pragma: no cover - optional dependency
+    AioConfig = None  # type: ignore
+    get_aio_session = None  # type: ignore
+
+import bedrock_gateway
+from singleflight import AsyncSingleFlight
+
+
+logger = logging.getLogger("aws_async")
+
+T = TypeVar("T")
+
+# auto: aiobotocore for Bedrock when installed; threads: always the sync gateway on the I/O pool
+ASYNC_AWS_BACKEND = os.getenv("ASYNC_AWS_BACKEND", "auto").lower()
+AWS_IO_THREADS = int(os.getenv("AWS_IO_THREADS", "256"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0")) or (os.cpu_count() or 4)
+# Concurrent Bedrock connections of the aiobotocore client (one per in-flight call)
+ASYNC_BEDROCK_MAX_CONNECTIONS = int(os.getenv("ASYNC_BEDROCK_MAX_CONNECTIONS", "1000"))
+
+_io_pool = ThreadPoolExecutor(max_workers=AWS_IO_THREADS, thread_name_prefix="aws-io")
+_cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+_client = None
+_client_stack: Optional[AsyncExitStack] = None
+_client_lock: Optional[asyncio.Lock] = None
+
+generation_flights = AsyncSingleFlight()
+
+if get_aio_session is None and ASYNC_AWS_BACKEND != "threads":
+    logger.warning(
+        "aiobotocore is not installed; Bedrock calls from async endpoints run on %d I/O threads", AWS_IO_THREADS
+    )
+
+
+def native_bedrock() -> bool:
+    """Whether Bedrock calls are made on aiobotocore (rather than the I/O pool)."""
+    return get_aio_session is not None and ASYNC_AWS_BACKEND != "threads"
+
+
+async def run_io(fn: Callable[..., T], *args, **kwargs) -> T:
+    """``fn(*args, **kwargs)`` on the AWS I/O pool (blocking boto3 calls)."""
+    return await asyncio.get_running_loop().run_in_executor(_io_pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """``fn(*args, **kwargs)`` on the CPU pool (hashing, vector search)."""
+    return await asyncio.get_running_loop().run_in_executor(_cpu_pool, functools.partial(fn, *args, **kwargs))
+
+
+# ------------------------------
+# Bedrock
+# ------------------------------
+
+async def get_client():
+    """The shared aiobotocore ``bedrock-runtime`` client (created on first use)."""
+    global _client, _client_stack, _client_lock
+    if _client is not None:
+        return _client
+    if _client_lock is None:
+        _client_lock = asyncio.Lock()
+    async with _client_lock:
+        if _client is None:
+            settings = bedrock_gateway.client_settings()
+            settings.pop("tcp_keepalive", None)  # aiohttp keeps its connections alive itself
+            settings["max_pool_connections"] = max(ASYNC_BEDROCK_MAX_CONNECTIONS, settings["max_pool_connections"])
+            stack = AsyncExitStack()
+            _client = await stack.enter_async_context(
+                get_aio_session().create_client(
+                    "bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"), config=AioConfig(**settings)
+                )
+            )
+            _client_stack = stack
+            logger.info("Created async Bedrock runtime client (pool of %d connections)", settings["max_pool_connections"])
+    return _client
+
+
+async def close() -> None:
+    """Close the aiobotocore client (call on application shutdown)."""
+    global _client, _client_stack
+    if _client_stack is not None:
+        stack, _client, _client_stack = _client_stack, None, None
+        await stack.aclose()
+
+
+async def invoke_json(model_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Async ``bedrock_gateway.invoke_json``."""
+    if not native_bedrock():
+        return await run_io(bedrock_gateway.invoke_json, model_id, payload)
+    client = await get_client()
+    resp = await client.invoke_model(
+        modelId=model_id,
+        body=json.dumps(payload).encode("utf-8"),
+        contentType="application/json",
+        accept="application/json",
+    )
+    async with resp["body"] as body:
+        return json.loads(await body.read())
+
+
+async def generate_text(
+    model_id: str,
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    system: Optional[str] = None,
+    cache: Optional[str] = None,
+    accept: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Async ``bedrock_gateway.generate_text``: same cache, same coalescing rules."""
+    key = bedrock_gateway.generation_key(model_id, prompt, max_tokens, temperature, top_p, system)
+    store = bedrock_gateway.response_cache() if cache else None
+
+    async def generate() -> str:
+        if store is not None:
+            cached = await run_io(store.get, cache, key)
+            if cached is not None:
+                return cached
+        payload = bedrock_gateway.build_text_payload(model_id, prompt, max_tokens, temperature, top_p, system)
+        text = bedrock_gateway.extract_text(await invoke_json(model_id, payload))
+        if store is not None and text and (accept is None or accept(text)):
+            await run_io(store.put, cache, key, text)
+        return text
+
+    return await generation_flights.do((cache, key), generate)
+
+
+async def stream_text(
+    model_id: str,
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    system: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Async ``bedrock_gateway.stream_text``; raises on Bedrock errors."""
+    if not native_bedrock():
+        async for text in iterate_io(
+            bedrock_gateway.stream_text(model_id, prompt, max_tokens, temperature, top_p, system)
+        ):
+            yield text
+        return
+    payload = bedrock_gateway.build_text_payload(model_id, prompt, max_tokens, temperature, top_p, system)
+    client = await get_client()
+    resp = await client.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=json.dumps(payload).encode("utf-8"),
+        contentType="application/json",
+        accept="application/json",
+    )
+    async for event in resp["body"]:
+        chunk = event.get("chunk")
+        if chunk is None:
+            name, detail = next(iter(event.items()), ("unknown", {}))
+            raise RuntimeError(f"Bedrock stream error {name}: {(detail or {}).get('message', '')}")
+        text = bedrock_gateway.extract_delta(json.loads(chunk["bytes"]))
+        if text:
+            yield text
+
+
+async def iterate_io(items) -> AsyncIterator[Any]:
+    """Drain a blocking iterator (e.g. a sync token stream) one item at a time on the I/O pool."""
+    done = object()
+    it = iter(items)
+    try:
+        while True:
+            item = await run_io(next, it, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close_it = getattr(it, "close", None)
+        if close_it is not None:
+            await run_io(close_it)
@@ -0,0 +1,390 @@
+# bedrock_gateway.py
+"""Process-wide Bedrock runtime client and per-model-family request formats.
+
+Every module that talks to Bedrock goes through here, so the process holds
+one boto3 session and one ``bedrock-runtime`` client whose urllib3 pool keeps
+warm, keep-alive connections; requests no longer pay client construction,
+endpoint resolution and a TLS handshake each. The client is created on first
+use (settings are read then, after any ``.env`` has been loaded):
+
+    BEDROCK_MAX_POOL_CONNECTIONS   connections kept per host (default 50)
+    BEDROCK_CONNECT_TIMEOUT        seconds to establish a connection (default 5)
+    BEDROCK_READ_TIMEOUT           seconds to wait for a response (default 120;
+                                   long generations exceed botocore's 60)
+    BEDROCK_MAX_ATTEMPTS           botocore attempts incl. the first (default 3)
+    BEDROCK_RETRY_MODE             botocore retry mode (default "standard")
+
+``build_text_payload`` and ``extract_text`` know the request and response
+bodies of the model families used here (Anthropic messages and legacy text
+completions, Amazon Titan text and Nova, Meta Llama, Mistral), so callers
+pick a model id and a prompt, not a JSON schema. ``stream_text`` yields the
+same text incrementally (``invoke_model_with_response_stream``).
+
+``generate_text(..., cache="quiz")`` serves repeated requests from an
+LLMResponseCache (see llm_cache) instead of generating again:
+
+    LLM_CACHE_ENABLED              default true
+    LLM_CACHE_DIR                  disk tier (default $RAG_INDEX_DIR/llm_cache)
+    LLM_CACHE_MAX_ENTRIES          memory tier size (default 2048)
+    LLM_CACHE_TTL_<NAMESPACE>      seconds, e.g. LLM_CACHE_TTL_QUIZ (see CACHE_TTLS)
+    LLM_CACHE_VARIANTS_<NAMESPACE> responses served round-robin per request (default 1)
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import boto3
+from botocore.client import Config
+
+from llm_cache import LLMResponseCache, request_key
+from singleflight import SingleFlight
+
+
+logger = logging.getLogger("bedrock_gateway")
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+# Cross-region inference profiles prefix the model id ("us.anthropic.claude-...")
+_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "us-gov.", "global.")
+_LEGACY_CLAUDE = ("claude-v1", "claude-v2", "claude-instant")
+
+# Default TTL (seconds) of each cached endpoint. Prompts embed their inputs
+# (a document's chunks, an exam date), so changed inputs are new keys anyway.
+CACHE_TTLS = {
+    "quiz": 7 * 86400,
+    "flashcards": 7 * 86400,
+    "study_plan": 86400,
+    "doc_summary": 30 * 86400,
+}
+
+_session = None
+_client = None
+# Same settings without botocore retries, for callers that retry on their own (EmbeddingEngine)
+_single_attempt_client = None
+_pool_size = 0
+_min_pool_connections = 0
+_response_cache: Optional[LLMResponseCache] = None
+_lock = threading.Lock()
+# Identical generations in flight at the same time share one Bedrock call
+generation_flights = SingleFlight()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def get_session():
+    """Create or reuse the boto3 Session (AWS_PROFILE, explicit keys, or the default chain)."""
+    global _session
+    with _lock:
+        if _session is None:
+            region = os.getenv("AWS_REGION", "us-east-1")
+            profile = os.getenv("AWS_PROFILE")
+            aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
+            aws_secret = os.getenv("AWS_SECRET_ACCESS_KEY")
+            if profile:
+                _session = boto3.Session(profile_name=profile, region_name=region)
+            elif aws_access_key and aws_secret:
+                _session = boto3.Session(
+                    aws_access_key_id=aws_access_key,
+                    aws_secret_access_key=aws_secret,
+                    region_name=region,
+                )
+            else:
+                # Falls back to env vars from dotenv or instance role
+                _session = boto3.Session(region_name=region)
+        return _session
+
+
+def reserve_connections(count: int) -> None:
+    """Make the pool hold at least ``count`` connections (for callers that fan out).
+
+    Must be called before the client is first used to take effect.
+    """
+    global _min_pool_connections
+    with _lock:
+        _min_pool_connections = max(_min_pool_connections, count)
+        if _client is not None and _pool_size < count:
+            logger.warning("Bedrock client already created with %d connections; %d requested", _pool_size, count)
+
+
+def client_settings() -> Dict[str, Any]:
+    """botocore Config arguments of the Bedrock client (shared with the asyncio client in aws_async)."""
+    return {
+        "max_pool_connections": max(_env_int("BEDROCK_MAX_POOL_CONNECTIONS", 50), _min_pool_connections),
+        "tcp_keepalive": True,
+        "connect_timeout": _env_int("BEDROCK_CONNECT_TIMEOUT", 5),
+        "read_timeout": _env_int("BEDROCK_READ_TIMEOUT", 120),
+        "retries": {
+            "max_attempts": _env_int("BEDROCK_MAX_ATTEMPTS", 3),
+            "mode": os.getenv("BEDROCK_RETRY_MODE", "standard"),
+        },
+    }
+
+
+def get_client(retry: bool = True):
+    """The shared ``bedrock-runtime`` client.
+
+    ``retry=False`` gives a client that makes one attempt per call, for
+    callers with their own retry loop: stacked on botocore's retries every
+    throttle would cost several requests the caller never sees.
+    """
+    global _client, _single_attempt_client, _pool_size
+    client = _client if retry else _single_attempt_client
+    if client is not None:
+        return client
+    session = get_session()
+    with _lock:
+        if retry and _client is None:
+            settings = client_settings()
+            pool = settings["max_pool_connections"]
+            _client = session.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"), config=Config(**settings))
+            _pool_size = pool
+            logger.info("Created Bedrock runtime client (pool of %d connections)", pool)
+        elif not retry and _single_attempt_client is None:
+            settings = client_settings()
+            settings["retries"] = {"total_max_attempts": 1, "mode": settings["retries"]["mode"]}
+            _single_attempt_client = session.client(
+                "bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"), config=Config(**settings)
+            )
+    return _client if retry else _single_attempt_client
+
+
+def response_cache() -> Optional[LLMResponseCache]:
+    """The shared LLM response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _response_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _lock:
+        if _response_cache is None:
+            index_dir = os.getenv("RAG_INDEX_DIR", os.path.join(os.getcwd(), "index"))
+            _response_cache = LLMResponseCache(
+                os.getenv("LLM_CACHE_DIR", os.path.join(index_dir, "llm_cache")),
+                max_entries=_env_int("LLM_CACHE_MAX_ENTRIES", 2048),
+                default_ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+                ttls={ns: float(os.getenv(f"LLM_CACHE_TTL_{ns.upper()}", str(ttl))) for ns, ttl in CACHE_TTLS.items()},
+                variants={ns: _env_int(f"LLM_CACHE_VARIANTS_{ns.upper()}", 1) for ns in CACHE_TTLS},
+            )
+        return _response_cache
+
+
+# ------------------------------
+# Model families
+# ------------------------------
+
+def model_family(model_id: str) -> str:
+    """One of "anthropic", "anthropic-text", "titan", "nova", "meta", "mistral" (default "titan")."""
+    model = (model_id or "").lower()
+    for prefix in _PROFILE_PREFIXES:
+        if model.startswith(prefix):
+            model = model[len(prefix):]
+            break
+    provider = model.split(".", 1)[0]
+    if provider == "anthropic":
+        return "anthropic-text" if any(name in model for name in _LEGACY_CLAUDE) else "anthropic"
+    if provider == "amazon":
+        return "nova" if ".nova" in model else "titan"
+    if provider in ("meta", "mistral"):
+        return provider
+    return "titan"
+
+
+def build_text_payload(
+    model_id: str,
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    system: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Request body for a single-turn text generation with ``model_id``."""
+    family = model_family(model_id)
+    if family == "anthropic":
+        payload: Dict[str, Any] = {
+            "anthropic_version": ANTHROPIC_VERSION,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+        }
+        if system:
+            payload["system"] = system
+        if temperature is not None:
+            payload["temperature"] = temperature
+        elif top_p is not None:
+            # Newer Claude models reject requests that set both
+            payload["top_p"] = top_p
+        return payload
+    if family == "nova":
+        config: Dict[str, Any] = {"maxTokens": max_tokens}
+        if temperature is not None:
+            config["temperature"] = temperature
+        if top_p is not None:
+            config["topP"] = top_p
+        payload = {"messages": [{"role": "user", "content": [{"text": prompt}]}], "inferenceConfig": config}
+        if system:
+            payload["system"] = [{"text": system}]
+        return payload
+
+    # The remaining families take one prompt string
+    text = f"{system}\n\n{prompt}" if system else prompt
+    if family == "anthropic-text":
+        payload = {
+            "prompt": f"\n\nHuman: {text}\n\nAssistant:",
+            "max_tokens_to_sample": max_tokens,
+            "stop_sequences": ["\n\nHuman:"],
+        }
+    elif family == "meta":
+        payload = {"prompt": text, "max_gen_len": max_tokens}
+    elif family == "mistral":
+        payload = {"prompt": f"<s>[INST] {text} [/INST]", "max_tokens": max_tokens}
+    else:
+        config = {"maxTokenCount": max_tokens}
+        payload = {"inputText": text, "textGenerationConfig": config}
+        if temperature is not None:
+            config["temperature"] = temperature
+        if top_p is not None:
+            config["topP"] = top_p
+        return payload
+    if temperature is not None:
+        payload["temperature"] = temperature
+    if top_p is not None:
+        payload["top_p"] = top_p
+    return payload
+
+
+def extract_text(data: Dict[str, Any]) -> str:
+    """Generated text from a response body of any supported family ("" if none)."""
+    if not isinstance(data, dict):
+        return ""
+    content = data.get("content")
+    if isinstance(content, list):  # Anthropic messages
+        return "\n".join(part.get("text") or "" for part in content if isinstance(part, dict)).strip()
+    results = data.get("results")
+    if isinstance(results, list) and results:  # Titan text
+        return (results[0].get("outputText") or "").strip()
+    message = (data.get("output") or {}).get("message") if isinstance(data.get("output"), dict) else None
+    if isinstance(message, dict):  # Nova
+        return "".join(part.get("text") or "" for part in message.get("content") or []).strip()
+    outputs = data.get("outputs")
+    if isinstance(outputs, list) and outputs:  # Mistral
+        return (outputs[0].get("text") or "").strip()
+    for key in ("completion", "generation", "output_text"):  # legacy Claude, Llama, others
+        if isinstance(data.get(key), str):
+            return data[key].strip()
+    return ""
+
+
+# ------------------------------
+# Invocation
+# ------------------------------
+
+def invoke_json(model_id: str, payload: Dict[str, Any], retry: bool = True) -> Dict[str, Any]:
+    """Invoke ``model_id`` with a JSON body and return the decoded JSON response.
+
+    ``retry=False`` skips botocore's retries (see ``get_client``).
+    """
+    resp = get_client(retry).invoke_model(
+        modelId=model_id,
+        body=json.dumps(payload).encode("utf-8"),
+        contentType="application/json",
+        accept="application/json",
+    )
+    return json.loads(resp["body"].read())
+
+
+def generation_key(
+    model_id: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: Optional[float],
+    top_p: Optional[float],
+    system: Optional[str],
+) -> str:
+    """Response-cache and coalescing key of a text generation request."""
+    params = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p, "system": system}
+    return request_key(model_id, prompt, params)
+
+
+def generate_text(
+    model_id: str,
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    system: Optional[str] = None,
+    cache: Optional[str] = None,
+    accept: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Single-turn generation; raises on Bedrock errors so callers choose their fallback.
+
+    Concurrent identical requests wait for the first one and share its
+    result. With ``cache`` (a namespace such as "quiz"), an identical earlier
+    request is answered from the response cache. Only non-empty responses
+    for which ``accept(text)`` holds (e.g. "parses as JSON") are stored.
+    """
+    key = generation_key(model_id, prompt, max_tokens, temperature, top_p, system)
+    store = response_cache() if cache else None
+
+    def generate() -> str:
+        if store is not None:
+            cached = store.get(cache, key)
+            if cached is not None:
+                return cached
+        payload = build_text_payload(model_id, prompt, max_tokens, temperature, top_p, system)
+        text = extract_text(invoke_json(model_id, payload))
+        if store is not None and text and (accept is None or accept(text)):
+            store.put(cache, key, text)
+        return text
+
+    return generation_flights.do((cache, key), generate)
+
+
+def extract_delta(chunk: Dict[str, Any]) -> str:
+    """Text carried by one response-stream chunk of any supported family ("" if none)."""
+    if not isinstance(chunk, dict):
+        return ""
+    delta = chunk.get("delta")
+    if chunk.get("type") == "content_block_delta" and isinstance(delta, dict):  # Anthropic messages
+        return delta.get("text") or ""
+    block = chunk.get("contentBlockDelta")
+    if isinstance(block, dict):  # Nova
+        return (block.get("delta") or {}).get("text") or ""
+    outputs = chunk.get("outputs")
+    if isinstance(outputs, list) and outputs:  # Mistral
+        return outputs[0].get("text") or ""
+    for key in ("outputText", "completion", "generation"):  # Titan, legacy Claude, Llama
+        if isinstance(chunk.get(key), str):
+            return chunk[key]
+    return ""
+
+
+def stream_text(
+    model_id: str,
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    system: Optional[str] = None,
+) -> Iterator[str]:
+    """Yield generated text as Bedrock streams it; raises on Bedrock errors.
+
+    Streams are neither cached nor coalesced: every caller is waiting on its
+    own tokens.
+    """
+    payload = build_text_payload(model_id, prompt, max_tokens, temperature, top_p, system)
+    resp = get_client().invoke_model_with_response_stream(
+        modelId=model_id,
+        body=json.dumps(payload).encode("utf-8"),
+        contentType="application/json",
+        accept="application/json",
+    )
+    for event in resp["body"]:
+        chunk = event.get("chunk")
+        if chunk is None:
+            # Exceptions arrive in-band, e.g. {"throttlingException": {"message": ...}}
+            name, detail = next(iter(event.items()), ("unknown", {}))
+            raise RuntimeError(f"Bedrock stream error {name}: {(detail or {}).get('message', '')}")
+        text = extract_delta(json.loads(chunk["bytes"]))
+        if text:
+            yield text
@@ -0,0 +1,243 @@
+# chunk_store.py
+"""Columnar docstore for the global index.
+
+Instead of one ``{"chunk": str, "source": str}`` dict per chunk, chunks are
+kept as parallel arrays:
+
+    ids         int64, sorted FAISS ids
+    offsets     int64, row i's text is text[offsets[i]:offsets[i + 1]]
+    source_ids  int32 index into a small table of interned source keys
+    pages       int32 page the chunk starts on (0 when unknown)
+    text        one concatenated UTF-8 blob
+
+On disk these are plain ``.npy`` files plus a raw text file, so a saved store
+is opened with ``mmap`` and costs no heap until rows are read. Chunk text is
+decoded only for the rows a caller asks for (the top-k hits of a query).
+
+The store behaves like a mutable mapping from FAISS id to a
+``{"chunk", "source", "page"}`` dict. Rows added after loading go to a small
+append segment and removals are tombstones, so a memory-mapped base is never
+written to; ``save`` writes the compacted arrays.
+"""
+
+import os
+import json
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+DOCSTORE_FILES = {
+    "ids": "docstore.ids.npy",
+    "offsets": "docstore.offsets.npy",
+    "source_ids": "docstore.source_ids.npy",
+    "pages": "docstore.pages.npy",
+    "text": "docstore.text.bin",
+    "sources": "docstore.sources.json",
+}
+
+
+def _keep_runs(keep: np.ndarray) -> List[Tuple[int, int]]:
+    """Maximal ``[start, end)`` row ranges where ``keep`` is True."""
+    rows = np.flatnonzero(keep)
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1)
+    starts = rows[np.concatenate(([0], breaks + 1))]
+    ends = rows[np.concatenate((breaks, [len(rows) - 1]))] + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class ChunkStore(MutableMapping):
+    """FAISS id -> ``{"chunk": str, "source": str, "page": int}`` backed by columnar arrays.
+
+    New ids must be larger than every id already in the store, which holds
+    for ingestion since ids come from a monotonically increasing counter.
+    """
+
+    def __init__(self):
+        # Base segment (loaded from disk, possibly memory-mapped; never mutated)
+        self._ids = np.zeros(0, dtype="int64")
+        self._offsets = np.zeros(1, dtype="int64")
+        self._source_ids = np.zeros(0, dtype="int32")
+        self._pages = np.zeros(0, dtype="int32")
+        self._text = np.zeros(0, dtype="uint8")
+        # Append segment
+        self._new_ids = array("q")
+        self._new_offsets = array("q", [0])
+        self._new_source_ids = array("i")
+        self._new_pages = array("i")
+        self._new_text = bytearray()
+        self._deleted: set = set()
+        self._sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+
+    # -- lookup ------------------------------------------------------------
+
+    def _locate(self, doc_id: int) -> Optional[Tuple[bool, int]]:
+        """``(in_base, row)`` of a live id, or None."""
+        if doc_id in self._deleted:
+            return None
+        row = int(np.searchsorted(self._ids, doc_id))
+        if row < len(self._ids) and self._ids[row] == doc_id:
+            return True, row
+        row = bisect_left(self._new_ids, doc_id)
+        if row < len(self._new_ids) and self._new_ids[row] == doc_id:
+            return False, row
+        return None
+
+    def _row(self, doc_id: int) -> Tuple[bool, int]:
+        loc = self._locate(doc_id)
+        if loc is None:
+            raise KeyError(doc_id)
+        return loc
+
+    def chunk(self, doc_id: int) -> str:
+        in_base, row = self._row(doc_id)
+        if in_base:
+            data = self._text[self._offsets[row]:self._offsets[row + 1]].tobytes()
+        else:
+            data = bytes(self._new_text[self._new_offsets[row]:self._new_offsets[row + 1]])
+        return data.decode("utf-8")
+
+    def source(self, doc_id: int) -> str:
+        in_base, row = self._row(doc_id)
+        sid = self._source_ids[row] if in_base else self._new_source_ids[row]
+        return self._sources[int(sid)]
+
+    def page(self, doc_id: int) -> int:
+        in_base, row = self._row(doc_id)
+        return int(self._pages[row] if in_base else self._new_pages[row])
+
+    def __getitem__(self, doc_id: int) -> Dict[str, object]:
+        return {"chunk": self.chunk(doc_id), "source": self.source(doc_id), "page": self.page(doc_id)}
+
+    def __contains__(self, doc_id) -> bool:
+        return self._locate(doc_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._new_ids) - len(self._deleted)
+
+    def __iter__(self) -> Iterator[int]:
+        for doc_id in self._ids.tolist():
+            if doc_id not in self._deleted:
+                yield doc_id
+        for doc_id in self._new_ids:
+            if doc_id not in self._deleted:
+                yield doc_id
+
+    @property
+    def sources(self) -> List[str]:
+        return list(self._sources)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays (mapped pages count only once touched)."""
+        base = self._ids.nbytes + self._offsets.nbytes + self._source_ids.nbytes + self._pages.nbytes + self._text.nbytes
+        appended = (self._new_ids, self._new_offsets, self._new_source_ids, self._new_pages)
+        new = sum(len(buf) * buf.itemsize for buf in appended) + len(self._new_text)
+        return int(base + new)
+
+    # -- mutation ----------------------------------------------------------
+
+    def __setitem__(self, doc_id: int, item: Dict[str, object]) -> None:
+        doc_id = int(doc_id)
+        last = self._new_ids[-1] if len(self._new_ids) else (int(self._ids[-1]) if len(self._ids) else -1)
+        if doc_id <= last:
+            raise ValueError(f"chunk ids must be added in increasing order ({doc_id} <= {last})")
+        source = item["source"]
+        sid = self._source_index.get(source)
+        if sid is None:
+            sid = self._source_index[source] = len(self._sources)
+            self._sources.append(source)
+        self._new_text += item["chunk"].encode("utf-8")
+        self._new_ids.append(doc_id)
+        self._new_offsets.append(len(self._new_text))
+        self._new_source_ids.append(sid)
+        self._new_pages.append(int(item.get("page") or 0))
+
+    def __delitem__(self, doc_id: int) -> None:
+        self._row(doc_id)
+        self._deleted.add(int(doc_id))
+
+    # -- persistence -------------------------------------------------------
+
+    def save(self, directory: str) -> Dict[str, str]:
+        """Write the compacted store into ``directory``; returns the file names used."""
+        os.makedirs(directory, exist_ok=True)
+        new_ids = np.frombuffer(self._new_ids, dtype="int64") if len(self._new_ids) else np.zeros(0, dtype="int64")
+        new_offsets = np.frombuffer(self._new_offsets, dtype="int64")
+        new_sids = np.frombuffer(self._new_source_ids, dtype="int32") if len(self._new_source_ids) else np.zeros(0, dtype="int32")
+        new_pages = np.frombuffer(self._new_pages, dtype="int32") if len(self._new_pages) else np.zeros(0, dtype="int32")
+        if self._deleted:
+            deleted = np.fromiter(self._deleted, dtype="int64", count=len(self._deleted))
+            base_keep = ~np.isin(self._ids, deleted)
+            new_keep = ~np.isin(new_ids, deleted)
+        else:
+            base_keep = np.ones(len(self._ids), dtype=bool)
+            new_keep = np.ones(len(new_ids), dtype=bool)
+
+        ids = np.concatenate((self._ids[base_keep], new_ids[new_keep]))
+        lengths = np.concatenate((np.diff(self._offsets)[base_keep], np.diff(new_offsets)[new_keep]))
+        offsets = np.zeros(len(ids) + 1, dtype="int64")
+        np.cumsum(lengths, out=offsets[1:])
+        # Renumber sources so ones whose chunks were all removed are dropped
+        used, source_ids = np.unique(np.concatenate((self._source_ids[base_keep], new_sids[new_keep])), return_inverse=True)
+        sources = [self._sources[i] for i in used.tolist()]
+        pages = np.concatenate((self._pages[base_keep], new_pages[new_keep])).astype("int32")
+
+        paths = {name: os.path.join(directory, filename) for name, filename in DOCSTORE_FILES.items()}
+        tmp = paths["text"] + ".tmp"
+        new_text = memoryview(self._new_text)
+        with open(tmp, "wb") as f:
+            for start, end in _keep_runs(base_keep):
+                f.write(self._text[self._offsets[start]:self._offsets[end]])
+            for start, end in _keep_runs(new_keep):
+                f.write(new_text[new_offsets[start]:new_offsets[end]])
+        os.replace(tmp, paths["text"])
+        for name, arr in (("ids", ids), ("offsets", offsets), ("source_ids", source_ids.astype("int32")), ("pages", pages)):
+            tmp = paths[name] + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, paths[name])
+        tmp = paths["sources"] + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sources, f, ensure_ascii=False)
+        os.replace(tmp, paths["sources"])
+        return dict(DOCSTORE_FILES)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        """Open a store saved in ``directory``; arrays are memory-mapped read-only unless ``mmap=False``."""
+        paths = {name: os.path.join(directory, filename) for name, filename in DOCSTORE_FILES.items()}
+        mode = "r" if mmap else None
+        store = cls()
+        store._ids = np.load(paths["ids"], mmap_mode=mode)
+        store._offsets = np.load(paths["offsets"], mmap_mode=mode)
+        store._source_ids = np.load(paths["source_ids"], mmap_mode=mode)
+        if os.path.exists(paths["pages"]):
+            store._pages = np.load(paths["pages"], mmap_mode=mode)
+        else:
+            store._pages = np.zeros(len(store._ids), dtype="int32")
+        if os.path.getsize(paths["text"]) == 0:
+            store._text = np.zeros(0, dtype="uint8")
+        elif mmap:
+            store._text = np.memmap(paths["text"], dtype="uint8", mode="r")
+        else:
+            store._text = np.fromfile(paths["text"], dtype="uint8")
+        with open(paths["sources"], "r", encoding="utf-8") as f:
+            store._sources = json.load(f)
+        store._source_index = {source: i for i, source in enumerate(store._sources)}
+        if len(store._offsets) != len(store._ids) + 1 or int(store._offsets[-1]) != len(store._text):
+            raise RuntimeError(f"Docstore in {directory} is inconsistent")
+        return store
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[int, Dict[str, object]]]) -> "ChunkStore":
+        store = cls()
+        for doc_id, item in sorted(items, key=lambda pair: pair[0]):
+            store[doc_id] = item
+        return store
@@ -0,0 +1,241 @@
+# chunking.py
+"""Text normalization and offset-based chunking.
+
+``normalize_text`` drops control and zero-width characters with one
+precompiled ``str.translate`` table and collapses all Unicode whitespace with
+``str.split``, keeping paragraph breaks as ``"\\n\\n"``. Unlike the old
+``string.printable`` filter it keeps non-ASCII text, so Hindi/Devanagari
+content survives.
+
+``chunk_spans`` cuts normalized text into ``(start, end)`` offsets no longer
+than ``chunk_size`` characters, preferring a paragraph break, then a sentence
+end, then a word boundary, and overlapping consecutive chunks by up to
+``chunk_overlap`` characters starting at a sentence or word. Only offsets are
+produced; callers slice the text once per chunk they keep.
+``chunk_document`` does the same for ``(page, text)`` pages and tags each
+span with the page it starts on.
+
+Run ``python chunking.py [files...]`` for a throughput comparison in MB/s
+against the previous implementation. Absolute numbers and the speedup vary
+with the CPU and Python build (1.3x to 2x on the mixed sample so far), so
+the output records the machine it was measured on.
+"""
+
+import os
+import re
+import string
+import time
+import platform
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+
+def _build_translation() -> dict:
+    # Only characters str.split() would not already treat as whitespace need mapping
+    table = {c: None for c in range(0x20) if not chr(c).isspace()}
+    table.update({c: None for c in range(0x7F, 0xA0) if not chr(c).isspace()})
+    # Soft hyphen, zero-width space, word joiner, BOM. ZWJ/ZWNJ are kept: they shape Indic scripts
+    table.update({ord(c): None for c in "\u00ad\u200b\u2060\ufeff"})
+    table[0x2028] = "\n"
+    table[0x2029] = "\n\n"
+    return table
+
+
+_TRANSLATION = str.maketrans(_build_translation())
+# str.translate is slow on non-ASCII text, so it only runs when there is something to map
+_NEEDS_TRANSLATION_RE = re.compile("[" + "".join(re.escape(chr(c)) for c in sorted(_TRANSLATION)) + "]")
+# Two line breaks with only whitespace between them end a paragraph
+_PARAGRAPH_RE = re.compile(r"\n[^\S\n]*\n\s*")
+# Sentence-final punctuation (incl. Devanagari danda) with trailing quotes/brackets, before whitespace
+_SENTENCE_END_RE = re.compile(r"[.!?\u0964\u0965][\"'\u201d\u2019)\]]*(?=\s)")
+
+Span = Tuple[int, int, int]  # (start, end, page); page 0 when unknown
+
+
+def normalize_text(text: str) -> str:
+    """Drop control characters, collapse whitespace and keep paragraph breaks as blank lines."""
+    if not text:
+        return ""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if _NEEDS_TRANSLATION_RE.search(text):
+        text = text.translate(_TRANSLATION)
+    paragraphs = (" ".join(part.split()) for part in _PARAGRAPH_RE.split(text))
+    return "\n\n".join(p for p in paragraphs if p)
+
+
+def chunk_spans(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[Tuple[int, int]]:
+    """``(start, end)`` offsets of chunks of already normalized ``text``."""
+    n = len(text)
+    if n == 0:
+        return []
+    chunk_size = max(1, chunk_size)
+    overlap = max(0, min(chunk_overlap, chunk_size // 2))
+    sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(text)] if n > chunk_size else []
+
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while start < n:
+        limit = start + chunk_size
+        if limit >= n:
+            end = n
+        else:
+            # Never cut in the first half of the budget just to land on a boundary
+            floor = start + chunk_size // 2
+            end = text.rfind("\n\n", floor, limit)
+            if end == -1:
+                i = bisect_right(sentence_ends, limit) - 1
+                if i >= 0 and sentence_ends[i] > floor:
+                    end = sentence_ends[i]
+            if end == -1:
+                end = text.rfind(" ", floor, limit + 1)
+            if end <= start:
+                end = limit
+        spans.append((start, end))
+        if end >= n:
+            break
+
+        if overlap:
+            target = max(start + 1, end - overlap)
+            i = bisect_left(sentence_ends, target)
+            if i < len(sentence_ends) and sentence_ends[i] < end:
+                start = sentence_ends[i]
+            else:
+                space = text.find(" ", target, end)
+                start = space if space != -1 else target
+        else:
+            start = end
+        while start < n and text[start] in " \n":
+            start += 1
+    return spans
+
+
+def chunk_document(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int = 800,
+    chunk_overlap: int = 150,
+) -> Tuple[str, List[Span]]:
+    """Normalize ``(page_number, text)`` pages into one text and chunk it.
+
+    Pages are joined as paragraphs. Returns the normalized text and
+    ``(start, end, page)`` spans, where ``page`` is the page the chunk starts on.
+    """
+    parts: List[str] = []
+    page_starts: List[int] = []
+    page_numbers: List[int] = []
+    pos = 0
+    for page_number, page_text in pages:
+        normalized = normalize_text(page_text)
+        if not normalized:
+            continue
+        if parts:
+            pos += 2
+        page_starts.append(pos)
+        page_numbers.append(page_number)
+        parts.append(normalized)
+        pos += len(normalized)
+    text = "\n\n".join(parts)
+    spans = [
+        (start, end, page_numbers[bisect_right(page_starts, start) - 1])
+        for start, end in chunk_spans(text, chunk_size, chunk_overlap)
+    ]
+    return text, spans
+
+
+def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[str]:
+    """Normalize ``text`` and return its chunks as strings."""
+    text = normalize_text(text)
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, chunk_overlap)]
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def _legacy_normalize_text(text: str) -> str:
+    if not text:
+        return ""
+    text = " ".join(text.split())
+    printable = set(string.printable)
+    return "".join(ch for ch in text if ch in printable)
+
+
+def _legacy_chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[str]:
+    if not text:
+        return []
+    text = _legacy_normalize_text(text)
+    chunks: List[str] = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(n, start + chunk_size)
+        chunks.append(text[start:end])
+        start = end - chunk_overlap
+        if start < 0:
+            start = 0
+        if start >= n or end == n:
+            break
+    return chunks
+
+
+def _sample_corpus(size_mb: float) -> str:
+    english = (
+        "Photosynthesis converts light energy into chemical energy. Chlorophyll absorbs mostly blue and red "
+        "light! Why are leaves green? Because green light is reflected.\n"
+    )
+    hindi = "प्रकाश संश्लेषण में पौधे सूर्य के प्रकाश से भोजन बनाते हैं। क्लोरोफिल हरे रंग का वर्णक है।\n"
+    paragraph = (english * 3 + hindi * 2) + "\n"
+    target = int(size_mb * 1e6)
+    return paragraph * max(1, target // len(paragraph.encode("utf-8")))
+
+
+def _cpu_name() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def benchmark(texts: Optional[List[str]] = None, size_mb: float = 8.0, repeat: int = 3) -> dict:
+    """Normalize+chunk throughput (MB/s of UTF-8 input) of the legacy and current chunkers."""
+    texts = texts or [_sample_corpus(size_mb)]
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    results = {}
+    for name, fn in (("legacy", _legacy_chunk_text), ("current", chunk_text)):
+        best = float("inf")
+        chunks: List[str] = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            chunks = [c for t in texts for c in fn(t)]
+            best = min(best, time.perf_counter() - t0)
+        results[name] = {
+            "mb_per_second": round(mb / best, 2),
+            "seconds": round(best, 3),
+            "chunks": len(chunks),
+            "output_chars": sum(len(c) for c in chunks),
+        }
+    results["input_mb"] = round(mb, 2)
+    results["machine"] = {
+        "cpu": _cpu_name(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    results["speedup"] = round(results["current"]["mb_per_second"] / results["legacy"]["mb_per_second"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    files = sys.argv[1:]
+    corpus = None
+    if files:
+        corpus = []
+        for path in files:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                corpus.append(f.read())
+    print(json.dumps(benchmark(corpus), indent=2, ensure_ascii=False))
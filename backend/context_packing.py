@@ -0,0 +1,181 @@
+# context_packing.py
+"""Assemble retrieved chunks into a compact, token-budgeted prompt context.
+
+Retrieval returns overlapping chunks (consecutive chunks of a document share
+up to ``chunk_overlap`` characters) and often near-duplicates (the same
+paragraph in two uploads). ``pack_context`` turns ranked passages into the
+context sent to the model in three steps:
+
+1. Merge: passages that are consecutive chunks of one source (adjacent ids)
+   are joined into one, with the shared overlap kept once.
+2. Select: maximal marginal relevance picks, at each step, the passage with
+   the best ``lam * relevance - (1 - lam) * redundancy``, where redundancy is
+   the highest term-vector cosine with any passage already picked. Passages
+   at least ``duplicate_threshold`` similar to a picked one are dropped.
+3. Pack: passages are added until ``token_budget`` estimated tokens are
+   used; a first passage larger than the budget is cut at a sentence end.
+
+Token counts are estimates (about four characters per token for English
+text, as with the Titan and Claude tokenizers); they are used for budgeting
+and for reporting the tokens saved against joining every chunk verbatim.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from lexical_index import tokenize
+
+
+CHARS_PER_TOKEN = 4
+SEPARATOR = "\n\n"
+
+_SENTENCE_END_RE = re.compile(r"[.!?\u0964\u0965][\"'\u201d\u2019)\]]*\s")
+# Shorter suffix/prefix matches between adjacent chunks are coincidence, not chunk overlap
+_MIN_OVERLAP = 8
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class Passage:
+    """One retrieved chunk (or a run of merged chunks) with its retrieval score."""
+
+    __slots__ = ("text", "source", "page", "score", "first_id", "last_id", "terms", "norm")
+
+    def __init__(self, text: str, source: str, score: float, page: int = 0, chunk_id: Optional[int] = None):
+        self.text = text
+        self.source = source
+        self.page = page
+        self.score = score
+        self.first_id = chunk_id
+        self.last_id = chunk_id
+        self.terms: Optional[Counter] = None
+        self.norm = 0.0
+
+    def vectorize(self) -> None:
+        self.terms = Counter(tokenize(self.text))
+        self.norm = math.sqrt(sum(c * c for c in self.terms.values()))
+
+    def similarity(self, other: "Passage") -> float:
+        if not self.norm or not other.norm:
+            return 0.0
+        small, large = (self.terms, other.terms) if len(self.terms) <= len(other.terms) else (other.terms, self.terms)
+        dot = sum(count * large.get(term, 0) for term, count in small.items())
+        return dot / (self.norm * other.norm)
+
+
+class PackedContext:
+    def __init__(self, passages: List[Passage], tokens_in: int, truncated: bool = False):
+        self.passages = passages
+        self.context = SEPARATOR.join(p.text for p in passages)
+        self.tokens_in = tokens_in
+        self.tokens = estimate_tokens(self.context)
+        self.truncated = truncated
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_in - self.tokens)
+
+    def stats(self) -> Dict[str, int]:
+        return {"context_tokens": self.tokens, "tokens_saved": self.tokens_saved}
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right`` (up to ``max_overlap``)."""
+    head = right[:_MIN_OVERLAP]
+    if len(head) < _MIN_OVERLAP:
+        return 0
+    start = max(0, len(left) - max_overlap)
+    while True:
+        start = left.find(head, start)
+        if start == -1:
+            return 0
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start += 1
+
+
+def merge_adjacent(passages: Sequence[Passage], max_overlap: int = 400) -> List[Passage]:
+    """Join passages that are consecutive chunks of the same source, best-ranked run first."""
+    by_source: Dict[str, List[Passage]] = {}
+    loose: List[Passage] = []
+    for p in passages:
+        if p.first_id is None:
+            loose.append(p)
+        else:
+            by_source.setdefault(p.source, []).append(p)
+    merged: List[Passage] = list(loose)
+    for group in by_source.values():
+        group = sorted(group, key=lambda p: p.first_id)
+        run = group[0]
+        for p in group[1:]:
+            if p.first_id == run.last_id + 1:
+                shared = _overlap(run.text, p.text, max_overlap)
+                joint = run.text + (p.text[shared:] if shared else SEPARATOR + p.text)
+                combined = Passage(joint, run.source, max(run.score, p.score), run.page)
+                combined.first_id, combined.last_id = run.first_id, p.last_id
+                run = combined
+            else:
+                merged.append(run)
+                run = p
+        merged.append(run)
+    merged.sort(key=lambda p: -p.score)
+    return merged
+
+
+def _cut_to_budget(text: str, budget_tokens: int) -> str:
+    limit = budget_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(text, 0, limit + 1)]
+    cut = ends[-1] if ends and ends[-1] > limit // 2 else limit
+    return text[:cut].rstrip()
+
+
+def pack_context(
+    passages: Sequence[Passage],
+    token_budget: int = 1500,
+    lam: float = 0.7,
+    duplicate_threshold: float = 0.9,
+    max_overlap: int = 400,
+) -> PackedContext:
+    """Merge, de-duplicate with MMR and pack ranked ``passages`` into ``token_budget`` tokens.
+
+    ``passages`` are in retrieval order; the returned context keeps the
+    selection order (most relevant first).
+    """
+    tokens_in = estimate_tokens(SEPARATOR.join(p.text for p in passages))
+    candidates = merge_adjacent(passages, max_overlap)
+    if not candidates:
+        return PackedContext([], tokens_in)
+    for p in candidates:
+        p.vectorize()
+    top, bottom = candidates[0].score, min(p.score for p in candidates)
+    spread = top - bottom
+    relevance = {id(p): (p.score - bottom) / spread if spread > 0 else 1.0 for p in candidates}
+
+    selected: List[Passage] = []
+    redundancy = {id(p): 0.0 for p in candidates}
+    remaining = list(candidates)
+    used = 0
+    truncated = False
+    while remaining:
+        best = max(remaining, key=lambda p: lam * relevance[id(p)] - (1 - lam) * redundancy[id(p)])
+        remaining.remove(best)
+        if redundancy[id(best)] >= duplicate_threshold:
+            continue
+        cost = estimate_tokens(best.text) + (estimate_tokens(SEPARATOR) if selected else 0)
+        if used + cost > token_budget:
+            if selected:
+                continue
+            best.text = _cut_to_budget(best.text, token_budget)
+            truncated = True
+            cost = estimate_tokens(best.text)
+        selected.append(best)
+        used += cost
+        for p in remaining:
+            redundancy[id(p)] = max(redundancy[id(p)], p.similarity(best))
+    return PackedContext(selected, tokens_in, truncated)
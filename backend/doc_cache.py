@@ -0,0 +1,169 @@
+# doc_cache.py
+"""Per-document chunk/embedding cache for single-document RAG (DocChat).
+
+Entries are keyed by S3 key + ETag, so a re-uploaded object is a miss while
+follow-up questions on the same object reuse the parsed chunks and their
+unit-normalized vectors. Entries live in an in-memory LRU bounded by bytes and
+are written through to disk so they survive restarts.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from lexical_index import BM25Index
+
+
+logger = logging.getLogger("doc_cache")
+
+
+class DocumentEntry:
+    """Parsed chunks of one document version plus their embeddings (if any)."""
+
+    __slots__ = ("key", "etag", "chunks", "vectors", "_lexical")
+
+    def __init__(self, key: str, etag: str, chunks: List[str], vectors: Optional[np.ndarray] = None):
+        self.key = key
+        self.etag = etag
+        self.chunks = chunks
+        self.vectors = vectors
+        self._lexical: Optional[BM25Index] = None
+
+    @property
+    def lexical(self) -> BM25Index:
+        """BM25 index over this document's chunks (ids are chunk positions)."""
+        if self._lexical is None:
+            self._lexical = BM25Index.from_texts(enumerate(self.chunks))
+        return self._lexical
+
+    @property
+    def nbytes(self) -> int:
+        """UTF-8 size of the chunk text plus the vectors (the lazily built BM25 index is not counted)."""
+        size = sum(len(c.encode("utf-8")) for c in self.chunks)
+        if self.vectors is not None:
+            size += int(self.vectors.nbytes)
+        return size
+
+
+class DocumentCache:
+    """Byte-bounded LRU of DocumentEntry objects with a write-through disk tier."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, DocumentEntry]" = OrderedDict()
+        # Size of each entry when it was inserted; entries are shared objects, so never re-measured
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # -- paths -------------------------------------------------------------
+
+    def _base_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    # -- public API --------------------------------------------------------
+
+    def get(self, key: str, etag: str) -> Optional[DocumentEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.etag == etag:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load_from_disk(key, etag)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(entry)
+        return entry
+
+    def put(self, entry: DocumentEntry) -> None:
+        with self._lock:
+            self._insert(entry)
+        try:
+            self._save_to_disk(entry)
+        except Exception as e:
+            logger.warning("Failed to persist document cache entry for %s: %s", entry.key, e)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+
+    def _insert(self, entry: DocumentEntry) -> None:
+        if self._entries.pop(entry.key, None) is not None:
+            self._bytes -= self._sizes.pop(entry.key)
+        size = entry.nbytes
+        self._entries[entry.key] = entry
+        self._sizes[entry.key] = size
+        self._bytes += size
+        # Evict least recently used entries; they remain available on disk
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def _save_to_disk(self, entry: DocumentEntry) -> None:
+        base = self._base_path(entry.key)
+        if entry.vectors is not None:
+            tmp_vec = base + ".npy.tmp"
+            with open(tmp_vec, "wb") as f:
+                np.save(f, entry.vectors.astype("float32", copy=False))
+            os.replace(tmp_vec, base + ".npy")
+        elif os.path.exists(base + ".npy"):
+            os.remove(base + ".npy")
+        # Metadata is written last so a partially written entry never matches
+        meta = {"key": entry.key, "etag": entry.etag, "chunks": entry.chunks, "has_vectors": entry.vectors is not None}
+        tmp_meta = base + ".json.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta, base + ".json")
+
+    def _load_from_disk(self, key: str, etag: str) -> Optional[DocumentEntry]:
+        base = self._base_path(key)
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable document cache entry for %s: %s", key, e)
+            return None
+        if meta.get("key") != key or meta.get("etag") != etag:
+            return None
+        vectors = None
+        if meta.get("has_vectors"):
+            try:
+                vectors = np.load(base + ".npy")
+            except Exception as e:
+                logger.warning("Document cache vectors missing for %s: %s", key, e)
+                vectors = None
+            if vectors is not None and len(vectors) != len(meta.get("chunks") or []):
+                vectors = None
+        return DocumentEntry(key, etag, list(meta.get("chunks") or []), vectors)
@@ -0,0 +1,182 @@
+# embedding_engine.py
+"""Concurrent, rate-aware driver for single-input embedding APIs (Bedrock Titan).
+
+Titan embeds one text per ``invoke_model`` call, so ingestion throughput is
+bound by network round-trips. ``EmbeddingEngine`` fans requests out over a
+bounded thread pool, adapts the number of in-flight calls with AIMD (halve on
+throttling, grow by one after a window of successes), retries throttled or
+transient failures with exponential backoff and full jitter, and returns
+vectors in input order. ``embed_one`` must make a single attempt (a client
+without botocore retries): the engine is the only retry layer, so every
+throttle reaches the limiter.
+
+Interactive calls (query embeddings) run in their own lane, with their own
+limiter and threads, so a bulk reindex does not queue them behind
+thousands of chunks. A throttle in the interactive lane also halves the
+bulk limit, so ingestion gives way to queries on the shared quota.
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger("embedding_engine")
+
+# Error codes that mean "slow down" rather than "this request is invalid"
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+}
+TRANSIENT_CODES = {
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+    "ModelTimeoutException",
+}
+
+
+def _error_code(exc: BaseException) -> str:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return str((response.get("Error") or {}).get("Code", ""))
+    return ""
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    return _error_code(exc) in THROTTLING_CODES
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if is_throttling_error(exc) or _error_code(exc) in TRANSIENT_CODES:
+        return True
+    # botocore connection/read timeouts do not carry an error code
+    name = type(exc).__name__
+    return name in {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError"}
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that shrinks on throttling and slowly grows back (AIMD)."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            new_limit = max(self.minimum, self.limit // 2)
+            if new_limit != self.limit:
+                logger.info("Embedding throttled; concurrency %d -> %d", self.limit, new_limit)
+            self.limit = new_limit
+            self._successes = 0
+
+
+class EmbeddingEngine:
+    """Embed many texts concurrently with ``embed_one`` while preserving order."""
+
+    def __init__(
+        self,
+        embed_one: Callable[[str], List[float]],
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        base_delay: float = 0.25,
+        max_delay: float = 20.0,
+        interactive_concurrency: int = 4,
+    ):
+        self.embed_one = embed_one
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = AdaptiveLimiter(max_concurrency, minimum=min_concurrency, maximum=max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self.interactive_limiter = AdaptiveLimiter(interactive_concurrency, maximum=interactive_concurrency)
+        self._interactive_executor = ThreadPoolExecutor(
+            max_workers=interactive_concurrency, thread_name_prefix="embed-query"
+        )
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttles = 0
+
+    def _call_with_retry(self, text: str, interactive: bool = False) -> List[float]:
+        limiter = self.interactive_limiter if interactive else self.limiter
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                vector = self.embed_one(text)
+            except Exception as e:
+                limiter.release()
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    raise
+                throttled = is_throttling_error(e)
+                if throttled:
+                    limiter.on_throttle()
+                    if interactive:
+                        self.limiter.on_throttle()
+                with self._stats_lock:
+                    self.retries += 1
+                    self.throttles += int(throttled)
+                # Exponential backoff with full jitter
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
+                continue
+            limiter.release()
+            limiter.on_success()
+            with self._stats_lock:
+                self.requests += 1
+            return vector
+
+    def embed(self, texts: Sequence[str], interactive: bool = False) -> List[List[float]]:
+        if not texts:
+            return []
+        if len(texts) == 1:
+            # Single text (usually a query): skip the pool hop
+            return [self._call_with_retry(texts[0], interactive)]
+        executor = self._interactive_executor if interactive else self._executor
+        futures = [executor.submit(self._call_with_retry, t, interactive) for t in texts]
+        try:
+            return [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "concurrency_limit": self.limiter.limit,
+                "interactive_concurrency_limit": self.interactive_limiter.limit,
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttles": self.throttles,
+            }
@@ -0,0 +1,288 @@
+# embedding_store.py
+"""Content-addressed, append-only store of embedding vectors.
+
+Vectors are keyed by sha256(model id, output dimensions, normalized text), so
+identical chunks are embedded once no matter which document, reload or
+request they come from. Each (model, dimensions, dtype) gets its own directory:
+
+    meta.json     model id, requested dimensions, vector width and dtype
+    keys.bin      32-byte sha256 digests, one per row, append-only
+    vectors.f32   packed rows in the same order, append-only (vectors.f16 /
+                  vectors.i8 for the smaller dtypes)
+
+Rows are float32, float16, or int8 codes followed by a float32 scale (the
+row's largest absolute component / 127), so a 1024-dim vector takes 4096,
+2048 or 1028 bytes. Reads always return float32.
+
+Appends take an exclusive ``flock`` and every process tails rows written by
+others, so several uvicorn workers can share one store.
+
+The store only grows with the corpus: it holds document chunk embeddings.
+Query embeddings go to ``QueryVectorCache``, a bounded in-memory LRU, so
+neither disk nor memory grows with query traffic.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - non-POSIX platforms
+    fcntl = None  # type: ignore
+
+
+logger = logging.getLogger("embedding_store")
+
+DIGEST_SIZE = 32
+DTYPES = ("float32", "float16", "int8")
+_VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+
+
+def normalize_for_key(text: str) -> str:
+    """Canonical form used for hashing: NFC unicode with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def embedding_key(model_id: str, dimensions: int, text: str) -> bytes:
+    material = f"{model_id}\0{dimensions}\0{normalize_for_key(text)}"
+    return hashlib.sha256(material.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, root_dir: str, model_id: str, dimensions: int = 0, dtype: str = "float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"embedding store dtype must be one of {', '.join(DTYPES)}")
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.dtype = dtype
+        material = f"{model_id}\0{dimensions}" if dtype == "float32" else f"{model_id}\0{dimensions}\0{dtype}"
+        slug = hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(root_dir, slug)
+        os.makedirs(self.path, exist_ok=True)
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._vectors_path = os.path.join(self.path, _VECTOR_FILES[dtype])
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock = threading.RLock()
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._load_meta()
+        self._refresh()
+
+    # -- keys --------------------------------------------------------------
+
+    def key_for(self, text: str) -> bytes:
+        return embedding_key(self.model_id, self.dimensions, text)
+
+    # -- public API --------------------------------------------------------
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.key_for(t) for t in texts]
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                # Another worker may have appended the vectors we are missing
+                self._refresh()
+            rows = [self._rows.get(k) for k in keys]
+            found = sum(1 for r in rows if r is not None)
+            self.hits += found
+            self.misses += len(rows) - found
+            if not found:
+                return [None] * len(rows)
+            return self._read_rows(rows)
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype="float32")
+        keys = [self.key_for(t) for t in texts]
+        with self._lock, open(self._keys_path, "ab") as kf, open(self._vectors_path, "ab") as vf:
+            if fcntl is not None:
+                fcntl.flock(kf.fileno(), fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self.dim is None:
+                    self.dim = int(matrix.shape[1])
+                    self._write_meta()
+                elif matrix.shape[1] != self.dim:
+                    raise ValueError(f"Vector width {matrix.shape[1]} does not match store width {self.dim}")
+                new_keys: List[bytes] = []
+                new_rows: List[int] = []
+                seen = set()
+                for i, key in enumerate(keys):
+                    if key in self._rows or key in seen:
+                        continue
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(i)
+                if not new_keys:
+                    return
+                # Drop any half-written row left by a crash so keys and vectors stay aligned
+                kf.truncate(self._count * DIGEST_SIZE)
+                vf.truncate(self._count * self._row_bytes())
+                # Vectors first, keys second: a key is only visible once its row exists
+                vf.write(self._encode(matrix[new_rows]))
+                vf.flush()
+                kf.write(b"".join(new_keys))
+                kf.flush()
+                for key in new_keys:
+                    self._rows[key] = self._count
+                    self._count += 1
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(kf.fileno(), fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            size = 0
+            for path in (self._keys_path, self._vectors_path):
+                if os.path.exists(path):
+                    size += os.path.getsize(path)
+            return {
+                "model_id": self.model_id,
+                "dimensions": self.dimensions,
+                "dtype": self.dtype,
+                "dim": self.dim,
+                "vectors": self._count,
+                "bytes": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+
+    def _load_meta(self) -> None:
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = int(meta["dim"]) if meta.get("dim") else None
+
+    def _write_meta(self) -> None:
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model_id": self.model_id, "dimensions": self.dimensions, "dim": self.dim, "dtype": self.dtype}, f)
+        os.replace(tmp, self._meta_path)
+
+    def _refresh(self) -> None:
+        """Index rows appended since the last refresh (by this or another process)."""
+        if self.dim is None:
+            self._load_meta()
+            if self.dim is None:
+                return
+        if not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        row_bytes = self._row_bytes()
+        # A crash between the two appends can leave a vector without a key; ignore it
+        complete = min(os.path.getsize(self._keys_path) // DIGEST_SIZE, os.path.getsize(self._vectors_path) // row_bytes)
+        if complete <= self._count:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._count * DIGEST_SIZE)
+            data = f.read((complete - self._count) * DIGEST_SIZE)
+        for i in range(len(data) // DIGEST_SIZE):
+            key = data[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]
+            self._rows.setdefault(key, self._count + i)
+        self._count = complete
+
+    def _row_bytes(self) -> int:
+        if self.dtype == "int8":
+            return self.dim + 4
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    def _encode(self, matrix: np.ndarray) -> bytes:
+        if self.dtype == "float32":
+            return np.ascontiguousarray(matrix, dtype="float32").tobytes()
+        if self.dtype == "float16":
+            return np.ascontiguousarray(matrix, dtype="float16").tobytes()
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype("int8")
+        rows = np.empty((len(matrix), self.dim + 4), dtype="uint8")
+        rows[:, :self.dim] = codes.view("uint8")
+        rows[:, self.dim:] = scales.astype("float32")[:, None].view("uint8")
+        return rows.tobytes()
+
+    def _decode(self, buf: bytes) -> np.ndarray:
+        if self.dtype == "float32":
+            return np.frombuffer(buf, dtype="float32")
+        if self.dtype == "float16":
+            return np.frombuffer(buf, dtype="float16").astype("float32")
+        scale = np.frombuffer(buf, dtype="float32", offset=self.dim)[0]
+        return np.frombuffer(buf, dtype="int8", count=self.dim).astype("float32") * scale
+
+    def _read_rows(self, rows: List[Optional[int]]) -> List[Optional[np.ndarray]]:
+        row_bytes = self._row_bytes()
+        out: List[Optional[np.ndarray]] = []
+        with open(self._vectors_path, "rb") as f:
+            fd = f.fileno()
+            for row in rows:
+                if row is None:
+                    out.append(None)
+                    continue
+                buf = os.pread(fd, row_bytes, row * row_bytes)
+                out.append(self._decode(buf))
+        return out
+
+
+class QueryVectorCache:
+    """Bounded LRU of query embeddings (never persisted), keyed like the store."""
+
+    def __init__(self, model_id: str, dimensions: int = 0, max_entries: int = 4096):
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.max_entries = max(0, max_entries)
+        self._vectors: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, text: str) -> bytes:
+        return embedding_key(self.model_id, self.dimensions, text)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.key_for(t) for t in texts]
+        with self._lock:
+            found: List[Optional[np.ndarray]] = []
+            for key in keys:
+                vec = self._vectors.get(key)
+                if vec is not None:
+                    self._vectors.move_to_end(key)
+                found.append(vec)
+            hits = sum(1 for vec in found if vec is not None)
+            self.hits += hits
+            self.misses += len(found) - hits
+            return found
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = self.key_for(text)
+                self._vectors[key] = np.asarray(vec, dtype="float32")
+                self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._vectors),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
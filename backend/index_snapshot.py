@@ -0,0 +1,290 @@
+# index_snapshot.py
+"""Publish built index generations to shared storage and pull them on other nodes.
+
+A snapshot is one generation's files copied, unchanged, to a snapshot root
+that is either a local/shared directory (``/mnt/share/rag`` or
+``file:///mnt/share/rag``) or an S3 prefix (``s3://bucket/rag-snapshots``,
+which also works against a local S3 stand-in through ``endpoint_url``):
+
+    <root>/<generation>/index.faiss, docstore.*, lexical.*, manifest.json
+    <root>/<generation>/snapshot.json   sizes and sha256 of the files (written last)
+    <root>/LATEST                       id of the most recently published generation
+
+Pulling downloads into a hidden directory under ``generations/``, verifies
+every checksum, renames it into place and only then switches CURRENT, so a
+node never loads a partial or corrupted snapshot. A snapshot built with
+another embedding model or width, in an index format this node cannot
+read, or older than the local CURRENT generation is rejected before
+anything changes (older ones can be pulled explicitly to roll back). Files are stored as-is
+(no archive), so a pulled generation is memory-mapped straight from disk
+like a locally built one.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import index_store
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+
+logger = logging.getLogger("index_snapshot")
+
+SNAPSHOT_FILE = "snapshot.json"
+LATEST_FILE = "LATEST"
+SNAPSHOT_FORMAT = 1
+_HASH_BLOCK = 1 << 20
+
+
+class SnapshotRejected(RuntimeError):
+    """A snapshot that must not replace the local CURRENT generation."""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _LocalTarget:
+    def __init__(self, root: str):
+        self.root = root
+
+    def __str__(self) -> str:
+        return self.root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def put_file(self, local_path: str, name: str) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, path)
+
+    def get_file(self, name: str, local_path: str) -> None:
+        shutil.copyfile(self._path(name), local_path)
+
+    def put_bytes(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class _S3Target:
+    def __init__(self, client, bucket: str, prefix: str):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def __str__(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def put_file(self, local_path: str, name: str) -> None:
+        # Managed transfer: multipart with parallel parts for large index files
+        self.client.upload_file(local_path, self.bucket, self._key(name))
+
+    def get_file(self, name: str, local_path: str) -> None:
+        self.client.download_file(self.bucket, self._key(name), local_path)
+
+    def put_bytes(self, name: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=data)
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))["Body"].read()
+        except Exception as e:
+            code = str((getattr(e, "response", None) or {}).get("Error", {}).get("Code", ""))
+            if code in ("NoSuchKey", "404", "NotFound"):
+                return None
+            raise
+
+
+def open_target(uri: str, s3_client_factory: Optional[Callable[[], Any]] = None):
+    """Snapshot storage for ``uri``: ``s3://bucket/prefix``, ``file:///path`` or a plain path."""
+    if not uri:
+        raise RuntimeError("No snapshot location configured (RAG_SNAPSHOT_URI)")
+    if uri.startswith("s3://"):
+        if s3_client_factory is None:
+            raise RuntimeError("An S3 client is required for s3:// snapshot locations")
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return _S3Target(s3_client_factory(), bucket, prefix)
+    if uri.startswith("file://"):
+        uri = uri[len("file://"):]
+    return _LocalTarget(uri)
+
+
+def describe_snapshot(target, generation: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The snapshot record of ``generation`` (default: LATEST), or None if nothing is published."""
+    if generation is None:
+        latest = target.get_bytes(LATEST_FILE)
+        if not latest:
+            return None
+        generation = latest.decode("utf-8").strip()
+    data = target.get_bytes(f"{generation}/{SNAPSHOT_FILE}")
+    return json.loads(data) if data else None
+
+
+def publish_snapshot(index_dir: str, target, set_latest: bool = True) -> Dict[str, Any]:
+    """Copy the generation in ``index_dir`` to ``target`` and (by default) make it LATEST.
+
+    Publishing a generation that is already there with the same checksums
+    only moves LATEST.
+    """
+    manifest = index_store.read_manifest(index_dir)
+    if manifest is None:
+        raise RuntimeError(f"No index to snapshot in {index_dir}")
+    generation = manifest.get("generation")
+    if not generation:
+        raise RuntimeError("Only generation-layout indexes can be snapshotted; call /reload once to migrate")
+
+    t0 = time.time()
+    files: Dict[str, Dict[str, Any]] = {}
+    for name in index_store.generation_files(index_dir, manifest):
+        path = os.path.join(index_dir, name)
+        files[name] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    record = {
+        "format": SNAPSHOT_FORMAT,
+        "generation": generation,
+        "format_version": manifest.get("format_version"),
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embed_model_id": manifest.get("embed_model_id"),
+        "embed_dimensions": manifest.get("embed_dimensions", 0),
+        "index_mode": manifest.get("index_mode"),
+        "chunks": manifest.get("chunks"),
+        "bytes": sum(f["size"] for f in files.values()),
+        "files": files,
+    }
+
+    existing = describe_snapshot(target, generation)
+    if existing is None or existing.get("files") != files:
+        for name in files:
+            target.put_file(os.path.join(index_dir, name), f"{generation}/{name}")
+        # The record goes last: a generation without one is an incomplete upload
+        target.put_bytes(f"{generation}/{SNAPSHOT_FILE}", json.dumps(record, indent=2).encode("utf-8"))
+    if set_latest:
+        target.put_bytes(LATEST_FILE, generation.encode("utf-8"))
+    logger.info("Published snapshot %s (%d bytes) to %s in %d ms",
+                generation, record["bytes"], target, int((time.time() - t0) * 1000))
+    return record
+
+
+def check_compatible(
+    info: Dict[str, Any], embed_model_id: Optional[str], embed_dimensions: Optional[int]
+) -> None:
+    """Raise SnapshotRejected unless a snapshot record or manifest can be served by this node.
+
+    ``embed_model_id`` / ``embed_dimensions`` of None skip that check.
+    """
+    generation = info.get("generation")
+    if "format" in info and info["format"] != SNAPSHOT_FORMAT:
+        raise SnapshotRejected(f"Snapshot {generation} has unsupported snapshot format {info['format']}")
+    if info.get("format_version") not in index_store.READABLE_FORMAT_VERSIONS:
+        raise SnapshotRejected(f"Snapshot {generation} has unsupported index format {info.get('format_version')}")
+    if embed_model_id is not None and info.get("embed_model_id") != embed_model_id:
+        raise SnapshotRejected(
+            f"Snapshot {generation} was built with {info.get('embed_model_id')}, this node embeds with {embed_model_id}"
+        )
+    if embed_dimensions is not None and int(info.get("embed_dimensions") or 0) != embed_dimensions:
+        raise SnapshotRejected(
+            f"Snapshot {generation} has {info.get('embed_dimensions') or 0}-dim embeddings, "
+            f"this node uses {embed_dimensions}"
+        )
+
+
+def pull_snapshot(
+    target,
+    root: str,
+    generation: Optional[str] = None,
+    keep: int = 2,
+    on_file: Optional[Callable[[str, int], None]] = None,
+    embed_model_id: Optional[str] = None,
+    embed_dimensions: Optional[int] = None,
+    allow_older: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """Download a snapshot into ``root``'s generations and make it CURRENT.
+
+    Returns the snapshot record, or None when nothing is published. Raises
+    SnapshotRejected, leaving CURRENT as it was, for a snapshot that fails
+    ``check_compatible`` (checked on the record before downloading and on
+    the downloaded manifest before switching) or, unless ``allow_older``,
+    one older than the local CURRENT generation. A generation already
+    present locally is not downloaded again. Concurrent pulls into the same
+    ``root`` (several workers starting at once) are serialized with a lock
+    file. ``on_file(name, size)`` is called after each verified file.
+    """
+    record = describe_snapshot(target, generation)
+    if record is None:
+        return None
+    generation = record["generation"]
+    # Records published before format_version was recorded are checked on their manifest only
+    check_compatible(
+        record if "format_version" in record else {**record, "format_version": index_store.FORMAT_VERSION},
+        embed_model_id, embed_dimensions,
+    )
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "snapshot.lock"), "a+") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        current = index_store.current_generation_id(root)
+        if current == generation:
+            return record
+        # Generation ids start with their UTC build time, so they sort by age
+        if current is not None and generation < current and not allow_older:
+            raise SnapshotRejected(f"Snapshot {generation} is older than the local generation {current}")
+        final_dir = index_store.generation_dir(root, generation)
+        if index_store.read_manifest(final_dir) is None:
+            _download(target, record, final_dir, on_file)
+        check_compatible(index_store.read_manifest(final_dir) or {}, embed_model_id, embed_dimensions)
+        index_store.set_current_generation(root, generation, keep)
+    return record
+
+
+def _download(target, record: Dict[str, Any], final_dir: str, on_file: Optional[Callable[[str, int], None]]) -> None:
+    generation = record["generation"]
+    staging = os.path.join(os.path.dirname(final_dir), f".pull-{generation}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(staging)
+    t0 = time.time()
+    try:
+        # Manifest last, so the staging directory never looks like a complete generation early
+        names = sorted(record["files"], key=lambda name: name == index_store.MANIFEST_FILE)
+        for name in names:
+            expected = record["files"][name]
+            path = os.path.join(staging, name)
+            target.get_file(f"{generation}/{name}", path)
+            if os.path.getsize(path) != expected["size"] or file_sha256(path) != expected["sha256"]:
+                raise RuntimeError(f"Snapshot {generation} file {name} failed checksum verification")
+            if on_file is not None:
+                on_file(name, expected["size"])
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.rename(staging, final_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info("Pulled snapshot %s (%d bytes) from %s in %d ms",
+                generation, record.get("bytes", 0), target, int((time.time() - t0) * 1000))
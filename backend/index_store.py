@@ -0,0 +1,325 @@
+# index_store.py
+"""On-disk persistence for the global FAISS index and its docstore.
+
+Layout of one index directory:
+    index.faiss     FAISS index written with faiss.write_index
+    docstore.*      columnar docstore (see chunk_store): ids, text offsets, source ids, text blob
+    lexical.*       BM25 inverted index over the same ids (see lexical_index), optional
+    manifest.json   metadata describing the files above (written last)
+
+Each build is written to its own generation directory under the index root:
+    generations/<generation id>/   one index directory per build
+    CURRENT                        id of the live generation, replaced atomically
+    readers/<host>.<pid>           generation each serving process has loaded
+
+A generation is never modified after CURRENT points at it, so processes that
+still have an older generation open (or memory-mapped) keep a consistent set
+of files while a new one is published. Pruning skips every generation a
+live process on this host has registered as loaded. Indexes are loaded read-only with FAISS
+mmap so several uvicorn workers on the same host share a single copy of the
+pages through the OS page cache.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from chunk_store import ChunkStore
+from lexical_index import BM25Index
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - runtime dependency
+    faiss = None  # type: ignore
+
+
+logger = logging.getLogger("index_store")
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "docstore.json"
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"
+READERS_DIR = "readers"
+FORMAT_VERSION = 4
+# Version 2 stored the docstore as JSON and versions 2-3 the lexical index as one .npz; both are still readable
+READABLE_FORMAT_VERSIONS = (2, 3, 4)
+
+# Unpublished generation directories older than this are leftovers of crashed builds
+_STALE_BUILD_SECONDS = 6 * 3600
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _load_legacy_docstore(path: str) -> ChunkStore:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    sources = data["sources"]
+    return ChunkStore.from_items(
+        (doc_id, {"chunk": c, "source": sources[sid]})
+        for doc_id, sid, c in zip(data["ids"], data["source_ids"], data["chunks"])
+    )
+
+
+def save_index(
+    index_dir: str,
+    index,
+    docstore: ChunkStore,
+    manifest: Optional[Dict[str, Any]] = None,
+    lexical: Optional[BM25Index] = None,
+) -> Dict[str, Any]:
+    """Persist ``index``, ``docstore`` and ``lexical`` to ``index_dir`` and return the manifest written."""
+    if faiss is None:
+        raise RuntimeError("faiss-cpu is required. Install with: pip install faiss-cpu")
+    os.makedirs(index_dir, exist_ok=True)
+
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    tmp_index = index_path + ".tmp"
+    faiss.write_index(index, tmp_index)
+    os.replace(tmp_index, index_path)
+    files: Dict[str, Any] = {"index": INDEX_FILE, "docstore": docstore.save(index_dir)}
+    if lexical is not None:
+        files["lexical"] = lexical.save(index_dir)
+
+    data: Dict[str, Any] = dict(manifest or {})
+    data.update({
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "ntotal": int(index.ntotal),
+        "dim": int(index.d),
+        "chunks": len(docstore),
+        "files": files,
+    })
+    # The manifest is written last; a directory without one is never loaded
+    _write_json_atomic(os.path.join(index_dir, MANIFEST_FILE), data)
+    return data
+
+
+def read_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(index_dir: str, mmap: bool = True) -> Optional[Tuple[Any, ChunkStore, Dict[str, Any]]]:
+    """Load ``(index, docstore, manifest)`` from ``index_dir`` or return None if absent.
+
+    With ``mmap=True`` the index and docstore arrays are opened read-only and
+    memory-mapped; pass ``mmap=False`` to get a private in-memory copy of the
+    index that can be modified. The docstore never writes to its mapped
+    arrays, so it is safe to modify either way.
+    """
+    if faiss is None:
+        raise RuntimeError("faiss-cpu is required. Install with: pip install faiss-cpu")
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None
+    if manifest.get("format_version") not in READABLE_FORMAT_VERSIONS:
+        logger.warning("Ignoring index in %s with unsupported format %s", index_dir, manifest.get("format_version"))
+        return None
+    files = manifest.get("files") or {}
+    index_path = os.path.join(index_dir, files.get("index", INDEX_FILE))
+    if mmap:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    else:
+        index = faiss.read_index(index_path)
+    if manifest["format_version"] == 2:
+        docstore = _load_legacy_docstore(os.path.join(index_dir, files.get("docstore", LEGACY_DOCSTORE_FILE)))
+    else:
+        docstore = ChunkStore.load(index_dir, mmap=mmap)
+    if index.ntotal != len(docstore):
+        raise RuntimeError(
+            f"Index in {index_dir} is inconsistent: {index.ntotal} vectors vs {len(docstore)} docstore entries"
+        )
+    return index, docstore, manifest
+
+
+def load_lexical(index_dir: str, manifest: Dict[str, Any], mmap: bool = True) -> Optional[BM25Index]:
+    """Load the BM25 index saved with ``manifest`` (memory-mapped by default), or None if it has none."""
+    files = (manifest.get("files") or {}).get("lexical")
+    if not files:
+        return None
+    if isinstance(files, str):
+        # Format 3 and older: one lexical.npz, read into memory
+        return BM25Index.load_legacy(os.path.join(index_dir, files))
+    return BM25Index.load(index_dir, mmap=mmap)
+
+
+# -- generations -----------------------------------------------------------
+
+def new_generation_id() -> str:
+    """Sortable, unique id: UTC build time plus a random suffix."""
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+
+
+def generation_dir(root: str, generation: str) -> str:
+    return os.path.join(root, GENERATIONS_DIR, generation)
+
+
+def current_generation_id(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            generation = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return generation or None
+
+
+def current_index_dir(root: str) -> str:
+    """Directory of the live generation; ``root`` itself for indexes saved before generations."""
+    generation = current_generation_id(root)
+    return generation_dir(root, generation) if generation else root
+
+
+def save_generation(
+    root: str,
+    index,
+    docstore: ChunkStore,
+    manifest: Optional[Dict[str, Any]] = None,
+    lexical: Optional[BM25Index] = None,
+    keep: int = 2,
+) -> Dict[str, Any]:
+    """Write a new generation under ``root``, make it CURRENT and return its manifest.
+
+    All files are written to a fresh directory first; the only step visible
+    to readers is the atomic replace of CURRENT. The ``keep`` most recent
+    generations (including the new one) are retained, older ones are removed.
+    """
+    generation = new_generation_id()
+    data = save_index(
+        generation_dir(root, generation), index, docstore, {**(manifest or {}), "generation": generation}, lexical
+    )
+    set_current_generation(root, generation, keep)
+    return data
+
+
+def set_current_generation(root: str, generation: str, keep: int = 2) -> None:
+    """Atomically point CURRENT at an already written generation, then prune old ones."""
+    tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+    try:
+        prune_generations(root, keep)
+    except Exception as e:
+        logger.warning("Failed to prune old index generations in %s: %s", root, e)
+
+
+def _reader_path(root: str, host: str, pid: int) -> str:
+    return os.path.join(root, READERS_DIR, f"{host}.{pid}")
+
+
+def register_reader(root: str, generation: str) -> None:
+    """Record that this process serves ``generation``, so other processes do not prune it."""
+    path = _reader_path(root, socket.gethostname(), os.getpid())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp, path)
+
+
+def unregister_reader(root: str) -> None:
+    try:
+        os.remove(_reader_path(root, socket.gethostname(), os.getpid()))
+    except FileNotFoundError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reader_generations(root: str) -> List[str]:
+    """Generations loaded by live processes on this host; entries of dead processes are removed.
+
+    Readers on other hosts sharing ``root`` cannot be checked and are kept
+    for as long as their entry exists.
+    """
+    base = os.path.join(root, READERS_DIR)
+    if not os.path.isdir(base):
+        return []
+    host = socket.gethostname()
+    held: List[str] = []
+    for name in os.listdir(base):
+        path = os.path.join(base, name)
+        reader_host, _, pid = name.rpartition(".")
+        if not pid.isdigit():
+            continue
+        if reader_host == host and not _pid_alive(int(pid)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                held.append(f.read().strip())
+        except OSError:
+            continue
+    return held
+
+
+def generation_files(index_dir: str, manifest: Dict[str, Any]) -> List[str]:
+    """Names of the files making up the index in ``index_dir``, manifest last."""
+    names: List[str] = []
+    for value in (manifest.get("files") or {}).values():
+        for name in (value.values() if isinstance(value, dict) else [value]):
+            if name not in names and os.path.exists(os.path.join(index_dir, name)):
+                names.append(name)
+    names.append(MANIFEST_FILE)
+    return names
+
+
+def prune_generations(root: str, keep: int = 2) -> List[str]:
+    """Delete all but the ``keep`` newest published generations; returns the ids removed.
+
+    The CURRENT generation and generations still loaded by a live process
+    (see ``register_reader``) are never removed. Directories without a
+    manifest are builds still in progress unless they are older than a few
+    hours.
+    """
+    base = os.path.join(root, GENERATIONS_DIR)
+    if not os.path.isdir(base):
+        return []
+    current = current_generation_id(root)
+    held = set(reader_generations(root))
+    published: List[Tuple[float, str]] = []
+    removed: List[str] = []
+    for name in os.listdir(base):
+        path = os.path.join(base, name)
+        if name == current or name in held or not os.path.isdir(path):
+            continue
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            published.append((os.path.getmtime(manifest_path), name))
+        elif time.time() - os.path.getmtime(path) > _STALE_BUILD_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+    published.sort(reverse=True)
+    for _, name in published[max(0, keep - 1):]:
+        shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+        removed.append(name)
+    if removed:
+        logger.info("Pruned index generations: %s", ", ".join(removed))
+    return removed
@@ -0,0 +1,177 @@
+# ingest_pipeline.py
+"""Staged, bounded-queue pipeline used to stream documents into the index.
+
+A pipeline is a source iterable, a list of ``Stage`` objects and a sink. Each
+stage runs ``fn`` on its own worker threads and hands results to the next
+stage through a bounded queue, so fetching, parsing, chunking, embedding and
+index insertion all overlap while at most ``queue_size`` items wait between
+any two stages. A stage ``fn`` returns the item for the next stage or None to
+drop it. The sink runs on the calling thread, so it can mutate shared state
+(index, docstore) without locking.
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger("ingest_pipeline")
+
+_END = object()
+
+
+class PipelineCancelled(RuntimeError):
+    pass
+
+
+class Stage:
+    """One pipeline step.
+
+    ``on_error="skip"`` logs and drops items whose ``fn`` raises (e.g. an
+    unparsable PDF); ``on_error="raise"`` aborts the whole pipeline.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1, queue_size: int = 8, on_error: str = "skip"):
+        if on_error not in ("skip", "raise"):
+            raise ValueError("on_error must be 'skip' or 'raise'")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.on_error = on_error
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: List[Stage],
+    sink: Callable[[Any], None],
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Run ``source`` through ``stages`` into ``sink`` and return per-stage stats.
+
+    Raises the first error from a ``raise`` stage, the source or the sink, or
+    ``PipelineCancelled`` if ``cancel`` is set before the pipeline drains.
+    """
+    abort = threading.Event()
+    errors: List[BaseException] = []
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    out_queue: "queue.Queue[Any]" = queue.Queue(maxsize=stages[-1].queue_size if stages else 8)
+    queues.append(out_queue)
+
+    def stopped() -> bool:
+        return abort.is_set() or (cancel is not None and cancel.is_set())
+
+    def put(q: "queue.Queue[Any]", item: Any) -> bool:
+        # Bounded put that gives up once the pipeline is aborting
+        while not stopped():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fail(exc: BaseException) -> None:
+        errors.append(exc)
+        abort.set()
+
+    def feed() -> None:
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            put(queues[0], _END)
+
+    def worker(stage: Stage, in_q: "queue.Queue[Any]", out_q: "queue.Queue[Any]", remaining: List[int], lock: threading.Lock) -> None:
+        while not stopped():
+            try:
+                item = in_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END:
+                # Let sibling workers see the end marker too; the last one forwards it
+                in_q.put(_END)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    put(out_q, _END)
+                return
+            t0 = time.time()
+            try:
+                result = stage.fn(item)
+            except BaseException as e:
+                with stage._lock:
+                    stage.errors += 1
+                if stage.on_error == "raise":
+                    fail(e)
+                    return
+                logger.warning("Stage %s dropped an item: %s", stage.name, e)
+                continue
+            finally:
+                with stage._lock:
+                    stage.busy_seconds += time.time() - t0
+            with stage._lock:
+                if result is None:
+                    stage.dropped += 1
+                else:
+                    stage.processed += 1
+            if result is not None and not put(out_q, result):
+                return
+
+    threads = [threading.Thread(target=feed, name="ingest-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        remaining = [stage.workers]
+        lock = threading.Lock()
+        for n in range(stage.workers):
+            threads.append(threading.Thread(
+                target=worker,
+                args=(stage, queues[i], queues[i + 1], remaining, lock),
+                name=f"ingest-{stage.name}-{n}",
+                daemon=True,
+            ))
+    for t in threads:
+        t.start()
+
+    try:
+        while not stopped():
+            try:
+                item = out_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END:
+                break
+            sink(item)
+    except BaseException as e:
+        fail(e)
+    finally:
+        if not errors and cancel is not None and cancel.is_set():
+            abort.set()
+        for t in threads:
+            t.join(timeout=5)
+
+    if errors:
+        raise errors[0]
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled("ingestion cancelled")
+    return {stage.name: stage.stats() for stage in stages}
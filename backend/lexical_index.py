@@ -0,0 +1,371 @@
+# lexical_index.py
+"""BM25 inverted index and reciprocal-rank fusion for hybrid retrieval.
+
+The index is filled at chunking time, keyed by the same ids as the FAISS
+index, and persisted next to it. Exact-term queries (formula names, chapter
+titles) are answered without a query embedding, and the lexical path carries
+retrieval alone when Bedrock embeddings are unavailable.
+
+Postings are stored like the columnar docstore (chunk_store): a saved index
+is a set of ``.npy`` files holding a CSR matrix (sorted vocabulary, per-term
+posting offsets, doc ids and term frequencies) and the document lengths,
+opened with ``mmap`` so every uvicorn worker shares one copy of the pages.
+Documents added after loading go to a small append segment and removals
+are tombstones; ``save`` merges both into new arrays.
+"""
+
+import os
+import json
+import math
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Letters/digits plus combining marks so Devanagari and other Indic scripts
+# tokenize into whole words (\w alone splits on vowel signs)
+_TOKEN_RE = re.compile(r"(?:[^\W_]|[\u0300-\u036f\u0900-\u0dff\u1cd0-\u1cff\ua8e0-\ua8ff])+")
+
+LEXICAL_FILES = {
+    "vocab": "lexical.vocab.bin",
+    "vocab_offsets": "lexical.vocab_offsets.npy",
+    "offsets": "lexical.offsets.npy",
+    "doc_ids": "lexical.doc_ids.npy",
+    "tfs": "lexical.tfs.npy",
+    "len_ids": "lexical.len_ids.npy",
+    "lens": "lexical.lens.npy",
+    "meta": "lexical.meta.json",
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class _Vocabulary:
+    """Sorted terms stored as one UTF-8 blob plus offsets; indexable for ``bisect``."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def find(self, term: str) -> int:
+        """Row of ``term``, or -1."""
+        i = bisect_left(self, term)
+        return i if i < len(self) and self[i] == term else -1
+
+    def terms(self) -> List[str]:
+        blob = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+
+def _vocabulary(terms: Sequence[str]) -> _Vocabulary:
+    encoded = [t.encode("utf-8") for t in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(t) for t in encoded], out=offsets[1:])
+    return _Vocabulary(np.frombuffer(b"".join(encoded), dtype="uint8"), offsets)
+
+
+class BM25Index:
+    """Okapi BM25 over chunk ids with add/remove support.
+
+    New doc ids must be larger than every id already in the index, which
+    holds for ingestion since ids come from a monotonically increasing
+    counter (and for a document's chunk positions).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.total_len = 0
+        # Base segment: CSR postings over a sorted vocabulary, memory-mapped once saved
+        self._vocab = _vocabulary([])
+        self._offsets = np.zeros(1, dtype="int64")
+        self._doc_ids = np.zeros(0, dtype="int64")
+        self._tfs = np.zeros(0, dtype="int32")
+        self._len_ids = np.zeros(0, dtype="int64")
+        self._lens = np.zeros(0, dtype="int32")
+        # Append segment: postings in insertion order, terms numbered in ``_new_terms``
+        self._new_terms: Dict[str, int] = {}
+        self._new_term_ids = array("i")
+        self._new_doc_ids = array("q")
+        self._new_tfs = array("i")
+        self._new_len_ids = array("q")
+        self._new_lens = array("i")
+        self._new_csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._deleted: set = set()
+        self._deleted_arr: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._len_ids) + len(self._new_len_ids) - len(self._deleted)
+
+    def _last_id(self) -> int:
+        if len(self._new_len_ids):
+            return self._new_len_ids[-1]
+        return int(self._len_ids[-1]) if len(self._len_ids) else -1
+
+    def _doc_length(self, doc_id: int) -> Optional[int]:
+        if doc_id in self._deleted:
+            return None
+        for ids, lens in ((self._len_ids, self._lens), (self._new_len_ids, self._new_lens)):
+            if len(ids):
+                row = bisect_left(ids, doc_id)
+                if row < len(ids) and ids[row] == doc_id:
+                    return int(lens[row])
+        return None
+
+    # -- mutation ----------------------------------------------------------
+
+    def add(self, doc_id: int, text: str) -> None:
+        doc_id = int(doc_id)
+        last = self._last_id()
+        if doc_id <= last:
+            raise ValueError(f"lexical doc ids must be added in increasing order ({doc_id} <= {last})")
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            term_id = self._new_terms.get(tok)
+            if term_id is None:
+                term_id = self._new_terms[tok] = len(self._new_terms)
+            self._new_term_ids.append(term_id)
+            self._new_doc_ids.append(doc_id)
+            self._new_tfs.append(tf)
+        self._new_len_ids.append(doc_id)
+        self._new_lens.append(len(tokens))
+        self.total_len += len(tokens)
+        self._new_csr = None
+
+    def remove(self, doc_id: int, text: Optional[str] = None) -> None:
+        """Remove ``doc_id`` (``text`` is accepted for compatibility and not needed)."""
+        doc_id = int(doc_id)
+        length = self._doc_length(doc_id)
+        if length is None:
+            return
+        self._deleted.add(doc_id)
+        self._deleted_arr = None
+        self.total_len -= length
+
+    # -- search ------------------------------------------------------------
+
+    def _new_segment(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Append-segment postings grouped by term: (offsets, doc ids, tfs), rebuilt after changes."""
+        if self._new_csr is None:
+            term_ids = np.frombuffer(self._new_term_ids, dtype="int32") if len(self._new_term_ids) else np.zeros(0, dtype="int32")
+            order = np.argsort(term_ids, kind="stable")
+            offsets = np.zeros(len(self._new_terms) + 1, dtype="int64")
+            np.cumsum(np.bincount(term_ids, minlength=len(self._new_terms)), out=offsets[1:])
+            doc_ids = np.asarray(self._new_doc_ids, dtype="int64")[order]
+            tfs = np.asarray(self._new_tfs, dtype="int32")[order]
+            self._new_csr = (offsets, doc_ids, tfs)
+        return self._new_csr
+
+    def _deleted_ids(self) -> np.ndarray:
+        if self._deleted_arr is None:
+            self._deleted_arr = np.fromiter(self._deleted, dtype="int64", count=len(self._deleted))
+        return self._deleted_arr
+
+    def _postings(self, tok: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Live ``(doc ids, tfs, doc lengths)`` of ``tok`` across both segments."""
+        parts = []
+        row = self._vocab.find(tok)
+        if row >= 0:
+            start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+            ids = np.asarray(self._doc_ids[start:end])
+            lens = np.asarray(self._lens)[np.searchsorted(self._len_ids, ids)]
+            parts.append((ids, np.asarray(self._tfs[start:end]), lens))
+        term_id = self._new_terms.get(tok)
+        if term_id is not None:
+            offsets, doc_ids, tfs = self._new_segment()
+            ids = doc_ids[offsets[term_id]:offsets[term_id + 1]]
+            new_len_ids = np.frombuffer(self._new_len_ids, dtype="int64")
+            lens = np.frombuffer(self._new_lens, dtype="int32")[np.searchsorted(new_len_ids, ids)]
+            parts.append((ids, tfs[offsets[term_id]:offsets[term_id + 1]], lens))
+        if not parts:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="int32"), np.zeros(0, dtype="int32")
+        ids, tfs, lens = (np.concatenate(cols) for cols in zip(*parts))
+        if self._deleted:
+            keep = ~np.isin(ids, self._deleted_ids())
+            ids, tfs, lens = ids[keep], tfs[keep], lens[keep]
+        return ids, tfs, lens
+
+    def search(self, query: str, k: int = 10, allowed: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k ``(doc_id, score)`` pairs, optionally restricted to ``allowed`` ids."""
+        n = len(self)
+        if n == 0:
+            return []
+        avgdl = self.total_len / n
+        all_ids: List[np.ndarray] = []
+        all_scores: List[np.ndarray] = []
+        for tok in set(tokenize(query)):
+            ids, tfs, lens = self._postings(tok)
+            if not len(ids):
+                continue
+            df = len(ids)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            tfs = tfs.astype("float32")
+            denom = tfs + self.k1 * (1.0 - self.b + self.b * lens.astype("float32") / max(avgdl, 1e-9))
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1.0) / denom)
+        if not all_ids:
+            return []
+        ids = np.concatenate(all_ids)
+        scores = np.concatenate(all_scores)
+        if allowed is not None:
+            allowed_arr = np.fromiter(allowed, dtype="int64")
+            mask = np.isin(ids, allowed_arr)
+            ids, scores = ids[mask], scores[mask]
+            if not len(ids):
+                return []
+        unique, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        k = min(k, len(unique))
+        top = np.argpartition(-totals, k - 1)[:k] if k < len(unique) else np.arange(len(unique))
+        top = top[np.lexsort((unique[top], -totals[top]))]
+        return [(int(unique[i]), float(totals[i])) for i in top]
+
+    # -- persistence -------------------------------------------------------
+
+    def _compacted(self):
+        """Both segments merged, tombstones applied: (terms, offsets, doc_ids, tfs, len_ids, lens)."""
+        base_terms = self._vocab.terms()
+        new_terms = sorted(self._new_terms, key=self._new_terms.__getitem__)
+        terms = sorted(set(base_terms).union(new_terms))
+        position = {term: i for i, term in enumerate(terms)}
+        base_map = np.array([position[t] for t in base_terms], dtype="int64")
+        new_map = np.array([position[t] for t in new_terms], dtype="int64")
+
+        new_term_ids = np.asarray(self._new_term_ids, dtype="int64")
+        term_ids = np.concatenate((
+            base_map[np.repeat(np.arange(len(base_terms)), np.diff(self._offsets))] if len(base_terms) else np.zeros(0, dtype="int64"),
+            new_map[new_term_ids] if len(new_term_ids) else np.zeros(0, dtype="int64"),
+        ))
+        doc_ids = np.concatenate((np.asarray(self._doc_ids), np.asarray(self._new_doc_ids, dtype="int64")))
+        tfs = np.concatenate((np.asarray(self._tfs), np.asarray(self._new_tfs, dtype="int32")))
+        len_ids = np.concatenate((np.asarray(self._len_ids), np.asarray(self._new_len_ids, dtype="int64")))
+        lens = np.concatenate((np.asarray(self._lens), np.asarray(self._new_lens, dtype="int32")))
+        if self._deleted:
+            deleted = self._deleted_ids()
+            keep = ~np.isin(doc_ids, deleted)
+            term_ids, doc_ids, tfs = term_ids[keep], doc_ids[keep], tfs[keep]
+            keep = ~np.isin(len_ids, deleted)
+            len_ids, lens = len_ids[keep], lens[keep]
+
+        counts = np.bincount(term_ids, minlength=len(terms))
+        if len(terms) and not counts.all():
+            # Drop terms whose every document was removed
+            used = np.flatnonzero(counts)
+            renumber = np.full(len(terms), -1, dtype="int64")
+            renumber[used] = np.arange(len(used))
+            term_ids = renumber[term_ids]
+            terms = [terms[i] for i in used.tolist()]
+            counts = counts[used]
+        order = np.lexsort((doc_ids, term_ids))
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum(counts, out=offsets[1:])
+        return terms, offsets, doc_ids[order], tfs[order].astype("int32"), len_ids, lens.astype("int32")
+
+    def save(self, directory: str) -> Dict[str, str]:
+        """Write the compacted index into ``directory``; returns the file names used."""
+        os.makedirs(directory, exist_ok=True)
+        terms, offsets, doc_ids, tfs, len_ids, lens = self._compacted()
+        vocab = _vocabulary(terms)
+
+        paths = {name: os.path.join(directory, filename) for name, filename in LEXICAL_FILES.items()}
+        tmp = paths["vocab"] + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(vocab.blob.tobytes())
+        os.replace(tmp, paths["vocab"])
+        arrays = (
+            ("vocab_offsets", vocab.offsets), ("offsets", offsets), ("doc_ids", doc_ids),
+            ("tfs", tfs), ("len_ids", len_ids), ("lens", lens),
+        )
+        for name, arr in arrays:
+            tmp = paths[name] + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, paths[name])
+        tmp = paths["meta"] + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "total_len": int(lens.sum())}, f)
+        os.replace(tmp, paths["meta"])
+        return dict(LEXICAL_FILES)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "BM25Index":
+        """Open an index saved in ``directory``; arrays are memory-mapped read-only unless ``mmap=False``."""
+        paths = {name: os.path.join(directory, filename) for name, filename in LEXICAL_FILES.items()}
+        mode = "r" if mmap else None
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(k1=float(meta["k1"]), b=float(meta["b"]))
+        if os.path.getsize(paths["vocab"]) == 0:
+            blob = np.zeros(0, dtype="uint8")
+        elif mmap:
+            blob = np.memmap(paths["vocab"], dtype="uint8", mode="r")
+        else:
+            blob = np.fromfile(paths["vocab"], dtype="uint8")
+        index._vocab = _Vocabulary(blob, np.load(paths["vocab_offsets"], mmap_mode=mode))
+        index._offsets = np.load(paths["offsets"], mmap_mode=mode)
+        index._doc_ids = np.load(paths["doc_ids"], mmap_mode=mode)
+        index._tfs = np.load(paths["tfs"], mmap_mode=mode)
+        index._len_ids = np.load(paths["len_ids"], mmap_mode=mode)
+        index._lens = np.load(paths["lens"], mmap_mode=mode)
+        index.total_len = int(meta["total_len"])
+        if len(index._offsets) != len(index._vocab) + 1 or int(index._offsets[-1]) != len(index._doc_ids):
+            raise RuntimeError(f"Lexical index in {directory} is inconsistent")
+        return index
+
+    @classmethod
+    def load_legacy(cls, path: str) -> "BM25Index":
+        """Read a ``lexical.npz`` written before the mmap layout (into memory, re-sorted)."""
+        with np.load(path) as data:
+            k1, b = (float(x) for x in data["params"])
+            legacy = cls(k1=k1, b=b)
+            # Unsorted vocabulary; only used as input to _compacted below
+            legacy._vocab = _vocabulary(json.loads(data["terms"].tobytes().decode("utf-8")))
+            legacy._offsets = data["offsets"]
+            legacy._doc_ids = data["doc_ids"].astype("int64")
+            legacy._tfs = data["tfs"].astype("int32")
+            order = np.argsort(data["len_ids"], kind="stable")
+            legacy._len_ids = data["len_ids"].astype("int64")[order]
+            legacy._lens = data["lens"].astype("int32")[order]
+        terms, offsets, doc_ids, tfs, len_ids, lens = legacy._compacted()
+        index = cls(k1=k1, b=b)
+        index._vocab = _vocabulary(terms)
+        index._offsets, index._doc_ids, index._tfs = offsets, doc_ids, tfs
+        index._len_ids, index._lens = len_ids, lens
+        index.total_len = int(lens.sum())
+        return index
+
+    @classmethod
+    def from_texts(cls, items: Iterable[Tuple[int, str]]) -> "BM25Index":
+        index = cls()
+        for doc_id, text in items:
+            index.add(doc_id, text)
+        return index
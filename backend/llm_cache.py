@@ -0,0 +1,203 @@
+# llm_cache.py
+"""Cache of generated LLM text keyed on the exact request.
+
+The key is sha256 of (model id, canonicalized prompt, generation params), so
+thirty students asking for the same quiz share one generation. Prompts are
+canonicalized to NFC with whitespace runs collapsed, which makes prompts that
+only differ in template indentation or stray spaces hit the same entry.
+
+Entries live in an in-memory LRU (``max_entries``) and are written through
+to ``root_dir/<namespace>/<key[:2]>/<key>.json`` so they survive restarts and
+are shared by worker processes. Each namespace (one per endpoint: "quiz",
+"flashcards", ...) has its own TTL.
+
+A namespace can keep ``variants`` > 1 responses per key for content that is
+meant to differ between requests: until a key has that many variants every
+lookup is a miss (and the caller's new response is added); after that the
+variants are served round-robin until the entry expires.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger("llm_cache")
+
+
+def canonicalize_prompt(prompt: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", prompt or "").split())
+
+
+def request_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+    material = json.dumps(
+        {"model": model_id, "prompt": canonicalize_prompt(prompt), "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("variants", "expires_at", "cursor")
+
+    def __init__(self, variants: List[str], expires_at: float):
+        self.variants = variants
+        self.expires_at = expires_at
+        self.cursor = 0
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + disk) cache of LLM responses with per-namespace TTLs."""
+
+    def __init__(
+        self,
+        root_dir: Optional[str],
+        max_entries: int = 2048,
+        default_ttl: float = 86400,
+        ttls: Optional[Dict[str, float]] = None,
+        variants: Optional[Dict[str, int]] = None,
+    ):
+        self.root_dir = root_dir
+        self.max_entries = max(1, max_entries)
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.variants = dict(variants or {})
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if root_dir:
+            os.makedirs(root_dir, exist_ok=True)
+
+    def ttl_for(self, namespace: str) -> float:
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def variants_for(self, namespace: str) -> int:
+        return max(1, self.variants.get(namespace, 1))
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """A cached response, or None when the caller should generate (and ``put``) one."""
+        wanted = self.variants_for(namespace)
+        with self._lock:
+            entry = self._entries.get(f"{namespace}:{key}")
+            from_disk = False
+            if entry is None:
+                entry = self._read(namespace, key)
+                from_disk = entry is not None
+            if entry is None or entry.expires_at <= time.time():
+                if entry is not None:
+                    self._entries.pop(f"{namespace}:{key}", None)
+                self.misses += 1
+                return None
+            self._remember(f"{namespace}:{key}", entry)
+            if len(entry.variants) < wanted:
+                self.misses += 1
+                return None
+            text = entry.variants[entry.cursor % len(entry.variants)]
+            entry.cursor += 1
+            self.hits += 1
+            if from_disk:
+                self.disk_hits += 1
+            return text
+
+    def put(self, namespace: str, key: str, text: str) -> None:
+        wanted = self.variants_for(namespace)
+        with self._lock:
+            entry = self._entries.get(f"{namespace}:{key}") or self._read(namespace, key)
+            if entry is None or entry.expires_at <= time.time():
+                entry = _Entry([], time.time() + self.ttl_for(namespace))
+            if len(entry.variants) >= wanted or text in entry.variants:
+                return
+            entry.variants.append(text)
+            self._remember(f"{namespace}:{key}", entry)
+            self._write(namespace, key, entry)
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        """Drop every entry (or every entry of ``namespace``) from memory and disk."""
+        with self._lock:
+            prefix = f"{namespace}:" if namespace else ""
+            doomed = [k for k in self._entries if k.startswith(prefix)]
+            for k in doomed:
+                del self._entries[k]
+            if not self.root_dir:
+                return len(doomed)
+            # Disk holds everything that was ever cached, including what memory already evicted
+            names = [namespace] if namespace else os.listdir(self.root_dir)
+            return sum(self._remove_dir(os.path.join(self.root_dir, name)) for name in names)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttls": dict(self.ttls, default=self.default_ttl),
+                "variants": self.variants,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+
+    def _remember(self, name: str, entry: _Entry) -> None:
+        self._entries[name] = entry
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.root_dir, namespace, key[:2], f"{key}.json")
+
+    def _read(self, namespace: str, key: str) -> Optional[_Entry]:
+        if not self.root_dir:
+            return None
+        try:
+            with open(self._path(namespace, key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return _Entry(list(data["variants"]), float(data["expires_at"]))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable LLM cache entry %s/%s: %s", namespace, key, e)
+            return None
+
+    def _write(self, namespace: str, key: str, entry: _Entry) -> None:
+        if not self.root_dir:
+            return
+        path = self._path(namespace, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": entry.expires_at, "variants": entry.variants}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            # The memory tier still serves it; only persistence is lost
+            logger.warning("Failed to write LLM cache entry %s/%s: %s", namespace, key, e)
+
+    @staticmethod
+    def _remove_dir(path: str) -> int:
+        removed = 0
+        for dirpath, _, filenames in os.walk(path, topdown=False):
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += filename.endswith(".json")
+                except OSError:
+                    pass
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+        return removed
@@ -5,7 +5,8 @@ import uuid
 import datetime
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
-import json
+
+import bedrock_gateway
 
 load_dotenv()
 
@@ -25,40 +26,11 @@ def refine_note_with_llm(raw_text: str) -> str:
     {raw_text}
     """
 
-    bedrock = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=os.getenv("AWS_REGION", "us-east-1"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-
     model_id = os.getenv("BEDROCK_MODEL_ID")
     if not model_id:
         raise ValueError("❌ BEDROCK_MODEL_ID not set in .env")
 
-    payload = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 300,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-
-    response = bedrock.invoke_model(
-        modelId=model_id,
-        body=json.dumps(payload)
-    )
-
-    result = json.loads(response["body"].read())
-    refined_text = result["content"][0]["text"]
+    refined_text = bedrock_gateway.generate_text(model_id, prompt, max_tokens=300)
 
     # 🧹 Remove unwanted prefixes (like “Here’s...”)
     unwanted_prefixes = [
@@ -0,0 +1,145 @@
+# pdf_extract.py
+"""PDF text extraction on a process pool.
+
+pypdf is pure Python, so extracting text on a request or ingestion thread
+holds the GIL and stalls everything else in the process. Extraction runs in a
+``ProcessPoolExecutor`` instead. Documents are parallelized naturally (each
+caller submits its own tasks), and large PDFs are split into page ranges
+that run on several workers and are reassembled in page order.
+
+This module is imported by pool workers (spawn start method), so it must not
+import the service modules.
+"""
+
+import os
+import atexit
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import List, Optional, Tuple, Union
+
+try:
+    from pypdf import PdfReader
+except Exception:  # pragma: no cover - runtime dependency
+    PdfReader = None  # type: ignore
+
+
+# 0 disables the pool and extracts in-process
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+# PDFs with more pages than this are split into ranges of this size
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+logger = logging.getLogger("pdf_extract")
+
+
+def _open_reader(source: Union[bytes, str]):
+    if PdfReader is None:
+        raise RuntimeError("pypdf is required for PDF parsing. Install with: pip install pypdf")
+    if isinstance(source, bytes):
+        return PdfReader(BytesIO(source))
+    return PdfReader(source)
+
+
+def _page_texts(pages, start: int, stop: int) -> List[Tuple[int, str]]:
+    out: List[Tuple[int, str]] = []
+    for i in range(start, stop):
+        try:
+            out.append((i + 1, pages[i].extract_text() or ""))
+        except Exception:
+            out.append((i + 1, ""))
+    return out
+
+
+def _extract_range(source: Union[bytes, str], start: int, end: Optional[int]) -> List[Tuple[int, str]]:
+    """Extract pages [start, end) as (1-based page number, text) pairs."""
+    pages = _open_reader(source).pages
+    return _page_texts(pages, start, len(pages) if end is None else min(end, len(pages)))
+
+
+def _extract_first_range(source: Union[bytes, str], end: int) -> Tuple[int, List[Tuple[int, str]]]:
+    """Page count of the PDF and its pages [0, end), from a single parse."""
+    pages = _open_reader(source).pages
+    return len(pages), _page_texts(pages, 0, min(end, len(pages)))
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PDF_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the parent runs many threads, which makes fork unsafe
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop ``broken`` as the shared pool (unless another thread already replaced it)."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def extract_pdf_pages(file_bytes: bytes, spill_dir: Optional[str] = None) -> List[Tuple[int, str]]:
+    """Return ``[(page_number, text), ...]`` for a PDF, in page order.
+
+    The first pool task counts the pages and extracts the first range, so
+    the PDF is never parsed on the calling thread. Larger PDFs are then
+    written once to a temporary file in ``spill_dir`` and the remaining
+    ranges are extracted in parallel, so the bytes are not pickled to every
+    worker. A worker that dies (e.g. killed for memory) breaks the whole
+    pool; it is replaced and the document is retried once.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return _extract_range(file_bytes, 0, None)
+    try:
+        return _extract_on(pool, file_bytes, spill_dir)
+    except BrokenProcessPool:
+        logger.warning("PDF worker pool broke; restarting it and retrying once")
+        _discard_pool(pool)
+        pool = _get_pool()
+        return _extract_on(pool, file_bytes, spill_dir)
+
+
+def _extract_on(pool: ProcessPoolExecutor, file_bytes: bytes, spill_dir: Optional[str]) -> List[Tuple[int, str]]:
+    page_count, pages = pool.submit(_extract_first_range, file_bytes, PDF_PAGES_PER_TASK).result()
+    if page_count <= PDF_PAGES_PER_TASK:
+        return pages
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=spill_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_bytes)
+        futures = [
+            pool.submit(_extract_range, path, start, start + PDF_PAGES_PER_TASK)
+            for start in range(PDF_PAGES_PER_TASK, page_count, PDF_PAGES_PER_TASK)
+        ]
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
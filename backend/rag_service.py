@@ -1,17 +1,16 @@
 import os
-import io
 import json
 import time
 import shutil
-import string
 import logging
 import threading
-from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Union
 
-import boto3
 from botocore.client import Config
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 try:
     from dotenv import load_dotenv
@@ -28,6 +27,28 @@ try:
 except Exception as pdf_error:  # pragma: no cover - runtime dependency
     PdfReader = None  # type: ignore
 
+import aws_async
+import bedrock_gateway
+from answer_cache import SemanticAnswerCache
+from doc_cache import DocumentCache, DocumentEntry
+from chunk_store import ChunkStore
+from chunking import chunk_document, chunk_text
+from context_packing import Passage, pack_context
+import index_store
+import index_snapshot
+from embedding_engine import EmbeddingEngine
+from embedding_store import EmbeddingStore, QueryVectorCache
+from ingest_pipeline import Stage, run_pipeline
+from pdf_extract import PDF_WORKERS, extract_pdf_pages
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from reload_jobs import ReloadInProgress, ReloadJob, ReloadJobManager
+from singleflight import SingleFlight
+from sse import sse_response, stream_events, stream_events_async
+from ann_index import (
+    INDEX_MODES, IndexBuilder, OutOfCoreIndexBuilder, index_mode_of, index_storage_of, recall_report,
+    search_allowed_exact, search_parameters, storage_comparison, supports_remove,
+)
+
 
 # ------------------------------
 # Configuration
@@ -48,6 +69,81 @@ INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.getcwd(), "index"))
 BEDROCK_EMBED_MODEL_ID = os.getenv("BEDROCK_EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
 BEDROCK_CHAT_MODEL_ID = os.getenv("BEDROCK_CHAT_MODEL_ID", "amazon.titan-text-premier-v1:0")
 
+# Titan v2 output width: 256, 512 or 1024 (0 = model default, 1024). Smaller vectors
+# shrink the index and embedding store proportionally at a small recall cost
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0"))
+TITAN_V2_DIMENSIONS = (256, 512, 1024)
+
+# Concurrent embedding calls (Titan accepts a single input per request)
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "8"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# Query embeddings get their own lane so a reindex cannot starve /ask
+EMBED_QUERY_CONCURRENCY = int(os.getenv("EMBED_QUERY_CONCURRENCY", "4"))
+
+# Content-addressed store of previously computed embeddings (survives restarts)
+EMBED_STORE_ENABLED = os.getenv("EMBED_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_STORE_DIR = os.getenv("EMBED_STORE_DIR", os.path.join(INDEX_DIR, "embeddings"))
+# float32, float16 or int8 (per-vector scaled) rows in the embedding store
+EMBED_STORE_DTYPE = os.getenv("EMBED_STORE_DTYPE", "float32")
+# Query embeddings are kept in memory only (LRU), never in the embedding store
+QUERY_EMBED_CACHE_ENTRIES = int(os.getenv("QUERY_EMBED_CACHE_ENTRIES", "4096"))
+
+# Index type: flat (exact), ivf_flat, ivf_pq or hnsw (approximate, for large corpora)
+RAG_INDEX_MODE = os.getenv("RAG_INDEX_MODE", "flat")
+RAG_TRAIN_SAMPLE = int(os.getenv("RAG_TRAIN_SAMPLE", "50000"))
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 = 4*sqrt(training vectors)
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "64"))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+RAG_EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))
+# Vector codes in the index: float32, float16, int8 (scalar quantized) or pq (flat/ivf_flat only)
+RAG_VECTOR_STORAGE = os.getenv("RAG_VECTOR_STORAGE", "float32")
+# Out-of-core full builds: spill vectors to disk, train on a uniform sample, add in batches.
+# Chunk text and BM25 postings are still accumulated in memory until the index is saved.
+RAG_BUILD_OUT_OF_CORE = os.getenv("RAG_BUILD_OUT_OF_CORE", "false").lower() in ("1", "true", "yes")
+RAG_BUILD_SPILL_DIR = os.getenv("RAG_BUILD_SPILL_DIR", os.path.join(INDEX_DIR, "build"))
+RAG_BUILD_ADD_BATCH = int(os.getenv("RAG_BUILD_ADD_BATCH", "65536"))
+
+# Streaming ingestion: workers per stage and max items buffered between stages
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+# Parse threads mostly wait on the PDF process pool, so match its width
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(max(2, PDF_WORKERS))))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+# Index generations kept on disk (the live one included) so workers still reading an older one are not cut off
+RAG_KEEP_GENERATIONS = int(os.getenv("RAG_KEEP_GENERATIONS", "2"))
+# How often a worker checks CURRENT for a generation published by another worker or a snapshot pull
+RAG_GENERATION_CHECK_SECONDS = float(os.getenv("RAG_GENERATION_CHECK_SECONDS", "2"))
+
+# Index snapshots: s3://bucket/prefix or a local/shared directory that built generations are
+# published to and new nodes pull from at startup instead of re-embedding the corpus
+RAG_SNAPSHOT_URI = os.getenv("RAG_SNAPSHOT_URI", "")
+# S3-compatible endpoint for snapshots (e.g. a local MinIO), if not AWS S3
+RAG_SNAPSHOT_S3_ENDPOINT_URL = os.getenv("RAG_SNAPSHOT_S3_ENDPOINT_URL", "")
+RAG_SNAPSHOT_PULL_ON_STARTUP = os.getenv("RAG_SNAPSHOT_PULL_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+RAG_SNAPSHOT_PUBLISH_ON_RELOAD = os.getenv("RAG_SNAPSHOT_PUBLISH_ON_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# Per-document chunk/embedding cache used by DocChat (build_context_from_document)
+DOC_CACHE_MAX_BYTES = int(os.getenv("RAG_DOC_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# /ask/batch: max questions per request and concurrent Bedrock generations per request
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+ASK_BATCH_GENERATION_CONCURRENCY = int(os.getenv("ASK_BATCH_GENERATION_CONCURRENCY", "4"))
+
+# Semantic answer cache: reuse answers to near-identical questions (cosine >= threshold)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "900"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "4096"))
+
+# Prompt context assembly: estimated-token budget, MMR relevance/diversity trade-off
+# (1 = relevance only) and term-cosine above which a passage counts as a duplicate
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.9"))
+
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(INDEX_DIR, exist_ok=True)
 
@@ -76,209 +172,452 @@ logging.basicConfig(level=logging.INFO)
 class AskRequest(BaseModel):
     question: str
     top_k: int = 5
+    # ANN tuning for ivf_* / hnsw index modes; defaults come from the environment
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    # "hybrid" (BM25 + vectors fused with RRF), "vector" or "lexical" (no query embedding)
+    retrieval: str = "hybrid"
+    # Restrict retrieval to these S3 keys and/or keys under this prefix
+    sources: Optional[List[str]] = None
+    source_prefix: Optional[str] = None
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: int = 5
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    retrieval: str = "hybrid"
+    sources: Optional[List[str]] = None
+    source_prefix: Optional[str] = None
 
 
 class AskResponse(BaseModel):
     answer: str
     sources: List[Dict[str, str]]
     took_ms: int
+    # True when the answer was reused from a similar earlier question
+    cached: bool = False
+    # Estimated prompt-context tokens sent, and saved by merging/de-duplicating chunks
+    context_tokens: int = 0
+    tokens_saved: int = 0
 
 
 # ------------------------------
 # Utilities
 # ------------------------------
 
-def normalize_text(text: str) -> str:
-    if not text:
-        return ""
-    # Collapse whitespace and strip control chars
-    text = " ".join(text.split())
-    printable = set(string.printable)
-    return "".join(ch for ch in text if ch in printable)
-
-
-def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[str]:
-    if not text:
-        return []
-    text = normalize_text(text)
-    chunks: List[str] = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(n, start + chunk_size)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - chunk_overlap
-        if start < 0:
-            start = 0
-        if start >= n:
-            break
-        if end == n:
-            break
-    return chunks
+def load_pdf_bytes_to_pages(file_bytes: bytes) -> List[Tuple[int, str]]:
+    """Extract ``(page_number, text)`` pairs on the PDF process pool, in page order."""
+    if PdfReader is None:
+        raise RuntimeError("pypdf is required for PDF parsing. Install with: pip install pypdf")
+    return extract_pdf_pages(file_bytes)
 
 
 def load_pdf_bytes_to_text(file_bytes: bytes) -> str:
-    if PdfReader is None:
-        raise RuntimeError("pypdf is required for PDF parsing. Install with: pip install pypdf")
-    reader = PdfReader(io.BytesIO(file_bytes))
-    pages_text: List[str] = []
-    for page in reader.pages:
-        try:
-            pages_text.append(page.extract_text() or "")
-        except Exception:
-            pages_text.append("")
-    return "\n".join(pages_text)
+    return "\n".join(text for _, text in load_pdf_bytes_to_pages(file_bytes))
 
 
-def load_object_bytes_to_text(key: str, file_bytes: bytes) -> str:
-    key_lower = key.lower()
-    if key_lower.endswith(".pdf"):
-        return load_pdf_bytes_to_text(file_bytes)
+def load_object_bytes_to_pages(key: str, file_bytes: bytes) -> List[Tuple[int, str]]:
+    """``(page_number, text)`` pairs of an object; non-PDF objects are one page numbered 0."""
+    if key.lower().endswith(".pdf"):
+        return load_pdf_bytes_to_pages(file_bytes)
     # Assume utf-8 text for .txt, .md, .csv, etc.
     try:
-        return file_bytes.decode("utf-8", errors="ignore")
+        return [(0, file_bytes.decode("utf-8", errors="ignore"))]
     except Exception:
-        return ""
+        return []
+
+
+def load_object_bytes_to_text(key: str, file_bytes: bytes) -> str:
+    return "\n".join(text for _, text in load_object_bytes_to_pages(key, file_bytes))
+
+
+def chunk_pages(pages: List[Tuple[int, str]]) -> List[Tuple[str, int]]:
+    """Normalize and chunk pages into ``(chunk, page_number)`` pairs."""
+    text, spans = chunk_document(pages)
+    return [(text[start:end], page) for start, end, page in spans]
 
 
 # ------------------------------
 # Index & Embeddings
 # ------------------------------
 
+class IndexGeneration:
+    """One fully built index: FAISS index, docstore, BM25 index and manifest.
+
+    A generation is never mutated once published. Requests take a reference
+    with ``current_generation()`` and use it throughout, so a reload that
+    publishes a new generation mid-request does not change what they read.
+    """
+
+    __slots__ = ("id", "index", "docstore", "lexical", "manifest")
+
+    def __init__(self, index, docstore: ChunkStore, lexical: BM25Index, manifest: Dict[str, object]):
+        self.id = str(manifest.get("generation") or "unversioned")
+        self.index = index
+        self.docstore = docstore  # FAISS id -> {"chunk": str, "source": str}, materialized per lookup
+        self.lexical = lexical  # BM25 over the same ids as index
+        self.manifest = manifest
+
+
 index_lock = threading.RLock()
-faiss_index = None  # type: ignore
-docstore: List[Dict[str, str]] = []  # {"chunk": str, "source": str}
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES
+)
+# Background /reload jobs; the lock file keeps reloads single-flight across workers
+reload_manager = ReloadJobManager(os.path.join(INDEX_DIR, "reload.lock"))
+_generation: Optional[IndexGeneration] = None
+# Held while a generation is saved and published here, and while CURRENT is checked for one from elsewhere
+_generation_sync_lock = threading.Lock()
+_current_checked_at = 0.0
+_current_mtime_ns: Optional[int] = None
+
+
+def current_generation() -> Optional[IndexGeneration]:
+    _follow_current()
+    return _generation
 
-# Bedrock runtime client (created lazily to allow import without AWS creds set)
-_bedrock_runtime_client = None
-_boto3_session = None
 
+def _require_generation() -> IndexGeneration:
+    generation = current_generation()
+    if generation is None or not generation.docstore:
+        raise RuntimeError("Index is empty. Call /reload first or set S3 env vars correctly.")
+    return generation
+
+
+def _follow_current() -> None:
+    """Load the generation CURRENT points at if another worker (or a snapshot pull) replaced ours.
+
+    Costs one stat of CURRENT at most every RAG_GENERATION_CHECK_SECONDS;
+    the generation is only reloaded when CURRENT changed to another id.
+    """
+    global _current_checked_at, _current_mtime_ns
+    now = time.monotonic()
+    if now - _current_checked_at < RAG_GENERATION_CHECK_SECONDS:
+        return
+    if not _generation_sync_lock.acquire(blocking=False):
+        return  # another request is checking, or this worker is publishing
+    try:
+        _current_checked_at = now
+        try:
+            mtime_ns = os.stat(os.path.join(INDEX_DIR, index_store.CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == _current_mtime_ns:
+            return
+        _current_mtime_ns = mtime_ns
+        generation_id = index_store.current_generation_id(INDEX_DIR)
+        if generation_id is not None and (_generation is None or _generation.id != generation_id):
+            logger.info("Index generation %s was published by another process; loading it", generation_id)
+            load_persisted_index()
+    finally:
+        _generation_sync_lock.release()
+
+
+def publish_generation(generation: IndexGeneration) -> None:
+    """Make ``generation`` the one new requests read; in-flight requests keep theirs."""
+    global _generation
+    with index_lock:
+        previous = _generation
+        _generation = generation
+    try:
+        index_store.register_reader(INDEX_DIR, generation.id)
+    except OSError as e:
+        logger.warning("Failed to register index generation %s as loaded: %s", generation.id, e)
+    # Answers grounded on the previous generation may cite chunks that no longer exist
+    answer_cache.invalidate("index:")
+    logger.info(
+        "Published index generation %s (%d chunks), replacing %s",
+        generation.id, len(generation.docstore), previous.id if previous is not None else "none",
+    )
 
 def get_boto3_session():
-    """Create or reuse a boto3 Session respecting .env variables or AWS_PROFILE."""
-    global _boto3_session
-    if _boto3_session is not None:
-        return _boto3_session
-    profile = os.getenv("AWS_PROFILE")
-    aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
-    aws_secret = os.getenv("AWS_SECRET_ACCESS_KEY")
-    if profile:
-        _boto3_session = boto3.Session(profile_name=profile, region_name=AWS_REGION)
-    elif aws_access_key and aws_secret:
-        _boto3_session = boto3.Session(
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret,
-            region_name=AWS_REGION,
-        )
-    else:
-        # Falls back to env vars from dotenv or instance role
-        _boto3_session = boto3.Session(region_name=AWS_REGION)
-    return _boto3_session
+    """The process-wide boto3 Session (see bedrock_gateway.get_session)."""
+    return bedrock_gateway.get_session()
 
 
 def get_bedrock_runtime_client():
-    global _bedrock_runtime_client
-    if _bedrock_runtime_client is None:
-        session = get_boto3_session()
-        _bedrock_runtime_client = session.client("bedrock-runtime", region_name=AWS_REGION)
-    return _bedrock_runtime_client
+    return bedrock_gateway.get_client()
+
+
+# Room for every concurrent embedding call to keep its own connection
+bedrock_gateway.reserve_connections(EMBED_MAX_CONCURRENCY + EMBED_QUERY_CONCURRENCY)
+
+
+def new_index_builder(mode: Optional[str] = None, index=None) -> IndexBuilder:
+    """IndexBuilder configured from the RAG_* index settings (or extending ``index``).
+
+    New indexes spill their vectors to disk while building when RAG_BUILD_OUT_OF_CORE is set.
+    """
+    settings = dict(
+        mode=mode or RAG_INDEX_MODE,
+        train_sample=RAG_TRAIN_SAMPLE,
+        nlist=RAG_IVF_NLIST,
+        nprobe=RAG_NPROBE,
+        pq_m=RAG_PQ_M,
+        hnsw_m=RAG_HNSW_M,
+        ef_construction=RAG_HNSW_EF_CONSTRUCTION,
+        ef_search=RAG_EF_SEARCH,
+        storage=RAG_VECTOR_STORAGE,
+        index=index,
+    )
+    if RAG_BUILD_OUT_OF_CORE and index is None:
+        return OutOfCoreIndexBuilder(RAG_BUILD_SPILL_DIR, add_batch=RAG_BUILD_ADD_BATCH, **settings)
+    return IndexBuilder(**settings)
+
+
+# Concurrent requests for the same text / document share one Bedrock call or ingestion
+embedding_flights = SingleFlight()
+document_flights = SingleFlight()
+
+
+def embed_text(text: str) -> List[float]:
+    """Embed a single text with the Bedrock Titan embedding model (one API call).
+
+    Identical texts embedded concurrently (the same question from many
+    students) share one call.
+    """
+    return embedding_flights.do(text, lambda: _embed_text(text))
 
 
-def build_faiss_index(embeddings: List[List[float]]):
-    if faiss is None:
-        raise RuntimeError("faiss-cpu is required. Install with: pip install faiss-cpu")
+def _embed_text(text: str) -> List[float]:
     import numpy as np
 
-    matrix = np.array(embeddings, dtype="float32")
-    # Normalize for cosine similarity via inner product
-    faiss.normalize_L2(matrix)
-    index = faiss.IndexFlatIP(matrix.shape[1])
-    index.add(matrix)
-    return index
+    payload: Dict[str, object] = {"inputText": text}
+    if EMBED_DIMENSIONS:
+        if EMBED_DIMENSIONS not in TITAN_V2_DIMENSIONS:
+            raise RuntimeError(f"EMBED_DIMENSIONS must be one of {TITAN_V2_DIMENSIONS} (or 0 for the model default)")
+        payload["dimensions"] = EMBED_DIMENSIONS
+    # Single attempt: EmbeddingEngine retries, and its limiter must see every throttle
+    resp_payload = bedrock_gateway.invoke_json(BEDROCK_EMBED_MODEL_ID, payload, retry=False)
+    embedding = resp_payload.get("embedding") or resp_payload.get("vector")
+    if not embedding:
+        raise RuntimeError("Bedrock embedding response missing 'embedding' field")
+    # Normalize to unit length to approximate cosine similarity via dot product
+    vec = np.array(embedding, dtype="float32")
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec.tolist()
+
+
+_embedding_engine: Optional[EmbeddingEngine] = None
+_embedding_engine_lock = threading.Lock()
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    global _embedding_engine
+    with _embedding_engine_lock:
+        if _embedding_engine is None:
+            _embedding_engine = EmbeddingEngine(
+                embed_text,
+                max_concurrency=EMBED_MAX_CONCURRENCY,
+                max_retries=EMBED_MAX_RETRIES,
+                interactive_concurrency=EMBED_QUERY_CONCURRENCY,
+            )
+        return _embedding_engine
+
+
+_embedding_store: Optional[EmbeddingStore] = None
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    global _embedding_store
+    if not EMBED_STORE_ENABLED:
+        return None
+    with _embedding_engine_lock:
+        if _embedding_store is None:
+            _embedding_store = EmbeddingStore(
+                EMBED_STORE_DIR, BEDROCK_EMBED_MODEL_ID, dimensions=EMBED_DIMENSIONS, dtype=EMBED_STORE_DTYPE
+            )
+        return _embedding_store
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
-    """Embed texts using AWS Bedrock Titan embedding model.
+    """Embed document texts using AWS Bedrock Titan embedding model.
 
-    Note: Titan embedding API is single-input per request. For simplicity and
-    robustness, we call it per text. For large corpora, consider batching with
-    concurrency or using batch endpoints.
+    Vectors already in the content-addressed embedding store are reused; the
+    rest are embedded by the shared EmbeddingEngine (Titan is single-input
+    per request, so calls run concurrently with adaptive back-off on
+    throttling) and appended to the store. Output order matches ``texts``.
+    User questions go through ``embed_queries`` instead.
     """
-    import numpy as np
+    return _embed_cached(texts, get_embedding_store())
+
+
+query_vectors = QueryVectorCache(BEDROCK_EMBED_MODEL_ID, dimensions=EMBED_DIMENSIONS, max_entries=QUERY_EMBED_CACHE_ENTRIES)
+
+
+def embed_queries(texts: List[str]) -> List[List[float]]:
+    """``embed_texts`` for user questions: cached in a bounded in-memory LRU, never persisted."""
+    return _embed_cached(texts, query_vectors, interactive=True)
+
+
+def _embed_cached(texts: List[str], store, interactive: bool = False) -> List[List[float]]:
+    if store is None:
+        return get_embedding_engine().embed(texts, interactive=interactive)
+    vectors = store.get_many(texts)
+    # Embed each distinct missing text once, even if it repeats within the batch
+    pending: Dict[bytes, List[int]] = {}
+    for i, vec in enumerate(vectors):
+        if vec is None:
+            pending.setdefault(store.key_for(texts[i]), []).append(i)
+    if pending:
+        unique = [texts[positions[0]] for positions in pending.values()]
+        fresh = get_embedding_engine().embed(unique, interactive=interactive)
+        try:
+            store.put_many(unique, fresh)
+        except Exception as e:
+            logger.warning("Failed to store embeddings: %s", e)
+        for positions, vec in zip(pending.values(), fresh):
+            for i in positions:
+                vectors[i] = vec
+    return [vec.tolist() if hasattr(vec, "tolist") else vec for vec in vectors]
+
+
+MOCK_DOCUMENT_TEXT = (
+    "This is a sample document used for development and testing. "
+    "It contains sentences about education, mathematics (Pythagorean theorem), science (photosynthesis), "
+    "and general facts like the capital of India being New Delhi."
+)
+
+doc_cache = DocumentCache(os.path.join(INDEX_DIR, "doc_cache"), max_bytes=DOC_CACHE_MAX_BYTES)
+
+
+def _document_etag(s3_key: str) -> str:
+    """Current ETag of an S3 document (one HEAD request); ``"mock"`` for mock keys."""
+    if s3_key.startswith("mock/"):
+        return "mock"
+    try:
+        head = s3_client().head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch document from S3: {e}")
+    return str(head.get("ETag", "")).strip('"')
+
+
+def _indexed_generation(s3_key: str, etag: str) -> Optional[IndexGeneration]:
+    """The live generation if it holds chunks of exactly this version of ``s3_key``."""
+    generation = current_generation()
+    if generation is None or not generation.docstore:
+        return None
+    record = (generation.manifest.get("objects") or {}).get(s3_key)
+    if not record or record.get("etag") != etag or not int(record.get("count") or 0):
+        return None
+    return generation
+
 
-    client = get_bedrock_runtime_client()
-    vectors: List[List[float]] = []
-    for t in texts:
-        payload = {"inputText": t}
-        body = json.dumps(payload).encode("utf-8")
-        resp = client.invoke_model(modelId=BEDROCK_EMBED_MODEL_ID, body=body)
-        resp_payload = json.loads(resp["body"].read())
-        embedding = resp_payload.get("embedding") or resp_payload.get("vector")
-        if not embedding:
-            raise RuntimeError("Bedrock embedding response missing 'embedding' field")
-        # Normalize to unit length to approximate cosine similarity via dot product
-        vec = np.array(embedding, dtype="float32")
-        norm = np.linalg.norm(vec)
-        if norm > 0:
-            vec = vec / norm
-        vectors.append(vec.tolist())
-    return vectors
-
-
-def build_context_from_document(question: str, s3_key: str, top_k: int = 5) -> Tuple[str, List[Dict[str, str]]]:
+def get_document_entry(s3_key: str, embed: bool = True, etag: Optional[str] = None) -> DocumentEntry:
+    """Return the chunks (and, if ``embed``, vectors) of an S3 document.
+
+    The object's ETag is checked with a HEAD request (unless the caller
+    passes it); unchanged documents are served from ``doc_cache`` without
+    downloading, parsing or re-embedding.
+    """
+    if etag is None:
+        etag = _document_etag(s3_key)
+    # Many students opening the same document at once download, parse and embed it once
+    return document_flights.do((s3_key, etag, embed), lambda: _load_document_entry(s3_key, etag, embed))
+
+
+def _load_document_entry(s3_key: str, etag: str, embed: bool) -> DocumentEntry:
+    entry = doc_cache.get(s3_key, etag)
+    if entry is None:
+        # Dev fallback for mock keys: avoid S3 and use embedded sample text
+        if s3_key.startswith("mock/"):
+            pages = [(0, MOCK_DOCUMENT_TEXT)]
+        else:
+            try:
+                obj = s3_client().get_object(Bucket=S3_BUCKET, Key=s3_key)
+                body: bytes = obj["Body"].read()
+            except Exception as e:
+                raise RuntimeError(f"Failed to fetch document from S3: {e}")
+            pages = load_object_bytes_to_pages(s3_key, body)
+        entry = DocumentEntry(s3_key, etag, [chunk for chunk, _ in chunk_pages(pages)])
+        if not (embed and entry.chunks):
+            doc_cache.put(entry)
+
+    if embed and entry.chunks and entry.vectors is None:
+        import numpy as np
+
+        try:
+            vectors = np.array(embed_texts(entry.chunks), dtype="float32")
+        except Exception as e:
+            logger.warning("Embedding %s failed, keyword ranking will be used: %s", s3_key, e)
+        else:
+            # A new entry rather than filling in the cached one, which other requests share
+            entry = DocumentEntry(s3_key, etag, entry.chunks, vectors)
+        doc_cache.put(entry)
+    return entry
+
+
+def build_context_from_document(
+    question: str,
+    s3_key: str,
+    top_k: int = 5,
+    query_vector=None,
+    etag: Optional[str] = None,
+) -> Tuple[str, List[Dict[str, str]]]:
     """Builds a concise context from a single S3 document relevant to the question.
 
+    Documents already in the global index are searched there, filtered to
+    ``s3_key``, so only the question is embedded. Others are chunked and
+    embedded on demand (cached per ETag in ``doc_cache``).
+    ``query_vector`` is the question's embedding if the caller already has it
+    and ``etag`` the document's current ETag, saving a HEAD request.
     Returns a tuple of (context, sources).
     """
-    # Dev fallback for mock keys: avoid S3 and use embedded sample text
-    if s3_key.startswith("mock/"):
-        text = (
-            "This is a sample document used for development and testing. "
-            "It contains sentences about education, mathematics (Pythagorean theorem), science (photosynthesis), "
-            "and general facts like the capital of India being New Delhi."
+    context, sources, _ = _document_context(question, s3_key, top_k, query_vector, etag)
+    return context, sources
+
+
+def _document_context(
+    question: str,
+    s3_key: str,
+    top_k: int = 5,
+    query_vector=None,
+    etag: Optional[str] = None,
+) -> Tuple[str, List[Dict[str, str]], Dict[str, int]]:
+    """``build_context_from_document`` plus the context packing stats."""
+    if etag is None:
+        etag = _document_etag(s3_key)
+    generation = _indexed_generation(s3_key, etag)
+    if generation is not None:
+        results = hybrid_search(
+            question, k=max(1, top_k), generation=generation, query_vector=query_vector, sources=s3_key
         )
-    else:
-        client = s3_client()
-        try:
-            obj = client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-            body: bytes = obj["Body"].read()
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch document from S3: {e}")
+        return _context_and_sources(results)
 
-        text = load_object_bytes_to_text(s3_key, body)
-    chunks = chunk_text(text)
+    entry = get_document_entry(s3_key, etag=etag)
+    chunks = entry.chunks
     if not chunks:
-        return "", []
+        return "", [], {"context_tokens": 0, "tokens_saved": 0}
+
+    # Rank with BM25 and, when embeddings are available, fuse with semantic ranking
+    top_k = max(1, min(top_k, len(chunks)))
+    lexical_ranking = [idx for idx, _ in entry.lexical.search(question, len(chunks))]
+    vector_ranking: List[int] = []
+    scores = None
+    if entry.vectors is not None:
+        try:
+            import numpy as np
+            q = np.asarray(query_vector if query_vector is not None else embed_queries([question])[0], dtype="float32")
+            scores = entry.vectors @ q  # cosine-like because vectors are unit-normalized
+            vector_ranking = [int(i) for i in np.argsort(-scores)]
+        except Exception as e:
+            logger.warning("Query embedding failed, using lexical ranking only: %s", e)
 
-    # Try semantic ranking via Bedrock embeddings; fallback to simple keyword ranking
-    try:
-        import numpy as np
-        chunk_vectors = embed_texts(chunks)
-        q_vec = embed_texts([question])[0]
-        q = np.array(q_vec, dtype="float32")
-        matrix = np.array(chunk_vectors, dtype="float32")
-        scores = matrix @ q  # cosine-like because vectors are unit-normalized
-        top_k = max(1, min(top_k, len(chunks)))
-        top_indices = np.argsort(-scores)[:top_k]
-        selected = [chunks[int(i)] for i in top_indices]
-        context = "\n\n".join(selected)
-        sources = [{"source": s3_key, "score": f"{float(scores[int(i)]):.4f}"} for i in top_indices]
-        return context, sources
-    except Exception:
-        # Fallback: rank by simple keyword overlap; if tie, preserve order
-        q_words = [w.lower() for w in question.split() if len(w) > 2]
-        def score_chunk(c: str) -> int:
-            lc = c.lower()
-            return sum(lc.count(w) for w in q_words) or (1 if any(q_words) else 0)
-        scored = [(score_chunk(c), idx, c) for idx, c in enumerate(chunks)]
-        scored.sort(key=lambda x: (-x[0], x[1]))
-        top_k = max(1, min(top_k, len(scored)))
-        picked = scored[:top_k]
-        selected = [c for _, _, c in picked]
-        context = "\n\n".join(selected)
-        sources = [{"source": s3_key, "score": str(s)} for s, _, _ in picked]
-        return context, sources
+    if vector_ranking and lexical_ranking:
+        picked = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:top_k]
+    elif vector_ranking:
+        picked = [(i, float(scores[i])) for i in vector_ranking[:top_k]]
+    else:
+        lexical_scores = dict(entry.lexical.search(question, top_k))
+        # No matching terms: keep document order, like the old keyword fallback
+        ranking = lexical_ranking or list(range(len(chunks)))
+        picked = [(i, lexical_scores.get(i, 0.0)) for i in ranking[:top_k]]
+    # Chunk positions act as ids so neighbouring chunks are merged like index hits
+    return _context_and_sources([(score, {"chunk": chunks[i], "source": s3_key, "id": i}) for i, score in picked])
 
 
 def summarize_document(s3_key: str, max_sections: int = 6) -> str:
@@ -288,16 +627,9 @@ def summarize_document(s3_key: str, max_sections: int = 6) -> str:
             "This is a sample document used for development and testing. It mentions education, "
             "mathematics (Pythagorean theorem), science (photosynthesis), and New Delhi."
         )
+        chunks = chunk_text(text)
     else:
-        client = s3_client()
-        try:
-            obj = client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-            body: bytes = obj["Body"].read()
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch document from S3: {e}")
-
-        text = load_object_bytes_to_text(s3_key, body)
-    chunks = chunk_text(text)
+        chunks = get_document_entry(s3_key, embed=False).chunks
     if not chunks:
         return ""
 
@@ -310,195 +642,1213 @@ def summarize_document(s3_key: str, max_sections: int = 6) -> str:
         " student-friendly summary (5-7 sentences), listing key topics and any important definitions."
     )
     try:
-        summary = call_bedrock_rag("Summarize this document.", context=f"{prompt}\n\n{context}")
+        summary = call_bedrock_rag("Summarize this document.", context=f"{prompt}\n\n{context}", cache="doc_summary")
         return summary.strip()
     except Exception:
         # Fallback: return first chunk if LLM fails
         return selected[0][:500]
 
 
+def embed_query(question: str):
+    """Unit-normalized embedding of ``question`` as a numpy vector, or None if embedding fails."""
+    import numpy as np
+
+    try:
+        return np.asarray(embed_queries([question])[0], dtype="float32")
+    except Exception as e:
+        logger.warning("Query embedding failed: %s", e)
+        return None
+
+
+def answer_document_question(question: str, s3_key: str, top_k: int = 5) -> Dict[str, object]:
+    """Answer ``question`` from one document (DocChat), reusing answers to similar questions.
+
+    Answers are cached per document version (S3 key + ETag). Returns
+    answer, sources, cached and took_ms.
+    """
+    t0 = time.time()
+    hit, context, finish = _document_answer_plan(question, s3_key, top_k)
+    if hit is not None:
+        return {**hit, "cached": True, "took_ms": int((time.time() - t0) * 1000)}
+    answer = call_bedrock_rag(question, context)
+    return {"answer": answer, **finish(answer), "took_ms": int((time.time() - t0) * 1000)}
+
+
+async def answer_document_question_async(question: str, s3_key: str, top_k: int = 5) -> Dict[str, object]:
+    """``answer_document_question`` for async endpoints: retrieval (S3, PDF, embedding,
+    FAISS) runs on the AWS I/O pool, generation on aws_async.
+    """
+    t0 = time.time()
+    hit, context, finish = await aws_async.run_io(_document_answer_plan, question, s3_key, top_k)
+    if hit is not None:
+        return {**hit, "cached": True, "took_ms": int((time.time() - t0) * 1000)}
+    answer = await call_bedrock_rag_async(question, context)
+    return {"answer": answer, **finish(answer), "took_ms": int((time.time() - t0) * 1000)}
+
+
+def _document_answer_plan(
+    question: str, s3_key: str, top_k: int
+) -> Tuple[Optional[Dict[str, object]], str, Callable[[str], Dict[str, object]]]:
+    """Everything of a DocChat answer but the generation.
+
+    Returns (cached answer or None, context to generate from, finish), where
+    ``finish`` takes the generated answer, caches it and returns the rest of
+    the response (sources, packing stats, cached).
+    """
+    etag, scope, query_vector, hit = _document_answer_lookup(question, s3_key, top_k)
+    if hit is not None:
+        return hit, "", lambda answer: {"sources": hit["sources"], "cached": True}
+
+    context, sources, packing = _document_context(question, s3_key, top_k, query_vector, etag)
+    if not context:
+        # Nothing retrievable in the document: let the model answer from its summary, if any
+        return None, summarize_document(s3_key), lambda answer: {"sources": [], "cached": False}
+
+    def finish(answer: str) -> Dict[str, object]:
+        if ANSWER_CACHE_ENABLED and query_vector is not None and _cacheable_answer(answer):
+            answer_cache.put(scope, query_vector, {"answer": answer, "sources": sources})
+        return {"sources": sources, "cached": False, **packing}
+
+    return None, context, finish
+
+
+def _document_answer_lookup(
+    question: str, s3_key: str, top_k: int
+) -> Tuple[str, str, Optional[Any], Optional[Dict[str, object]]]:
+    """(etag, answer-cache scope, query vector, cached answer or None) for a DocChat question.
+
+    Only the ETag (a HEAD request) and the question embedding are needed to
+    check the answer cache, so a repeated question never downloads, parses
+    or embeds a document that is not in the index.
+    """
+    etag = _document_etag(s3_key)
+    if ANSWER_CACHE_ENABLED or _indexed_generation(s3_key, etag) is not None:
+        # Indexed documents need it for the filtered vector search anyway
+        query_vector = embed_query(question)
+    else:
+        query_vector = None
+    scope = f"doc:{s3_key}:{etag}:{top_k}"
+    hit = None
+    if ANSWER_CACHE_ENABLED and query_vector is not None:
+        hit = answer_cache.lookup(scope, query_vector)
+    return etag, scope, query_vector, hit[0] if hit is not None else None
+
+
+def stream_document_answer(
+    question: str, s3_key: str, top_k: int = 5
+) -> Tuple[Iterator[str], Callable[[str], Dict[str, object]]]:
+    """Streaming counterpart of ``answer_document_question``.
+
+    Returns ``(tokens, finish)``: the answer text as it is generated, and a
+    function that takes the complete answer, caches it and returns the
+    trailer (sources, packing stats, cached).
+    """
+    hit, context, finish = _document_answer_plan(question, s3_key, top_k)
+    if hit is not None:
+        return iter([hit["answer"]]), finish
+    return stream_bedrock_rag(question, context), finish
+
+
+async def stream_document_answer_async(
+    question: str, s3_key: str, top_k: int = 5
+) -> Tuple[AsyncIterator[str], Callable[[str], Dict[str, object]]]:
+    """``stream_document_answer`` for async endpoints."""
+    hit, context, finish = await aws_async.run_io(_document_answer_plan, question, s3_key, top_k)
+    if hit is not None:
+        return _async_tokens(hit["answer"]), finish
+    return stream_bedrock_rag_async(question, context), finish
+
+
+async def _async_tokens(*texts: str) -> AsyncIterator[str]:
+    for text in texts:
+        yield text
+
+
 def s3_client():
     session = get_boto3_session()
     return session.client("s3", region_name=AWS_REGION, config=Config(signature_version="s3v4"))
 
 
-def download_from_s3(bucket: str, prefix: str) -> List[Tuple[str, bytes]]:
+def snapshot_target():
+    """Storage behind RAG_SNAPSHOT_URI."""
+    def client():
+        return get_boto3_session().client(
+            "s3",
+            region_name=AWS_REGION,
+            endpoint_url=RAG_SNAPSHOT_S3_ENDPOINT_URL or None,
+            config=Config(signature_version="s3v4"),
+        )
+
+    return index_snapshot.open_target(RAG_SNAPSHOT_URI, client)
+
+
+def list_s3_objects(bucket: str, prefix: str) -> List[Dict[str, str]]:
+    """List objects under ``prefix`` with the metadata used to detect changes."""
     if not bucket:
         raise RuntimeError("S3_BUCKET env var is required")
     client = s3_client()
     paginator = client.get_paginator("list_objects_v2")
     pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
-    results: List[Tuple[str, bytes]] = []
+    results: List[Dict[str, str]] = []
     for page in pages:
         for obj in page.get("Contents", []) or []:
             key = obj["Key"]
             if key.endswith("/"):
                 continue
-            resp = client.get_object(Bucket=bucket, Key=key)
-            body: bytes = resp["Body"].read()
-            results.append((key, body))
+            last_modified = obj.get("LastModified")
+            results.append({
+                "key": key,
+                "etag": str(obj.get("ETag", "")).strip('"'),
+                "last_modified": last_modified.isoformat() if hasattr(last_modified, "isoformat") else str(last_modified or ""),
+            })
     return results
 
 
-def rebuild_index_from_s3() -> int:
-    global faiss_index, docstore
+def _load_or_build_lexical(index_dir: str, manifest: Dict[str, object], store: ChunkStore) -> BM25Index:
+    try:
+        lexical = index_store.load_lexical(index_dir, manifest)
+    except Exception as e:
+        logger.warning("Failed to load lexical index, rebuilding from docstore: %s", e)
+        lexical = None
+    if lexical is None:
+        lexical = BM25Index.from_texts((doc_id, store.chunk(doc_id)) for doc_id in store)
+    return lexical
+
+
+def _same_embeddings(manifest: Dict[str, object]) -> bool:
+    """Whether an index's vectors are comparable with the configured embedding model and width."""
+    return (
+        manifest.get("embed_model_id") == BEDROCK_EMBED_MODEL_ID
+        and int(manifest.get("embed_dimensions") or 0) == EMBED_DIMENSIONS
+    )
+
+
+def load_persisted_index() -> bool:
+    """Load the CURRENT generation from INDEX_DIR (read-only, memory-mapped).
+
+    Returns True when an index was loaded. Indexes built with a different
+    embedding model are ignored since their vectors are not comparable.
+    """
+    index_dir = index_store.current_index_dir(INDEX_DIR)
+    try:
+        loaded = index_store.load_index(index_dir, mmap=True)
+    except Exception as e:
+        logger.warning("Failed to load persisted index from %s: %s", index_dir, e)
+        return False
+    if loaded is None:
+        return False
+    index, store, manifest = loaded
+    if not _same_embeddings(manifest):
+        logger.warning(
+            "Persisted index was built with %s (%s dims), current model is %s (%s dims); call /reload to rebuild",
+            manifest.get("embed_model_id"), manifest.get("embed_dimensions", 0), BEDROCK_EMBED_MODEL_ID,
+            EMBED_DIMENSIONS,
+        )
+        return False
+    lexical = _load_or_build_lexical(index_dir, manifest, store)
+    publish_generation(IndexGeneration(index, store, lexical, manifest))
+    logger.info("Loaded persisted index with %d vectors from %s", len(store), index_dir)
+    return True
+
+
+def _ingest_objects(
+    objects: Iterable[Dict[str, str]],
+    next_id: int,
+    builder: IndexBuilder,
+    lexical: BM25Index,
+    entries: Optional[ChunkStore] = None,
+    job: Optional[ReloadJob] = None,
+):
+    """Stream ``objects`` through fetch -> parse -> chunk -> embed -> add-to-index.
+
+    Stages run concurrently with bounded queues between them, so memory stays
+    flat regardless of corpus size. Chunks get FAISS ids from ``next_id``;
+    each object's contiguous id range is recorded in its manifest record so
+    its vectors can be removed later. Vectors are added through ``builder``,
+    which creates (and, for IVF modes, trains) the index or extends an
+    existing one, and into the ``lexical`` BM25 index under the same ids.
+    When ``job`` is given its progress counters are updated as items flow
+    and setting its cancel event stops the pipeline.
+
+    Returns (index, entries, manifest records, next_id, chunks added).
+    """
+    import numpy as np
+
+    client = s3_client()
+    entries = ChunkStore() if entries is None else entries
+    records: Dict[str, Dict[str, object]] = {}
+    state = {"next_id": next_id, "added": 0}
+
+    def fetch(obj):
+        try:
+            resp = client.get_object(Bucket=S3_BUCKET, Key=obj["key"])
+            body = resp["Body"].read()
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch {obj['key']}: {e}") from e
+        if job is not None:
+            job.add(objects_fetched=1, bytes_fetched=len(body))
+        return obj, body
+
+    def parse(item):
+        obj, body = item
+        try:
+            return obj, load_object_bytes_to_pages(obj["key"], body)
+        except Exception as e:
+            raise RuntimeError(f"Failed to parse {obj['key']}: {e}") from e
+
+    def chunk(item):
+        obj, pages = item
+        return obj, chunk_pages(pages)
+
+    def embed(item):
+        obj, chunks = item
+        if not chunks:
+            return obj, chunks, None
+        vectors = np.array(embed_texts([text for text, _ in chunks]), dtype="float32")
+        faiss.normalize_L2(vectors)
+        if job is not None:
+            job.add(chunks_embedded=len(chunks))
+        return obj, chunks, vectors
+
+    def add_to_index(item):
+        obj, chunks, vectors = item
+        start = state["next_id"]
+        if vectors is not None:
+            builder.add(vectors, np.arange(start, start + len(chunks), dtype="int64"))
+            for offset, (text, page) in enumerate(chunks):
+                entries[start + offset] = {"chunk": text, "source": obj["key"], "page": page}
+                lexical.add(start + offset, text)
+        records[obj["key"]] = {
+            "etag": obj["etag"],
+            "last_modified": obj["last_modified"],
+            "id_start": start,
+            "count": len(chunks),
+        }
+        state["next_id"] = start + len(chunks)
+        state["added"] += len(chunks)
+        if job is not None:
+            job.add(objects_indexed=1)
+
+    try:
+        stats = run_pipeline(
+            objects,
+            [
+                Stage("fetch", fetch, workers=INGEST_FETCH_WORKERS, queue_size=INGEST_QUEUE_SIZE),
+                Stage("parse", parse, workers=INGEST_PARSE_WORKERS, queue_size=INGEST_QUEUE_SIZE),
+                Stage("chunk", chunk, workers=1, queue_size=INGEST_QUEUE_SIZE),
+                Stage("embed", embed, workers=INGEST_EMBED_WORKERS, queue_size=INGEST_QUEUE_SIZE, on_error="raise"),
+            ],
+            add_to_index,
+            cancel=job.cancel if job is not None else None,
+        )
+    except BaseException:
+        # Release buffered or spilled vectors of the build that will never finish
+        builder.discard()
+        raise
+    logger.info("Ingestion stages: %s", stats)
+    return builder.finish(), entries, records, state["next_id"], state["added"]
+
+
+def _index_manifest_fields(objects: Dict[str, Dict[str, object]], next_id: int, index_mode: str, index_params: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "embed_model_id": BEDROCK_EMBED_MODEL_ID,
+        "embed_dimensions": EMBED_DIMENSIONS,
+        "index_mode": index_mode,
+        "index_params": index_params,
+        "s3_bucket": S3_BUCKET,
+        "s3_prefix": S3_PREFIX,
+        "next_id": next_id,
+        "objects": objects,
+    }
+
+
+def _save_and_publish(index, entries: ChunkStore, lexical: BM25Index, fields: Dict[str, object]) -> IndexGeneration:
+    with _generation_sync_lock:
+        manifest = index_store.save_generation(INDEX_DIR, index, entries, fields, lexical, keep=RAG_KEEP_GENERATIONS)
+        # Serve the saved docstore and postings memory-mapped, as other workers will, not the build's heap copies
+        saved_dir = index_store.generation_dir(INDEX_DIR, manifest["generation"])
+        entries = ChunkStore.load(saved_dir)
+        lexical = index_store.load_lexical(saved_dir, manifest)
+        generation = IndexGeneration(index, entries, lexical, manifest)
+        publish_generation(generation)
+    if RAG_SNAPSHOT_URI and RAG_SNAPSHOT_PUBLISH_ON_RELOAD:
+        try:
+            index_snapshot.publish_snapshot(index_store.generation_dir(INDEX_DIR, generation.id), snapshot_target())
+        except Exception as e:
+            # The new generation is live locally; other nodes just keep the previous snapshot
+            logger.warning("Failed to publish index snapshot: %s", e)
+    return generation
+
+
+def rebuild_index_from_s3(index_mode: Optional[str] = None, job: Optional[ReloadJob] = None) -> int:
+    """Build a new generation from every S3 object and publish it.
+
+    Everything is built off to the side; the live generation keeps serving
+    queries until the new one is saved and swapped in. A cancelled ``job``
+    leaves the live generation untouched.
+    """
     t0 = time.time()
     # Clean data dir
     if os.path.exists(DATA_DIR):
         shutil.rmtree(DATA_DIR)
     os.makedirs(DATA_DIR, exist_ok=True)
 
-    logger.info("Downloading from S3 bucket=%s prefix=%s", S3_BUCKET, S3_PREFIX)
-    objects = download_from_s3(S3_BUCKET, S3_PREFIX)
-    logger.info("Downloaded %d objects", len(objects))
+    logger.info("Listing S3 bucket=%s prefix=%s", S3_BUCKET, S3_PREFIX)
+    if job is not None:
+        job.set_phase("listing")
+    objects = list_s3_objects(S3_BUCKET, S3_PREFIX)
+    logger.info("Found %d objects; embedding with Bedrock model %s", len(objects), BEDROCK_EMBED_MODEL_ID)
+
+    builder = new_index_builder(index_mode)
+    lexical = BM25Index()
+    if job is not None:
+        job.set_total(len(objects))
+        job.set_phase("ingesting")
+    index, entries, records, next_id, added = _ingest_objects(objects, 0, builder, lexical, job=job)
+    if not added:
+        raise RuntimeError("No parsable content found in S3 objects")
 
-    all_chunks: List[str] = []
-    docstore = []
+    if job is not None:
+        job.set_phase("saving")
+    _save_and_publish(index, entries, lexical, _index_manifest_fields(records, next_id, builder.mode, builder.params))
 
-    for key, bytes_data in objects:
-        try:
-            text = load_object_bytes_to_text(key, bytes_data)
-        except Exception as e:
-            logger.warning("Failed to parse %s: %s", key, e)
-            continue
-        chunks = chunk_text(text)
-        for chunk in chunks:
-            all_chunks.append(chunk)
-            docstore.append({"chunk": chunk, "source": key})
+    took = int((time.time() - t0) * 1000)
+    logger.info("Index (%s) built with %d vectors in %d ms", builder.mode, added, took)
+    return added
 
-    if not all_chunks:
-        raise RuntimeError("No parsable content found in S3 objects")
 
-    logger.info("Embedding %d chunks with Bedrock model %s", len(all_chunks), BEDROCK_EMBED_MODEL_ID)
-    vectors = embed_texts(all_chunks)
+def incremental_reindex_from_s3(job: Optional[ReloadJob] = None) -> Dict[str, int]:
+    """Re-index only S3 objects whose ETag changed since the last saved manifest.
 
-    with index_lock:
-        faiss_index = build_faiss_index(vectors)
+    New and changed objects are embedded and added; vectors of changed and
+    deleted objects are removed by id. The work happens on a private copy of
+    the CURRENT generation, published as a new generation when done. Falls
+    back to a full rebuild when no usable manifest exists.
+    """
+    t0 = time.time()
+    import numpy as np
+
+    index_dir = index_store.current_index_dir(INDEX_DIR)
+    loaded = index_store.load_index(index_dir, mmap=False)
+    if loaded is None or not _same_embeddings(loaded[2]) or "objects" not in loaded[2]:
+        logger.info("No usable index manifest in %s; running a full rebuild", INDEX_DIR)
+        count = rebuild_index_from_s3(job=job)
+        return {"chunks": count, "added": count, "removed": 0, "full_rebuild": True}
+    index, entries, manifest = loaded
+    lexical = _load_or_build_lexical(index_dir, manifest, entries)
+    previous: Dict[str, Dict[str, object]] = dict(manifest.get("objects") or {})
+    next_id = int(manifest.get("next_id", 0))
+
+    if job is not None:
+        job.set_phase("listing")
+    listing = list_s3_objects(S3_BUCKET, S3_PREFIX)
+    current_keys = {obj["key"] for obj in listing}
+    to_ingest = [obj for obj in listing if (previous.get(obj["key"]) or {}).get("etag") != obj["etag"]]
+    changed_keys = [obj["key"] for obj in to_ingest if obj["key"] in previous]
+    deleted_keys = [key for key in previous if key not in current_keys]
+    stats = {
+        "new_objects": len(to_ingest) - len(changed_keys),
+        "changed_objects": len(changed_keys),
+        "deleted_objects": len(deleted_keys),
+        "unchanged_objects": len(listing) - len(to_ingest),
+    }
+    logger.info("Incremental reload: %s", stats)
+
+    if (changed_keys or deleted_keys) and not supports_remove(index):
+        logger.info("%s index cannot remove vectors; running a full rebuild", index_mode_of(index))
+        count = rebuild_index_from_s3(index_mode_of(index), job=job)
+        return {"chunks": count, "added": count, "removed": 0, "full_rebuild": True, **stats}
+
+    # Drop vectors and docstore entries of deleted or changed objects
+    removed = 0
+    stale_ids: List[int] = []
+    for key in changed_keys + deleted_keys:
+        record = previous.pop(key)
+        start, count = int(record["id_start"]), int(record["count"])
+        stale_ids.extend(range(start, start + count))
+    if stale_ids:
+        removed = int(index.remove_ids(faiss.IDSelectorBatch(np.array(stale_ids, dtype="int64"))))
+        for doc_id in stale_ids:
+            entries.pop(doc_id, None)
+            lexical.remove(doc_id)
+
+    added = 0
+    if to_ingest:
+        if job is not None:
+            job.set_total(len(to_ingest))
+            job.set_phase("ingesting")
+        index, entries, records, next_id, added = _ingest_objects(
+            to_ingest, next_id, new_index_builder(index=index), lexical, entries, job=job
+        )
+        previous.update(records)
+
+    if not to_ingest and not deleted_keys:
+        logger.info("Incremental reload: index is up to date")
+        return {"chunks": len(entries), "added": 0, "removed": 0, **stats}
+
+    if job is not None:
+        job.set_phase("saving")
+    _save_and_publish(
+        index, entries, lexical,
+        _index_manifest_fields(previous, next_id, index_mode_of(index), dict(manifest.get("index_params") or {})),
+    )
 
     took = int((time.time() - t0) * 1000)
-    logger.info("Index built with %d vectors in %d ms", len(all_chunks), took)
-    return len(all_chunks)
+    logger.info("Incremental reload added %d and removed %d vectors in %d ms", added, removed, took)
+    return {"chunks": len(entries), "added": added, "removed": removed, **stats}
+
+
+def _vector_search_ids(
+    generation: IndexGeneration,
+    query: str,
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    query_vector=None,
+    source_filter=None,
+) -> List[Tuple[int, float]]:
+    if query_vector is None:
+        query_vector = embed_queries([query])[0]
+    return _vector_search_batch(
+        generation, [query_vector], k, nprobe=nprobe, ef_search=ef_search, source_filter=source_filter
+    )[0]
+
+
+def _vector_search_batch(
+    generation: IndexGeneration,
+    query_vectors,
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    source_filter=None,
+) -> List[List[Tuple[int, float]]]:
+    """``(id, score)`` hits for each row of ``query_vectors`` from one matrix search."""
+    import numpy as np
 
+    q = np.asarray(query_vectors, dtype="float32").reshape(len(query_vectors), -1)
+    selector, allowed = source_filter if source_filter is not None else (None, None)
+    if allowed is not None and not len(allowed):
+        return [[] for _ in range(len(q))]
+    # Already normalized by embed_texts. Published indexes are read-only, so no lock is needed
+    exact = search_allowed_exact(generation.index, q, allowed, k) if allowed is not None else None
+    if exact is not None:
+        distances, indices = exact
+        return [
+            [(int(idx), float(score)) for score, idx in zip(row_scores, row_ids)]
+            for row_scores, row_ids in zip(distances, indices)
+        ]
+    params = search_parameters(
+        generation.index, nprobe=nprobe, ef_search=ef_search, selector=selector,
+        filter_size=len(allowed) if allowed is not None else None, k=k,
+    )
+    limit = len(generation.docstore) if allowed is None else len(allowed)
+    distances, indices = generation.index.search(q, min(k, limit), params=params)  # type: ignore
+    return [
+        [(int(idx), float(score)) for score, idx in zip(row_scores, row_ids) if idx != -1]
+        for row_scores, row_ids in zip(distances, indices)
+    ]
+
+
+def _source_filter(
+    generation: IndexGeneration,
+    sources: Union[str, List[str], None] = None,
+    source_prefix: Optional[str] = None,
+):
+    """``(faiss selector, allowed ids)`` limiting search to some S3 keys, or None when unfiltered.
+
+    Each object's chunks hold one contiguous id range (recorded in the
+    manifest), so a single document is an IDSelectorRange and several
+    documents an IDSelectorBatch of their ids.
+    """
+    if sources is None and source_prefix is None:
+        return None
+    import numpy as np
 
-def search_similar_chunks(query: str, k: int = 5) -> List[Tuple[float, Dict[str, str]]]:
-    if faiss_index is None or not docstore:
+    keys = {sources} if isinstance(sources, str) else set(sources or ())
+    ranges = sorted(
+        (int(record["id_start"]), int(record["id_start"]) + int(record["count"]))
+        for key, record in (generation.manifest.get("objects") or {}).items()
+        if int(record.get("count") or 0) and (key in keys or (source_prefix is not None and key.startswith(source_prefix)))
+    )
+    if not ranges:
+        return None, np.zeros(0, dtype="int64")
+    allowed = np.concatenate([np.arange(start, end, dtype="int64") for start, end in ranges])
+    if len(ranges) == 1:
+        return faiss.IDSelectorRange(*ranges[0]), allowed
+    return faiss.IDSelectorBatch(allowed), allowed
+
+
+def search_similar_chunks(
+    query: str,
+    k: int = 5,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    sources: Union[str, List[str], None] = None,
+    source_prefix: Optional[str] = None,
+) -> List[Tuple[float, Dict[str, str]]]:
+    """Top-k chunks for ``query``; ``nprobe``/``ef_search`` tune IVF/HNSW indexes per call.
+
+    ``sources`` (one S3 key or a list) and ``source_prefix`` (e.g. a
+    student's upload folder) restrict the search to those documents.
+    """
+    generation = _require_generation()
+    source_filter = _source_filter(generation, sources, source_prefix)
+    hits = _vector_search_ids(generation, query, k, nprobe=nprobe, ef_search=ef_search, source_filter=source_filter)
+    return [(score, _hit_item(generation.docstore, doc_id)) for doc_id, score in hits]
+
+
+def hybrid_search(
+    query: str,
+    k: int = 5,
+    retrieval: str = "hybrid",
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    generation: Optional[IndexGeneration] = None,
+    query_vector=None,
+    sources: Union[str, List[str], None] = None,
+    source_prefix: Optional[str] = None,
+) -> List[Tuple[float, Dict[str, str]]]:
+    """Retrieve chunks with BM25, FAISS or both fused by reciprocal rank.
+
+    ``lexical`` never embeds the query. ``hybrid`` falls back to the lexical
+    ranking alone when the query cannot be embedded (e.g. Bedrock is down).
+    ``generation`` pins the index generation to search and ``query_vector``
+    supplies an already computed query embedding. ``sources`` and
+    ``source_prefix`` filter by document as in ``search_similar_chunks``.
+    """
+    if generation is None:
+        generation = _require_generation()
+    elif not generation.docstore:
         raise RuntimeError("Index is empty. Call /reload first or set S3 env vars correctly.")
-    import numpy as np
+    source_filter = _source_filter(generation, sources, source_prefix)
+    if retrieval == "vector":
+        hits = _vector_search_ids(
+            generation, query, k, nprobe=nprobe, ef_search=ef_search, query_vector=query_vector,
+            source_filter=source_filter,
+        )
+        return [(score, _hit_item(generation.docstore, doc_id)) for doc_id, score in hits]
+    depth = _fusion_depth(k)
+    lexical_hits = _lexical_search(generation, query, depth, source_filter)
+    if retrieval == "lexical":
+        return _fuse_hits(generation, lexical_hits, None, k)
 
-    query_vec = embed_texts([query])[0]
-    q = np.array([query_vec], dtype="float32")
-    # Already normalized by embed_texts
-    with index_lock:
-        distances, indices = faiss_index.search(q, min(k, len(docstore)))  # type: ignore
-    results: List[Tuple[float, Dict[str, str]]] = []
-    for score, idx in zip(distances[0], indices[0]):
-        if idx == -1:
-            continue
-        results.append((float(score), docstore[int(idx)]))
+    if query_vector is None:
+        try:
+            query_vector = embed_queries([query])[0]
+        except Exception as e:
+            logger.warning("Vector retrieval unavailable, using lexical ranking only: %s", e)
+            return _fuse_hits(generation, lexical_hits, None, k)
+    try:
+        vector_hits = _vector_search_ids(
+            generation, query, depth, nprobe=nprobe, ef_search=ef_search, query_vector=query_vector,
+            source_filter=source_filter,
+        )
+    except Exception:
+        # Not an outage but a search bug (e.g. unsupported search parameters): keep the traceback
+        logger.exception("Vector search failed on index generation %s, using lexical ranking only", generation.id)
+        vector_hits = None
+    return _fuse_hits(generation, lexical_hits, vector_hits, k)
+
+
+def _lexical_search(generation: IndexGeneration, query: str, k: int, source_filter=None) -> List[Tuple[int, float]]:
+    allowed = source_filter[1] if source_filter is not None else None
+    if allowed is not None and not len(allowed):
+        return []
+    return generation.lexical.search(query, k, allowed=allowed)
+
+
+def _fusion_depth(k: int) -> int:
+    # Over-fetch each ranking so fusion can promote chunks both retrievers like
+    return max(k * 4, 20)
+
+
+def _fuse_hits(
+    generation: IndexGeneration,
+    lexical_hits: List[Tuple[int, float]],
+    vector_hits: Optional[List[Tuple[int, float]]],
+    k: int,
+) -> List[Tuple[float, Dict[str, str]]]:
+    """Top-k chunks from RRF of both rankings, or the lexical ranking alone when ``vector_hits`` is None."""
+    store = generation.docstore
+    if vector_hits is None:
+        return [(score, _hit_item(store, doc_id)) for doc_id, score in lexical_hits[:k]]
+    fused = reciprocal_rank_fusion([[doc_id for doc_id, _ in vector_hits], [doc_id for doc_id, _ in lexical_hits]])
+    return [(score, _hit_item(store, doc_id)) for doc_id, score in fused[:k] if doc_id in store]
+
+
+def _hit_item(store: ChunkStore, doc_id: int) -> Dict[str, object]:
+    """Docstore entry of a search hit, with its id (consecutive ids are adjacent chunks)."""
+    return {**store[doc_id], "id": doc_id}
+
+
+def batch_hybrid_search(
+    queries: List[str],
+    k: int = 5,
+    retrieval: str = "hybrid",
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    generation: Optional[IndexGeneration] = None,
+    query_vectors: Optional[List] = None,
+    sources: Union[str, List[str], None] = None,
+    source_prefix: Optional[str] = None,
+) -> List[List[Tuple[float, Dict[str, str]]]]:
+    """``hybrid_search`` for many queries with a single FAISS search over all query vectors.
+
+    ``query_vectors`` (one per query, or None entries for queries that
+    could not be embedded) are computed here when not given; queries
+    without a vector use the lexical ranking alone.
+    """
+    if generation is None:
+        generation = _require_generation()
+    elif not generation.docstore:
+        raise RuntimeError("Index is empty. Call /reload first or set S3 env vars correctly.")
+    if retrieval == "lexical":
+        query_vectors = [None] * len(queries)
+    elif query_vectors is None:
+        try:
+            query_vectors = list(embed_queries(queries))
+        except Exception as e:
+            if retrieval == "vector":
+                raise
+            logger.warning("Vector retrieval unavailable, using lexical ranking only: %s", e)
+            query_vectors = [None] * len(queries)
+
+    source_filter = _source_filter(generation, sources, source_prefix)
+    depth = k if retrieval == "vector" else _fusion_depth(k)
+    embedded = [i for i, vec in enumerate(query_vectors) if vec is not None]
+    vector_hits: List[Optional[List[Tuple[int, float]]]] = [None] * len(queries)
+    if embedded:
+        rows = _vector_search_batch(
+            generation, [query_vectors[i] for i in embedded], depth, nprobe=nprobe, ef_search=ef_search,
+            source_filter=source_filter,
+        )
+        for i, hits in zip(embedded, rows):
+            vector_hits[i] = hits
+
+    results: List[List[Tuple[float, Dict[str, str]]]] = []
+    for query, hits in zip(queries, vector_hits):
+        if retrieval == "vector":
+            if hits is None:
+                raise RuntimeError(f"Could not embed query: {query[:80]}")
+            results.append([(score, _hit_item(generation.docstore, doc_id)) for doc_id, score in hits])
+        else:
+            results.append(_fuse_hits(generation, _lexical_search(generation, query, depth, source_filter), hits, k))
     return results
 
 
-def call_bedrock_rag(question: str, context: str) -> str:
-    """Generate an answer using AWS Bedrock text generation (Titan text)."""
-    client = get_bedrock_runtime_client()
+GENERATION_FALLBACK_PREFIX = "Generation failed; returning top relevant context.\n\n"
 
+
+def _rag_prompt(question: str, context: str) -> str:
     system_instructions = (
         "You are a helpful assistant. Use only the provided context to answer. "
         "If the answer is not in the context, say you don't know."
     )
-    prompt = (
-        f"{system_instructions}\n\nContext:\n{context}\n\nQuestion: {question}\nAnswer concisely."
-    )
+    return f"{system_instructions}\n\nContext:\n{context}\n\nQuestion: {question}\nAnswer concisely."
 
-    payload = {
-        "inputText": prompt,
-        "textGenerationConfig": {
-            "maxTokenCount": 512,
-            "temperature": 0.2,
-            "topP": 0.9,
-        },
-    }
+
+def call_bedrock_rag(question: str, context: str, cache: Optional[str] = None) -> str:
+    """Generate an answer with BEDROCK_CHAT_MODEL_ID (Titan text by default).
+
+    ``cache`` names a bedrock_gateway response-cache namespace for prompts
+    that repeat verbatim (document summaries).
+    """
     try:
-        resp = client.invoke_model(modelId=BEDROCK_CHAT_MODEL_ID, body=json.dumps(payload).encode("utf-8"))
-        data = json.loads(resp["body"].read())
-        # Titan text returns results list with outputText
-        if isinstance(data, dict) and "results" in data and data["results"]:
-            return data["results"][0].get("outputText", "")
-        # Fallbacks for other providers if user overrides model ID
-        if "content" in data and isinstance(data["content"], list):
-            # Some models return content blocks
-            parts = []
-            for item in data["content"]:
-                text = item.get("text") or item.get("content") or ""
-                if text:
-                    parts.append(text)
-            if parts:
-                return "\n".join(parts)
-        return ""
+        return bedrock_gateway.generate_text(
+            BEDROCK_CHAT_MODEL_ID, _rag_prompt(question, context), max_tokens=512, temperature=0.2, top_p=0.9,
+            cache=cache,
+        )
+    except Exception as e:
+        logger.warning("Bedrock generation error: %s", e)
+        return GENERATION_FALLBACK_PREFIX + context
+
+
+async def call_bedrock_rag_async(question: str, context: str, cache: Optional[str] = None) -> str:
+    """``call_bedrock_rag`` on aws_async (does not hold a thread while Bedrock generates)."""
+    try:
+        return await aws_async.generate_text(
+            BEDROCK_CHAT_MODEL_ID, _rag_prompt(question, context), max_tokens=512, temperature=0.2, top_p=0.9,
+            cache=cache,
+        )
     except Exception as e:
         logger.warning("Bedrock generation error: %s", e)
-        return "Generation failed; returning top relevant context.\n\n" + context
+        return GENERATION_FALLBACK_PREFIX + context
+
+
+def stream_bedrock_rag(question: str, context: str) -> Iterator[str]:
+    """Streaming ``call_bedrock_rag``: yields the answer as the model generates it.
+
+    Falls back to the context like ``call_bedrock_rag`` if generation fails
+    before the first token; a failure mid-answer is raised.
+    """
+    started = False
+    try:
+        for text in bedrock_gateway.stream_text(
+            BEDROCK_CHAT_MODEL_ID, _rag_prompt(question, context), max_tokens=512, temperature=0.2, top_p=0.9
+        ):
+            started = True
+            yield text
+    except Exception as e:
+        if started:
+            raise
+        logger.warning("Bedrock streaming error: %s", e)
+        yield GENERATION_FALLBACK_PREFIX + context
+
+
+async def stream_bedrock_rag_async(question: str, context: str) -> AsyncIterator[str]:
+    """``stream_bedrock_rag`` on aws_async."""
+    started = False
+    try:
+        async for text in aws_async.stream_text(
+            BEDROCK_CHAT_MODEL_ID, _rag_prompt(question, context), max_tokens=512, temperature=0.2, top_p=0.9
+        ):
+            started = True
+            yield text
+    except Exception as e:
+        if started:
+            raise
+        logger.warning("Bedrock streaming error: %s", e)
+        yield GENERATION_FALLBACK_PREFIX + context
+
+
+def _cacheable_answer(answer: str) -> bool:
+    return bool(answer.strip()) and not answer.startswith(GENERATION_FALLBACK_PREFIX)
 
 
 # ------------------------------
 # API Endpoints
 # ------------------------------
 
+@app.on_event("startup")
+def load_index_on_startup():
+    if RAG_SNAPSHOT_URI and RAG_SNAPSHOT_PULL_ON_STARTUP:
+        try:
+            index_snapshot.pull_snapshot(
+                snapshot_target(), INDEX_DIR, keep=RAG_KEEP_GENERATIONS,
+                embed_model_id=BEDROCK_EMBED_MODEL_ID, embed_dimensions=EMBED_DIMENSIONS,
+            )
+        except Exception as e:
+            logger.warning("Failed to pull index snapshot from %s, using the local index: %s", RAG_SNAPSHOT_URI, e)
+    load_persisted_index()
+
+
+@app.on_event("shutdown")
+async def cancel_reload_on_shutdown():
+    job = reload_manager.active()
+    if job is not None:
+        reload_manager.cancel(job.id)
+    index_store.unregister_reader(INDEX_DIR)
+    await aws_async.close()
+
+
 @app.get("/health")
 def health():
-    status = "ready" if faiss_index is not None and len(docstore) > 0 else "not_ready"
-    return {"status": status, "chunks": len(docstore)}
+    generation = current_generation()
+    manifest = generation.manifest if generation is not None else {}
+    return {
+        "status": "ready" if generation is not None and generation.docstore else "not_ready",
+        "chunks": len(generation.docstore) if generation is not None else 0,
+        "docstore_bytes": generation.docstore.nbytes if generation is not None else 0,
+        "index_generation": generation.id if generation is not None else None,
+        "index_mode": index_mode_of(generation.index) if generation is not None else None,
+        "vector_storage": index_storage_of(generation.index) if generation is not None else None,
+        "embed_dimensions": int(generation.index.d) if generation is not None else None,
+        "index_params": manifest.get("index_params"),
+        "index_created_at": manifest.get("created_at"),
+        "doc_cache": doc_cache.stats(),
+        "embedding": get_embedding_engine().stats(),
+        "embedding_store": _embedding_store_stats(),
+        "query_embeddings": query_vectors.stats(),
+        "reload": _active_reload(),
+    }
+
 
+def _active_reload() -> Optional[Dict[str, object]]:
+    job = reload_manager.active()
+    return job.snapshot() if job is not None else None
+
+
+def _embedding_store_stats() -> Optional[Dict[str, object]]:
+    store = get_embedding_store()
+    return store.stats() if store is not None else None
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    llm_cache = bedrock_gateway.response_cache()
+    return {
+        "doc_cache": doc_cache.stats(),
+        "embedding_store": _embedding_store_stats(),
+        "query_embeddings": query_vectors.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "coalescing": {
+            "generation": bedrock_gateway.generation_flights.stats(),
+            "generation_async": aws_async.generation_flights.stats(),
+            "embedding": embedding_flights.stats(),
+            "document": document_flights.stats(),
+        },
+    }
+
+
+@app.post("/reload", status_code=202)
+def reload_index(mode: str = "full", index_mode: Optional[str] = None):
+    """Start a background rebuild and return its job id.
+
+    ``mode=incremental`` re-embeds only new/changed S3 objects; ``index_mode``
+    (flat, ivf_flat, ivf_pq, hnsw) overrides RAG_INDEX_MODE for a full
+    rebuild. Only one reload runs at a time; a second request gets 409 with
+    the running job's id. Poll ``GET /reload/jobs/{job_id}`` for progress.
+    """
+    if mode not in ("full", "incremental"):
+        raise HTTPException(status_code=400, detail="mode must be 'full' or 'incremental'")
+    if index_mode is not None and index_mode not in INDEX_MODES:
+        raise HTTPException(status_code=400, detail=f"index_mode must be one of {', '.join(INDEX_MODES)}")
 
-@app.post("/reload")
-def reload_index():
+    def run(job: ReloadJob) -> Dict[str, object]:
+        if mode == "incremental":
+            return incremental_reindex_from_s3(job=job)
+        return {"chunks": rebuild_index_from_s3(index_mode, job=job)}
+
+    try:
+        job = reload_manager.start(mode, run, index_mode=index_mode)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job_id})
+    return job.snapshot()
+
+
+@app.get("/reload/jobs")
+def list_reload_jobs():
+    return {"jobs": [job.snapshot() for job in reload_manager.list()]}
+
+
+@app.get("/reload/jobs/{job_id}")
+def get_reload_job(job_id: str):
+    job = reload_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reload job")
+    return job.snapshot()
+
+
+@app.post("/reload/jobs/{job_id}/cancel")
+def cancel_reload_job(job_id: str):
+    """Ask a running reload to stop; the live index generation is left as it was."""
+    job = reload_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reload job")
+    return job.snapshot()
+
+
+@app.get("/index/snapshot")
+def get_index_snapshot():
+    """The latest published snapshot and the generation this node serves."""
+    if not RAG_SNAPSHOT_URI:
+        raise HTTPException(status_code=400, detail="RAG_SNAPSHOT_URI is not configured")
+    generation = current_generation()
     try:
-        count = rebuild_index_from_s3()
-        return {"ok": True, "chunks": count}
+        latest = index_snapshot.describe_snapshot(snapshot_target())
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to read snapshot location: {e}")
+    return {"uri": RAG_SNAPSHOT_URI, "latest": latest, "serving": generation.id if generation is not None else None}
+
+
+@app.post("/index/snapshot")
+def publish_index_snapshot():
+    """Publish the generation this node serves to RAG_SNAPSHOT_URI and make it LATEST."""
+    if not RAG_SNAPSHOT_URI:
+        raise HTTPException(status_code=400, detail="RAG_SNAPSHOT_URI is not configured")
+    generation = current_generation()
+    if generation is None or not generation.id:
+        raise HTTPException(status_code=400, detail="No index generation to publish. Call /reload first.")
+    try:
+        return index_snapshot.publish_snapshot(index_store.generation_dir(INDEX_DIR, generation.id), snapshot_target())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/index/snapshot/pull", status_code=202)
+def pull_index_snapshot(generation: Optional[str] = None):
+    """Start a background job that pulls a snapshot (default LATEST) and serves it.
+
+    Runs as a reload job, so it is single-flight with /reload and reports
+    progress through ``GET /reload/jobs/{job_id}``.
+    """
+    if not RAG_SNAPSHOT_URI:
+        raise HTTPException(status_code=400, detail="RAG_SNAPSHOT_URI is not configured")
+
+    def run(job: ReloadJob) -> Dict[str, object]:
+        job.set_phase("pulling")
+        target = snapshot_target()
+        record = index_snapshot.describe_snapshot(target, generation)
+        if record is None:
+            raise RuntimeError(f"No snapshot published at {RAG_SNAPSHOT_URI}")
+        job.set_total(len(record["files"]))
+
+        def on_file(name: str, size: int) -> None:
+            job.raise_if_cancelled()
+            job.add(objects_fetched=1, objects_indexed=1, bytes_fetched=size)
+
+        # Naming a generation explicitly may roll back to an older one; LATEST never does
+        index_snapshot.pull_snapshot(
+            target, INDEX_DIR, record["generation"], keep=RAG_KEEP_GENERATIONS, on_file=on_file,
+            embed_model_id=BEDROCK_EMBED_MODEL_ID, embed_dimensions=EMBED_DIMENSIONS, allow_older=generation is not None,
+        )
+        job.set_phase("loading")
+        if not load_persisted_index():
+            raise RuntimeError(f"Snapshot {record['generation']} could not be loaded (see logs)")
+        return {"generation": record["generation"], "bytes": record.get("bytes"), "chunks": record.get("chunks")}
+
+    try:
+        job = reload_manager.start("snapshot", run, generation=generation)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job_id})
+    return job.snapshot()
+
+
+@app.get("/index/report")
+def index_report(k: int = 10, queries: int = 200, compare_storage: bool = False):
+    """Recall@k vs latency of the active index against exact search on the stored vectors.
+
+    The exact vectors come from the embedding store, so this needs
+    EMBED_STORE_ENABLED and is meant for offline tuning of nprobe/efSearch.
+    When EMBED_STORE_DTYPE is float16 or int8 the ground truth is exact search
+    over those quantized vectors, which the report labels in
+    ``ground_truth_dtype``. With ``compare_storage`` it also reports recall@k
+    and bytes per vector of every RAG_VECTOR_STORAGE option on the same
+    vectors; that needs a float32 store, since the loss of each storage
+    option would otherwise be measured against an already quantized copy.
+    """
+    import numpy as np
+
+    generation = current_generation()
+    if generation is None or not generation.docstore:
+        raise HTTPException(status_code=400, detail="Index is empty. Call /reload first.")
+    index, store_items = generation.index, generation.docstore
+    store = get_embedding_store()
+    if store is None:
+        raise HTTPException(status_code=400, detail="Recall report needs the embedding store (EMBED_STORE_ENABLED)")
+    if compare_storage and store.dtype != "float32":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Storage comparison needs full-precision vectors; the embedding store keeps {store.dtype} (EMBED_STORE_DTYPE)",
+        )
+    ids = np.fromiter(store_items, dtype="int64", count=len(store_items))
+    vectors = store.get_many([store_items.chunk(doc_id) for doc_id in ids.tolist()])
+    if any(v is None for v in vectors):
+        raise HTTPException(status_code=409, detail="Some indexed chunks are missing from the embedding store")
+    matrix = np.vstack(vectors).astype("float32")
+    faiss.normalize_L2(matrix)
+    report = recall_report(index, matrix, ids, k=k, num_queries=queries, vectors_dtype=store.dtype)
+    report["embed_dimensions"] = int(index.d)
+    if compare_storage:
+        report["storage_comparison"] = storage_comparison(matrix, k=k, num_queries=queries, pq_m=RAG_PQ_M)
+    return report
+
+
 @app.post("/ask", response_model=AskResponse)
-def ask(req: AskRequest):
+async def ask(req: AskRequest):
+    t0 = time.time()
+    # Query embedding (Bedrock) on the I/O pool, FAISS/BM25 search and MMR packing on the CPU pool
+    question, generation, top_k, query_vector, scope, hit = await aws_async.run_io(_ask_lookup, req)
+    if hit is not None:
+        return AskResponse(**hit, cached=True, took_ms=int((time.time() - t0) * 1000))
+    context, sources, packing = await aws_async.run_cpu(_ask_context, req, question, generation, top_k, query_vector)
+    answer = await call_bedrock_rag_async(question, context)
+    if scope is not None and _cacheable_answer(answer):
+        answer_cache.put(scope, query_vector, {"answer": answer, "sources": sources})
+    took_ms = int((time.time() - t0) * 1000)
+    return AskResponse(answer=answer, sources=sources, took_ms=took_ms, **packing)
+
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest):
+    """/ask as Server-Sent Events: ``token`` events while the answer is generated,
+    then a ``done`` event with sources, packing stats, ``ttft_ms`` and ``took_ms``.
+    """
     t0 = time.time()
+    question, generation, top_k, query_vector, scope, hit = await aws_async.run_io(_ask_lookup, req)
+    if hit is not None:
+        cached = {"sources": hit["sources"], "cached": True}
+        return sse_response(stream_events(iter([hit["answer"]]), lambda answer: cached, t0))
+    context, sources, packing = await aws_async.run_cpu(_ask_context, req, question, generation, top_k, query_vector)
+
+    def finish(answer: str) -> Dict[str, object]:
+        if scope is not None and _cacheable_answer(answer):
+            answer_cache.put(scope, query_vector, {"answer": answer, "sources": sources})
+        return {"sources": sources, "cached": False, **packing}
+
+    return sse_response(stream_events_async(stream_bedrock_rag_async(question, context), finish, t0))
+
+
+def _ask_lookup(req: AskRequest):
+    """Validate an /ask request and check the answer cache.
+
+    Returns (question, generation, top_k, query vector, cache scope, cached answer or None).
+    """
     question = req.question.strip()
     if not question:
         raise HTTPException(status_code=400, detail="question is required")
+    if req.retrieval not in ("hybrid", "vector", "lexical"):
+        raise HTTPException(status_code=400, detail="retrieval must be 'hybrid', 'vector' or 'lexical'")
+    top_k = max(1, req.top_k)
+    generation = current_generation()
+
+    # The query embedding is computed once: it is the answer-cache key and the vector-search query
+    query_vector = None
+    scope = None
+    hit = None
+    if generation is not None and req.retrieval != "lexical":
+        query_vector = embed_query(question)
+        if ANSWER_CACHE_ENABLED and query_vector is not None:
+            scope = _ask_scope(generation, req, top_k)
+            hit = answer_cache.lookup(scope, query_vector)
+    return question, generation, top_k, query_vector, scope, hit[0] if hit is not None else None
+
+
+def _ask_retrieve(req: AskRequest, question: str, generation, top_k: int, query_vector):
     try:
-        results = search_similar_chunks(question, k=max(1, req.top_k))
+        if generation is None:
+            raise RuntimeError("Index is empty. Call /reload first or set S3 env vars correctly.")
+        return hybrid_search(
+            question, k=top_k, retrieval=req.retrieval, nprobe=req.nprobe, ef_search=req.ef_search,
+            generation=generation, query_vector=query_vector, sources=req.sources, source_prefix=req.source_prefix,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    # Build context
-    context_parts: List[str] = []
-    sources: List[Dict[str, str]] = []
-    for score, item in results:
-        context_parts.append(item["chunk"])
-        sources.append({"source": item["source"], "score": f"{score:.4f}"})
-    context = "\n\n".join(context_parts)
 
-    answer = call_bedrock_rag(question, context)
-    took_ms = int((time.time() - t0) * 1000)
-    return AskResponse(answer=answer, sources=sources, took_ms=took_ms)
+def _ask_context(req: AskRequest, question: str, generation, top_k: int, query_vector):
+    """Retrieval plus context packing for /ask: (context, sources, packing stats)."""
+    return _context_and_sources(_ask_retrieve(req, question, generation, top_k, query_vector))
+
 
+def _ask_scope(generation: IndexGeneration, req, top_k: int) -> str:
+    """Answer-cache scope of an /ask or /ask/batch request: everything that shapes retrieval."""
+    sources = ",".join(sorted(req.sources)) if req.sources is not None else "*"
+    return (
+        f"index:{generation.id}:{req.retrieval}:{top_k}:{req.nprobe}:{req.ef_search}"
+        f":{sources}:{req.source_prefix or ''}"
+    )
 
-def _print_startup_banner() -> None:
-    logger.info("RAG Service starting...")
-    logger.info("AWS_REGION=%s S3_BUCKET=%s S3_PREFIX=%s", AWS_REGION, S3_BUCKET, S3_PREFIX)
-    logger.info("DATA_DIR=%s INDEX_DIR=%s", DATA_DIR, INDEX_DIR)
-    logger.info("BEDROCK_EMBED_MODEL_ID=%s", BEDROCK_EMBED_MODEL_ID)
-    logger.info("BEDROCK_CHAT_MODEL_ID=%s", BEDROCK_CHAT_MODEL_ID)
-    env_file_used = os.getenv("ENV_FILE", ".env")
-    if os.path.exists(env_file_used):
-        logger.info("Loaded environment from %s", env_file_used)
 
+def _context_and_sources(
+    results: List[Tuple[float, Dict[str, str]]],
+) -> Tuple[str, List[Dict[str, str]], Dict[str, int]]:
+    """Pack retrieved chunks into the prompt context; returns (context, sources, packing stats).
+
+    Adjacent chunks are merged, near-duplicates dropped (MMR) and the rest
+    packed into CONTEXT_TOKEN_BUDGET; sources list the passages kept.
+    """
+    passages = [
+        Passage(item["chunk"], item["source"], score, int(item.get("page") or 0), item.get("id"))
+        for score, item in results
+    ]
+    packed = pack_context(
+        passages,
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        lam=CONTEXT_MMR_LAMBDA,
+        duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD,
+    )
+    sources: List[Dict[str, str]] = []
+    for passage in packed.passages:
+        source = {"source": passage.source, "score": f"{passage.score:.4f}"}
+        if passage.page:
+            source["page"] = str(passage.page)
+        sources.append(source)
+    return packed.context, sources, packed.stats()
+
+
+@app.post("/ask/batch")
+def ask_batch(req: AskBatchRequest):
+    """Answer many questions, streaming one NDJSON line per question as it completes.
+
+    All questions are embedded concurrently and retrieved with one FAISS
+    search; answers are generated with at most ASK_BATCH_GENERATION_CONCURRENCY
+    Bedrock calls in flight. Lines carry the question's ``index`` in the
+    request (they arrive in completion order); a final ``{"done": true}``
+    line closes the stream.
+    """
+    questions = [q.strip() for q in req.questions]
+    if not questions or any(not q for q in questions):
+        raise HTTPException(status_code=400, detail="questions must be a non-empty list of non-empty strings")
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"at most {ASK_BATCH_MAX_QUESTIONS} questions per batch")
+    if req.retrieval not in ("hybrid", "vector", "lexical"):
+        raise HTTPException(status_code=400, detail="retrieval must be 'hybrid', 'vector' or 'lexical'")
+    generation = current_generation()
+    if generation is None or not generation.docstore:
+        raise HTTPException(status_code=500, detail="Index is empty. Call /reload first or set S3 env vars correctly.")
+    top_k = max(1, req.top_k)
+    scope = _ask_scope(generation, req, top_k)
+    return StreamingResponse(
+        _stream_batch_answers(questions, req, top_k, generation, scope), media_type="application/x-ndjson"
+    )
 
-if __name__ == "__main__":
-    _print_startup_banner()
-    # Do not auto-load on start to avoid slowing startup; user can call /reload
-    import uvicorn  # type: ignore
 
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
+def _stream_batch_answers(
+    questions: List[str],
+    req: AskBatchRequest,
+    top_k: int,
+    generation: IndexGeneration,
+    scope: str,
+) -> Iterator[str]:
+    t0 = time.time()
 
+    def line(payload: Dict[str, object]) -> str:
+        return json.dumps(payload, ensure_ascii=False) + "\n"
 
+    query_vectors: List = [None] * len(questions)
+    if req.retrieval != "lexical":
+        try:
+            query_vectors = list(embed_queries(questions))
+        except Exception as e:
+            logger.warning("Batch query embedding failed: %s", e)
+            if req.retrieval == "vector":
+                yield line({"error": f"Failed to embed questions: {e}", "done": True})
+                return
+
+    # Cache hits stream back first; only the rest are retrieved and generated
+    pending: List[int] = []
+    for i, (question, vector) in enumerate(zip(questions, query_vectors)):
+        hit = answer_cache.lookup(scope, vector) if ANSWER_CACHE_ENABLED and vector is not None else None
+        if hit is not None:
+            yield line({"index": i, "question": question, **hit[0], "cached": True,
+                        "took_ms": int((time.time() - t0) * 1000)})
+        else:
+            pending.append(i)
+    if not pending:
+        yield line({"done": True, "count": len(questions), "took_ms": int((time.time() - t0) * 1000)})
+        return
+
+    try:
+        results = batch_hybrid_search(
+            [questions[i] for i in pending], k=top_k, retrieval=req.retrieval, nprobe=req.nprobe,
+            ef_search=req.ef_search, generation=generation, query_vectors=[query_vectors[i] for i in pending],
+            sources=req.sources, source_prefix=req.source_prefix,
+        )
+    except Exception as e:
+        yield line({"error": str(e), "done": True})
+        return
+
+    def answer_one(i: int, hits: List[Tuple[float, Dict[str, str]]]) -> Dict[str, object]:
+        context, sources, packing = _context_and_sources(hits)
+        answer = call_bedrock_rag(questions[i], context)
+        if ANSWER_CACHE_ENABLED and query_vectors[i] is not None and _cacheable_answer(answer):
+            answer_cache.put(scope, query_vectors[i], {"answer": answer, "sources": sources})
+        return {"answer": answer, "sources": sources, **packing}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, ASK_BATCH_GENERATION_CONCURRENCY), thread_name_prefix="ask-batch")
+    try:
+        futures = {pool.submit(answer_one, i, hits): i for i, hits in zip(pending, results)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                payload = {"index": i, "question": questions[i], **future.result(), "cached": False}
+            except Exception as e:
+                payload = {"index": i, "question": questions[i], "error": str(e)}
+            payload["took_ms"] = int((time.time() - t0) * 1000)
+            yield line(payload)
+    finally:
+        # Also reached when the client disconnects mid-stream
+        pool.shutdown(wait=False, cancel_futures=True)
+    yield line({"done": True, "count": len(questions), "took_ms": int((time.time() - t0) * 1000)})
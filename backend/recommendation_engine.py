@@ -2,20 +2,11 @@ import os
 import json
 import re
 from typing import List, Dict, Any
-import boto3
 
+import bedrock_gateway
 
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
 
-bedrock = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-)
+BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
 
 
 def _sanitize_json_text(raw_text: str) -> str:
@@ -110,25 +101,9 @@ Rules:
 {context}
 """
 
-    body = json.dumps({
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 1200,
-        "temperature": 0.2,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-    })
-
     try:
-        response = bedrock.invoke_model(modelId=BEDROCK_MODEL_ID, body=body)
-        raw_body = response["body"].read()
-        result = json.loads(raw_body)
-        text_output = (
-            result.get("content", [{}])[0].get("text")
-            or result.get("output_text")
-            or result.get("completion")
-            or ""
+        text_output = bedrock_gateway.generate_text(
+            BEDROCK_MODEL_ID, user_prompt, max_tokens=1200, temperature=0.2, system=system_prompt
         )
         text_output = _sanitize_json_text(text_output)
         data = json.loads(text_output)
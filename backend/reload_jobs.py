@@ -0,0 +1,197 @@
+# reload_jobs.py
+"""Background index reload jobs with progress, cancellation and single-flight.
+
+``POST /reload`` starts a ``ReloadJob`` on a background thread and returns its
+id straight away; the job's counters are updated by the ingestion pipeline and
+exposed through the job endpoints. At most one reload runs at a time: within a
+process the manager refuses to start a second job, and across the uvicorn
+workers of one host an exclusive ``flock`` on a lock file in the index
+directory does the same.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from ingest_pipeline import PipelineCancelled
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+
+logger = logging.getLogger("reload_jobs")
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+
+class ReloadInProgress(RuntimeError):
+    """Raised when a reload is requested while another one is running."""
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
+        where = f"job {job_id}" if job_id else "another worker process"
+        super().__init__(f"A reload is already running ({where})")
+
+
+class ReloadJob:
+    """State and progress counters of one reload.
+
+    Counters are bumped from pipeline worker threads through ``add``;
+    ``snapshot`` derives throughput and an ETA from them.
+    """
+
+    def __init__(self, mode: str, params: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.params = dict(params or {})
+        self.status = "queued"
+        self.phase = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.cancel = threading.Event()
+        self.objects_total = 0
+        self.objects_fetched = 0
+        self.objects_indexed = 0
+        self.bytes_fetched = 0
+        self.chunks_embedded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def set_phase(self, phase: str) -> None:
+        self.raise_if_cancelled()
+        self.phase = phase
+
+    def set_total(self, objects: int) -> None:
+        with self._lock:
+            self.objects_total = objects
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancel.is_set():
+            raise PipelineCancelled("reload cancelled")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            eta = None
+            if self.status == "running" and self.objects_indexed and self.objects_total:
+                remaining = max(0, self.objects_total - self.objects_indexed)
+                eta = round(remaining * elapsed / self.objects_indexed, 1)
+            return {
+                "job_id": self.id,
+                "mode": self.mode,
+                "params": self.params,
+                "status": self.status,
+                "phase": self.phase,
+                "cancel_requested": self.cancel.is_set(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.created_at)),
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": eta,
+                "objects_total": self.objects_total,
+                "objects_fetched": self.objects_fetched,
+                "objects_indexed": self.objects_indexed,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_per_second": round(self.chunks_embedded / elapsed, 2) if elapsed else 0.0,
+                "fetch_mb_per_second": round(self.bytes_fetched / elapsed / 1e6, 3) if elapsed else 0.0,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class ReloadJobManager:
+    """Runs reload jobs one at a time on background threads and remembers recent ones."""
+
+    def __init__(self, lock_path: str, history: int = 20):
+        self.lock_path = lock_path
+        self.history = max(1, history)
+        self._jobs: "OrderedDict[str, ReloadJob]" = OrderedDict()
+        self._active: Optional[ReloadJob] = None
+        self._lock = threading.Lock()
+
+    def start(self, mode: str, run: Callable[[ReloadJob], Dict[str, Any]], **params: Any) -> ReloadJob:
+        """Start ``run(job)`` in the background; raises ReloadInProgress if a reload is running."""
+        with self._lock:
+            if self._active is not None:
+                raise ReloadInProgress(self._active.id)
+            lock_file = self._acquire_file_lock()
+            job = ReloadJob(mode, params)
+            self._active = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest].done:
+                    break
+                self._jobs.pop(oldest)
+        thread = threading.Thread(target=self._run, args=(job, run, lock_file), name=f"reload-{job.id}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ReloadJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self) -> Optional[ReloadJob]:
+        return self._active
+
+    def list(self) -> List[ReloadJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[ReloadJob]:
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel.set()
+        return job
+
+    # -- internals ---------------------------------------------------------
+
+    def _acquire_file_lock(self):
+        if fcntl is None:
+            return None
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        f = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            raise ReloadInProgress(None)
+        return f
+
+    def _run(self, job: ReloadJob, run: Callable[[ReloadJob], Dict[str, Any]], lock_file) -> None:
+        job.started_at = time.time()
+        job.status = job.phase = "running"
+        try:
+            job.result = run(job)
+            job.status = "succeeded"
+        except PipelineCancelled:
+            job.status = "cancelled"
+            logger.info("Reload job %s cancelled", job.id)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.exception("Reload job %s failed", job.id)
+        finally:
+            job.finished_at = time.time()
+            job.phase = "done"
+            if lock_file is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+            with self._lock:
+                self._active = None
@@ -0,0 +1,83 @@
+# sse.py
+"""Server-Sent Events for streamed LLM answers.
+
+A streamed answer is a sequence of events:
+
+    event: token   data: {"text": "..."}          one per generated fragment
+    event: done    data: {...trailer, "ttft_ms", "took_ms"}
+    event: error   data: {"error": "...", "ttft_ms", "took_ms"}   instead of done
+
+The trailer carries whatever only exists once the answer is complete
+(sources, packing stats, cache flags); ``ttft_ms`` is the time to the first
+token, measured from ``t0`` (the start of the request).
+"""
+
+import json
+import time
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Union
+
+from fastapi.responses import StreamingResponse
+
+
+logger = logging.getLogger("sse")
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Keep reverse proxies (nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(
+    tokens: Iterator[str],
+    finish: Optional[Callable[[str], Dict[str, Any]]] = None,
+    t0: Optional[float] = None,
+) -> Iterator[str]:
+    """SSE for ``tokens``, then a ``done`` event with ``finish(full_text)`` merged in."""
+    t0 = time.time() if t0 is None else t0
+    parts = []
+    ttft_ms = None
+    try:
+        for text in tokens:
+            if ttft_ms is None:
+                ttft_ms = int((time.time() - t0) * 1000)
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+        trailer = finish("".join(parts)) if finish is not None else {}
+    except Exception as e:
+        logger.warning("Streamed answer failed: %s", e)
+        yield sse_event("error", {"error": str(e), "ttft_ms": ttft_ms, "took_ms": int((time.time() - t0) * 1000)})
+        return
+    yield sse_event("done", {**trailer, "ttft_ms": ttft_ms, "took_ms": int((time.time() - t0) * 1000)})
+
+
+async def stream_events_async(
+    tokens: AsyncIterator[str],
+    finish: Optional[Callable[[str], Dict[str, Any]]] = None,
+    t0: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """``stream_events`` for an async token stream (aws_async.stream_text)."""
+    t0 = time.time() if t0 is None else t0
+    parts = []
+    ttft_ms = None
+    try:
+        async for text in tokens:
+            if ttft_ms is None:
+                ttft_ms = int((time.time() - t0) * 1000)
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+        trailer = finish("".join(parts)) if finish is not None else {}
+    except Exception as e:
+        logger.warning("Streamed answer failed: %s", e)
+        yield sse_event("error", {"error": str(e), "ttft_ms": ttft_ms, "took_ms": int((time.time() - t0) * 1000)})
+        return
+    yield sse_event("done", {**trailer, "ttft_ms": ttft_ms, "took_ms": int((time.time() - t0) * 1000)})
+
+
+def sse_response(events: Union[Iterator[str], AsyncIterator[str]]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -2,23 +2,15 @@
 import os
 import json
 import re
-import boto3
 from datetime import datetime
 from typing import Dict, Any
 from dotenv import load_dotenv
 
+import bedrock_gateway
+
 # Load environment variables
 load_dotenv()
 
-def get_bedrock_runtime_client():
-    """Get Bedrock runtime client."""
-    return boto3.client(
-        service_name="bedrock-runtime",
-        region_name=os.getenv("AWS_REGION", "us-east-1"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-
 def _sanitize_json_text(raw_text: str) -> str:
     """Sanitize LLM output to extract JSON."""
     if not raw_text:
@@ -43,6 +35,13 @@ def _sanitize_json_text(raw_text: str) -> str:
     text = re.sub(r",\s*([}\]])", r"\1", text)
     return text.strip()
 
+def _is_json_text(raw_text: str) -> bool:
+    try:
+        json.loads(_sanitize_json_text(raw_text))
+        return True
+    except ValueError:
+        return False
+
 def generate_study_plan_with_bedrock(study_plan_request: Dict[str, Any], days_until: int) -> Dict[str, Any]:
     """Generate a detailed, personalized study plan using AWS Bedrock LLM."""
     topics = [t for t in study_plan_request["topics"] if t.strip()]
@@ -200,39 +199,15 @@ Return ONLY the JSON object, no additional text or explanations."""
         return generate_enhanced_fallback_study_plan(study_plan_request, days_until)
     
     try:
-        # Get Bedrock client
-        client = get_bedrock_runtime_client()
         model_id = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
         
-        # Prepare payload for Bedrock (same format as quiz generation)
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 3000,  # Increased for detailed study plans
-            "temperature": 0.3,  # Lower temperature for more consistent output
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        })
-
         print(f"🤖 Calling AWS Bedrock with model: {model_id}")
-        
-        # Invoke Bedrock LLM
-        response = client.invoke_model(
-            modelId=model_id,
-            body=body
-        )
-        
-        # Read and parse response
-        raw_body = response["body"].read()
-        result = json.loads(raw_body)
 
-        # Extract text from Anthropic response format
-        text_output = (
-            result.get("content", [{}])[0].get("text")
-            or result.get("output_text")
-            or result.get("completion")
-            or ""
-        ).strip()
+        # Detailed study plans need a large budget; low temperature keeps the JSON consistent
+        text_output = bedrock_gateway.generate_text(
+            model_id, prompt, max_tokens=3000, temperature=0.3,
+            cache="study_plan", accept=_is_json_text,
+        )
 
         print(f"✅ Received response from Bedrock (length: {len(text_output)} chars)")
         
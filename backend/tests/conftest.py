@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# rag_service reads its settings and creates its directories at import time
+_scratch = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.setdefault("RAG_DATA_DIR", os.path.join(_scratch, "data"))
+os.environ.setdefault("RAG_INDEX_DIR", os.path.join(_scratch, "index"))
+os.environ.setdefault("EMBED_STORE_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+
+def unit_vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+@pytest.fixture
+def index_root(tmp_path):
+    return str(tmp_path / "index")
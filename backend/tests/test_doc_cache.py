@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import rag_service
+from doc_cache import DocumentCache, DocumentEntry
+
+
+def _vectors(n, dim=16):
+    return np.ones((n, dim), dtype="float32")
+
+
+def test_entry_size_counts_utf8_bytes_and_vectors():
+    entry = DocumentEntry("a.txt", "e1", ["abc", "नमस्ते"], _vectors(2))
+    assert entry.nbytes == 3 + len("नमस्ते".encode("utf-8")) + 2 * 16 * 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DocumentCache(str(tmp_path / "doc_cache"), max_bytes=10_000)
+
+
+def test_entry_embedded_after_caching_is_counted_with_its_vectors(cache):
+    cache.put(DocumentEntry("a.txt", "e1", ["chunk"] * 4))
+    assert cache.stats()["bytes"] == 20
+
+    cached = cache.get("a.txt", "e1")
+    cached.vectors = _vectors(4)
+    cache.put(cached)
+
+    assert cache.stats()["bytes"] == cached.nbytes == 20 + 4 * 16 * 4
+
+
+def test_eviction_keeps_the_byte_count_consistent(cache):
+    for i in range(20):
+        cache.put(DocumentEntry(f"{i}.txt", "e1", ["x" * 100] * 3, _vectors(3)))
+        cached = cache.get(f"{i}.txt", "e1")
+        cached.vectors = _vectors(3, dim=32)
+        cache.put(cached)
+
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert 0 < stats["bytes"] <= cache.max_bytes
+    assert stats["bytes"] == sum(entry.nbytes for entry in cache._entries.values())
+
+
+def test_summarized_then_asked_document_is_cached_with_vectors(tmp_path, monkeypatch):
+    cache = DocumentCache(str(tmp_path / "doc_cache"))
+    monkeypatch.setattr(rag_service, "doc_cache", cache)
+    monkeypatch.setattr(rag_service, "embed_texts", lambda texts: _vectors(len(texts)).tolist())
+
+    summarized = rag_service.get_document_entry("mock/notes.txt", embed=False, etag="e1")
+    assert summarized.vectors is None
+    asked = rag_service.get_document_entry("mock/notes.txt", embed=True, etag="e1")
+
+    assert asked.vectors is not None and len(asked.vectors) == len(asked.chunks)
+    assert summarized.vectors is None  # the shared cached object is replaced, not filled in
+    assert cache.get("mock/notes.txt", "e1") is asked
+    assert cache.stats()["bytes"] == asked.nbytes
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import bedrock_gateway
+from embedding_engine import EmbeddingEngine
+
+
+def _error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+class _Flaky:
+    """``embed_one`` failing with ``code`` for the first ``failures`` calls."""
+
+    def __init__(self, failures=0, code="ThrottlingException"):
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise _error(self.code)
+        return [float(len(text))]
+
+
+def _engine(embed_one, **kwargs):
+    return EmbeddingEngine(embed_one, base_delay=0, max_delay=0, **kwargs)
+
+
+def test_vectors_come_back_in_input_order():
+    engine = _engine(_Flaky(), max_concurrency=4)
+    texts = ["a" * n for n in range(1, 50)]
+    assert engine.embed(texts) == [[float(n)] for n in range(1, 50)]
+    assert engine.embed(texts, interactive=True) == [[float(n)] for n in range(1, 50)]
+
+
+def test_throttled_call_is_retried_and_halves_the_limit():
+    embed_one = _Flaky(failures=2)
+    engine = _engine(embed_one, max_concurrency=8, max_retries=6)
+
+    assert engine.embed(["abc"]) == [[3.0]]
+    assert embed_one.calls == 3
+    assert engine.stats()["throttles"] == 2
+    assert engine.stats()["concurrency_limit"] == 2
+
+
+def test_retries_stop_after_max_retries():
+    embed_one = _Flaky(failures=100)
+    engine = _engine(embed_one, max_retries=3)
+
+    with pytest.raises(ClientError):
+        engine.embed(["abc"])
+    # The engine is the only retry layer: one request per attempt
+    assert embed_one.calls == 4
+
+
+def test_non_retryable_error_is_raised_immediately():
+    embed_one = _Flaky(failures=1, code="ValidationException")
+    engine = _engine(embed_one)
+
+    with pytest.raises(ClientError):
+        engine.embed(["abc"])
+    assert embed_one.calls == 1
+
+
+def test_interactive_throttle_also_halves_the_bulk_lane():
+    engine = _engine(_Flaky(failures=1), max_concurrency=8, interactive_concurrency=4)
+
+    engine.embed(["question"], interactive=True)
+
+    stats = engine.stats()
+    assert stats["interactive_concurrency_limit"] == 2
+    assert stats["concurrency_limit"] == 4
+
+
+def test_bulk_throttle_leaves_interactive_lane_alone():
+    engine = _engine(_Flaky(failures=1), max_concurrency=8, interactive_concurrency=4)
+
+    engine.embed(["chunk one", "chunk two"])
+
+    assert engine.stats()["interactive_concurrency_limit"] == 4
+
+
+def test_query_lane_is_not_blocked_by_bulk_work():
+    release = threading.Event()
+    started = threading.Event()
+
+    def embed_one(text):
+        if text.startswith("bulk"):
+            started.set()
+            release.wait(5)
+        return [1.0]
+
+    engine = _engine(embed_one, max_concurrency=1, interactive_concurrency=1)
+    bulk = threading.Thread(target=engine.embed, args=(["bulk 1", "bulk 2"],))
+    bulk.start()
+    try:
+        assert started.wait(5)
+        assert engine.embed(["question"], interactive=True) == [[1.0]]
+    finally:
+        release.set()
+        bulk.join(5)
+
+
+def test_single_attempt_client_disables_botocore_retries(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    client = bedrock_gateway.get_client(retry=False)
+
+    assert client.meta.config.retries["total_max_attempts"] == 1
+    assert bedrock_gateway.get_client(retry=False) is client
+    assert bedrock_gateway.get_client() is not client
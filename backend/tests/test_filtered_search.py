@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+import ann_index
+import rag_service
+from chunk_store import ChunkStore
+from conftest import unit_vectors
+from lexical_index import BM25Index
+
+DOCS = 10
+CHUNKS_PER_DOC = 1000  # 10000 vectors: enough to train PQ's 256 centroids per sub-quantizer
+K = 5
+
+LAYOUTS = [
+    ("flat", "float32"),
+    ("flat", "float16"),
+    ("flat", "int8"),
+    ("flat", "pq"),
+    ("ivf_flat", "float32"),
+    ("ivf_flat", "int8"),
+    ("ivf_pq", "pq"),
+    ("hnsw", "float32"),
+    ("hnsw", "int8"),
+]
+
+_generations = {}
+
+
+def _generation(mode, storage):
+    """A generation of DOCS documents with contiguous id ranges, built once per layout."""
+    if (mode, storage) not in _generations:
+        vectors = unit_vectors(DOCS * CHUNKS_PER_DOC)
+        ids = np.arange(len(vectors), dtype="int64")
+        builder = ann_index.IndexBuilder(
+            mode, train_sample=len(vectors), pq_m=2, ef_construction=40, storage=storage
+        )
+        builder.add(vectors, ids)
+        index = builder.finish()
+        assert (ann_index.index_mode_of(index), ann_index.index_storage_of(index)) == (mode, storage)
+        docstore = ChunkStore()
+        objects = {}
+        for doc in range(DOCS):
+            start = doc * CHUNKS_PER_DOC
+            objects[f"doc{doc}.txt"] = {"etag": "e", "id_start": start, "count": CHUNKS_PER_DOC}
+            for doc_id in range(start, start + CHUNKS_PER_DOC):
+                docstore[doc_id] = {"chunk": f"chunk {doc_id}", "source": f"doc{doc}.txt"}
+        manifest = {"generation": f"test-{mode}-{storage}", "objects": objects}
+        _generations[mode, storage] = (rag_service.IndexGeneration(index, docstore, BM25Index(), manifest), vectors)
+    return _generations[mode, storage]
+
+
+def _search(generation, queries, **filters):
+    source_filter = rag_service._source_filter(generation, **filters)
+    return rag_service._vector_search_batch(generation, queries, K, source_filter=source_filter)
+
+
+def _allowed(*docs):
+    return {doc_id for doc in docs for doc_id in range(doc * CHUNKS_PER_DOC, (doc + 1) * CHUNKS_PER_DOC)}
+
+
+@pytest.mark.parametrize("mode,storage", LAYOUTS)
+def test_single_document_filter_returns_only_its_chunks(mode, storage):
+    generation, vectors = _generation(mode, storage)
+    inside = 3 * CHUNKS_PER_DOC + 17
+    hits = _search(generation, vectors[[inside, 42]], sources="doc3.txt")
+
+    for row in hits:
+        assert len(row) == K
+        assert {doc_id for doc_id, _ in row} <= _allowed(3)
+    if storage in ("float32", "float16"):
+        assert hits[0][0][0] == inside
+
+
+@pytest.mark.parametrize("mode,storage", LAYOUTS)
+def test_multi_document_filter_returns_only_their_chunks(mode, storage):
+    generation, vectors = _generation(mode, storage)
+    hits = _search(generation, vectors[:3], sources=["doc1.txt", "doc7.txt"])
+
+    for row in hits:
+        assert len(row) == K
+        assert {doc_id for doc_id, _ in row} <= _allowed(1, 7)
+
+
+@pytest.mark.parametrize("mode,storage", LAYOUTS)
+def test_wide_filter_beyond_exact_scan_limit(mode, storage, monkeypatch):
+    # Filters wider than NARROW_FILTER_IDS search under an id selector, except on
+    # flat+pq (IndexPQ rejects search parameters), which scans the allowed ids in blocks
+    monkeypatch.setattr(ann_index, "NARROW_FILTER_IDS", 700)
+    generation, vectors = _generation(mode, storage)
+    hits = _search(generation, vectors[:3], source_prefix="doc")
+
+    for row in hits:
+        assert len(row) == K
+        assert {doc_id for doc_id, _ in row} <= _allowed(*range(DOCS))
+    hits = _search(generation, vectors[:3], sources=["doc0.txt", "doc5.txt"])
+    for row in hits:
+        assert len(row) == K
+        assert {doc_id for doc_id, _ in row} <= _allowed(0, 5)
+
+
+def test_exact_scan_scores_match_index_scores_on_flat_pq():
+    generation, vectors = _generation("flat", "pq")
+    queries = vectors[:2]
+    unfiltered, _ = generation.index.search(queries, K)
+    hits = _search(generation, queries, source_prefix="doc")
+
+    for row, expected in zip(hits, unfiltered):
+        np.testing.assert_allclose([score for _, score in row], expected, rtol=1e-4, atol=1e-5)
+
+
+def test_filter_on_unknown_source_returns_no_hits():
+    generation, vectors = _generation("flat", "float32")
+    assert _search(generation, vectors[:2], sources="missing.txt") == [[], []]
@@ -0,0 +1,103 @@
+import io
+import zlib
+
+import numpy as np
+import pytest
+
+import rag_service
+
+
+def _fake_embed(texts):
+    vectors = []
+    for text in texts:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vec = rng.standard_normal(16).astype("float32")
+        vectors.append((vec / np.linalg.norm(vec)).tolist())
+    return vectors
+
+
+class _FakeS3:
+    """An S3 bucket of ``key -> (etag, text)`` as seen by list_s3_objects and get_object."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put(self, key, etag, text):
+        self.objects[key] = (etag, text)
+
+    def list(self, bucket, prefix):
+        return [
+            {"key": key, "etag": etag, "last_modified": "2026-01-01T00:00:00Z"}
+            for key, (etag, _) in sorted(self.objects.items())
+        ]
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key][1].encode("utf-8"))}
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    s3 = _FakeS3()
+    monkeypatch.setattr(rag_service, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(rag_service, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(rag_service, "RAG_INDEX_MODE", "flat")
+    monkeypatch.setattr(rag_service, "RAG_SNAPSHOT_URI", "")
+    monkeypatch.setattr(rag_service, "_generation", None)
+    monkeypatch.setattr(rag_service, "list_s3_objects", s3.list)
+    monkeypatch.setattr(rag_service, "s3_client", lambda: s3)
+    monkeypatch.setattr(rag_service, "embed_texts", _fake_embed)
+    return s3
+
+
+def _live_sources():
+    generation = rag_service._generation
+    return sorted({generation.docstore[doc_id]["source"] for doc_id in generation.docstore})
+
+
+def test_first_reindex_without_manifest_is_a_full_rebuild(bucket):
+    bucket.put("notes/a.txt", "a1", "Photosynthesis turns light into chemical energy.")
+    bucket.put("notes/b.txt", "b1", "The Pythagorean theorem relates the sides of a right triangle.")
+
+    result = rag_service.incremental_reindex_from_s3()
+
+    assert result == {"chunks": 2, "added": 2, "removed": 0, "full_rebuild": True}
+    assert rag_service._generation.index.ntotal == 2
+
+
+def test_incremental_reindex_counts_new_changed_and_deleted_objects(bucket):
+    bucket.put("notes/a.txt", "a1", "Photosynthesis turns light into chemical energy.")
+    bucket.put("notes/b.txt", "b1", "The Pythagorean theorem relates the sides of a right triangle.")
+    bucket.put("notes/c.txt", "c1", "New Delhi is the capital of India.")
+    rag_service.incremental_reindex_from_s3()
+
+    bucket.put("notes/b.txt", "b2", "Right triangles satisfy a squared plus b squared equals c squared.")
+    del bucket.objects["notes/c.txt"]
+    bucket.put("notes/d.txt", "d1", "Mitochondria are the powerhouse of the cell.")
+    result = rag_service.incremental_reindex_from_s3()
+
+    assert result == {
+        "chunks": 3,
+        "added": 2,
+        "removed": 2,
+        "new_objects": 1,
+        "changed_objects": 1,
+        "deleted_objects": 1,
+        "unchanged_objects": 1,
+    }
+    assert rag_service._generation.index.ntotal == 3
+    assert _live_sources() == ["notes/a.txt", "notes/b.txt", "notes/d.txt"]
+    objects = rag_service._generation.manifest["objects"]
+    assert sorted(objects) == ["notes/a.txt", "notes/b.txt", "notes/d.txt"]
+    assert objects["notes/b.txt"]["etag"] == "b2"
+
+
+def test_incremental_reindex_of_unchanged_bucket_adds_and_removes_nothing(bucket):
+    bucket.put("notes/a.txt", "a1", "Photosynthesis turns light into chemical energy.")
+    rag_service.incremental_reindex_from_s3()
+    generation = rag_service._generation
+
+    result = rag_service.incremental_reindex_from_s3()
+
+    assert result["added"] == 0 and result["removed"] == 0
+    assert result["unchanged_objects"] == 1
+    assert rag_service._generation is generation
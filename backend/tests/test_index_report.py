@@ -0,0 +1,44 @@
+import faiss
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import rag_service
+from chunk_store import ChunkStore
+from conftest import unit_vectors
+from embedding_store import EmbeddingStore
+from lexical_index import BM25Index
+
+
+@pytest.fixture(params=["float32", "float16"])
+def store(request, tmp_path, monkeypatch):
+    """A flat generation of 50 chunks whose vectors are in an embedding store of the given dtype."""
+    vectors = unit_vectors(50)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    docstore = ChunkStore()
+    for doc_id in range(len(vectors)):
+        docstore[doc_id] = {"chunk": f"chunk {doc_id}", "source": "a.txt"}
+    store = EmbeddingStore(str(tmp_path), "test-model", dtype=request.param)
+    store.put_many([f"chunk {doc_id}" for doc_id in range(len(vectors))], vectors.tolist())
+
+    generation = rag_service.IndexGeneration(index, docstore, BM25Index(), {"generation": "test"})
+    monkeypatch.setattr(rag_service, "current_generation", lambda: generation)
+    monkeypatch.setattr(rag_service, "get_embedding_store", lambda: store)
+    return store
+
+
+def test_report_names_the_precision_of_its_ground_truth(store):
+    report = rag_service.index_report(k=5, queries=20)
+
+    assert report["ground_truth_dtype"] == store.dtype
+    assert report["results"][0]["recall_at_5"] == 1.0
+
+
+def test_storage_comparison_needs_full_precision_vectors(store):
+    if store.dtype == "float32":
+        assert "storage_comparison" in rag_service.index_report(k=5, queries=20, compare_storage=True)
+        return
+    with pytest.raises(HTTPException) as e:
+        rag_service.index_report(k=5, queries=20, compare_storage=True)
+    assert e.value.status_code == 400
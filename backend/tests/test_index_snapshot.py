@@ -0,0 +1,136 @@
+import itertools
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+import index_snapshot
+import index_store
+from chunk_store import ChunkStore
+from conftest import unit_vectors
+from index_snapshot import SnapshotRejected
+
+MODEL = "amazon.titan-embed-text-v2:0"
+
+
+@pytest.fixture(autouse=True)
+def ordered_generation_ids(monkeypatch):
+    counter = itertools.count(1)
+    monkeypatch.setattr(index_store, "new_generation_id", lambda: f"20260101T0000{next(counter):02d}Z-test")
+
+
+def _build(root, model=MODEL, dimensions=0):
+    """Save a small flat generation under ``root`` and return its id."""
+    vectors = unit_vectors(8)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    docstore = ChunkStore()
+    for doc_id in range(len(vectors)):
+        docstore[doc_id] = {"chunk": f"chunk {doc_id}", "source": "a.txt"}
+    manifest = index_store.save_generation(
+        root, index, docstore, {"embed_model_id": model, "embed_dimensions": dimensions}, keep=5
+    )
+    return manifest["generation"]
+
+
+@pytest.fixture
+def target(tmp_path):
+    return index_snapshot.open_target(f"file://{tmp_path / 'snapshots'}")
+
+
+def _publish(root, target, **kwargs):
+    generation = _build(root, **kwargs)
+    index_snapshot.publish_snapshot(index_store.generation_dir(root, generation), target)
+    return generation
+
+
+def test_check_compatible_accepts_matching_record():
+    record = {"format": 1, "generation": "g", "format_version": index_store.FORMAT_VERSION,
+              "embed_model_id": MODEL, "embed_dimensions": 256}
+    index_snapshot.check_compatible(record, MODEL, 256)
+    index_snapshot.check_compatible(record, None, None)
+
+
+@pytest.mark.parametrize("change,message", [
+    ({"embed_model_id": "cohere.embed-english-v3"}, "built with"),
+    ({"embed_dimensions": 1024}, "1024-dim"),
+    ({"format_version": 99}, "index format"),
+    ({"format": 2}, "snapshot format"),
+])
+def test_check_compatible_rejects_mismatches(change, message):
+    record = {"format": 1, "generation": "g", "format_version": index_store.FORMAT_VERSION,
+              "embed_model_id": MODEL, "embed_dimensions": 256, **change}
+    with pytest.raises(SnapshotRejected, match=message):
+        index_snapshot.check_compatible(record, MODEL, 256)
+
+
+def test_pull_installs_verified_snapshot_as_current(tmp_path, target):
+    generation = _publish(str(tmp_path / "builder"), target)
+    node = str(tmp_path / "node")
+
+    record = index_snapshot.pull_snapshot(target, node, embed_model_id=MODEL, embed_dimensions=0)
+
+    assert record["generation"] == generation
+    assert index_store.current_generation_id(node) == generation
+    index, docstore, manifest = index_store.load_index(index_store.current_index_dir(node))
+    assert index.ntotal == 8 and len(docstore) == 8
+
+
+def test_pull_with_nothing_published_returns_none(tmp_path, target):
+    assert index_snapshot.pull_snapshot(target, str(tmp_path / "node")) is None
+
+
+@pytest.mark.parametrize("kwargs", [{"model": "cohere.embed-english-v3"}, {"dimensions": 512}])
+def test_pull_rejects_other_embeddings_without_touching_current(tmp_path, target, kwargs):
+    node = str(tmp_path / "node")
+    local = _build(node)
+    remote = _publish(str(tmp_path / "builder"), target, **kwargs)
+
+    with pytest.raises(SnapshotRejected):
+        index_snapshot.pull_snapshot(target, node, embed_model_id=MODEL, embed_dimensions=0)
+
+    assert index_store.current_generation_id(node) == local
+    assert not os.path.exists(index_store.generation_dir(node, remote))
+
+
+def test_pull_rejects_unreadable_index_format(tmp_path, target):
+    node = str(tmp_path / "node")
+    remote = _publish(str(tmp_path / "builder"), target)
+    record_path = os.path.join(target.root, remote, index_snapshot.SNAPSHOT_FILE)
+    with open(record_path) as f:
+        record = json.load(f)
+    record["format_version"] = index_store.FORMAT_VERSION + 1
+    with open(record_path, "w") as f:
+        json.dump(record, f)
+
+    with pytest.raises(SnapshotRejected, match="index format"):
+        index_snapshot.pull_snapshot(target, node, embed_model_id=MODEL, embed_dimensions=0)
+    assert index_store.current_generation_id(node) is None
+
+
+def test_pull_rejects_older_snapshot_unless_allowed(tmp_path, target):
+    builder = str(tmp_path / "builder")
+    older = _publish(builder, target)
+    node = str(tmp_path / "node")
+    newer = _build(node)
+
+    with pytest.raises(SnapshotRejected, match="older"):
+        index_snapshot.pull_snapshot(target, node, embed_model_id=MODEL, embed_dimensions=0)
+    assert index_store.current_generation_id(node) == newer
+
+    index_snapshot.pull_snapshot(target, node, generation=older, embed_model_id=MODEL, allow_older=True)
+    assert index_store.current_generation_id(node) == older
+
+
+def test_pull_rejects_corrupted_file(tmp_path, target):
+    remote = _publish(str(tmp_path / "builder"), target)
+    with open(os.path.join(target.root, remote, index_store.INDEX_FILE), "ab") as f:
+        f.write(b"\0")
+    node = str(tmp_path / "node")
+
+    with pytest.raises(RuntimeError, match="checksum"):
+        index_snapshot.pull_snapshot(target, node)
+    assert index_store.current_generation_id(node) is None
+    assert not os.path.exists(index_store.generation_dir(node, remote))
@@ -0,0 +1,107 @@
+import itertools
+import os
+import socket
+import subprocess
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+import index_store
+from chunk_store import ChunkStore
+from conftest import unit_vectors
+
+
+@pytest.fixture(autouse=True)
+def ordered_generation_ids(monkeypatch):
+    counter = itertools.count(1)
+    monkeypatch.setattr(index_store, "new_generation_id", lambda: f"20260101T0000{next(counter):02d}Z-test")
+
+
+def _save(root, keep=2, fields=None):
+    vectors = unit_vectors(4)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    docstore = ChunkStore()
+    for doc_id in range(len(vectors)):
+        docstore[doc_id] = {"chunk": f"chunk {doc_id}", "source": "a.txt"}
+    return index_store.save_generation(root, index, docstore, fields or {}, keep=keep)["generation"]
+
+
+def _generations(root):
+    return sorted(os.listdir(os.path.join(root, index_store.GENERATIONS_DIR)))
+
+
+def _hold(root, generation, host, pid):
+    path = index_store._reader_path(root, host, pid)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(generation)
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_saving_keeps_current_and_the_newest_generations(index_root):
+    ids = [_save(index_root) for _ in range(4)]
+
+    assert index_store.current_generation_id(index_root) == ids[-1]
+    assert _generations(index_root) == ids[-2:]
+
+
+def test_generation_held_by_a_live_reader_is_not_pruned(index_root):
+    held = _save(index_root)
+    _hold(index_root, held, socket.gethostname(), os.getppid())
+    ids = [_save(index_root) for _ in range(3)]
+
+    assert _generations(index_root) == [held] + ids[-2:]
+
+    os.remove(index_store._reader_path(index_root, socket.gethostname(), os.getppid()))
+    _save(index_root)
+    assert held not in _generations(index_root)
+
+
+def test_dead_local_readers_are_dropped_and_remote_readers_kept(index_root):
+    first = _save(index_root)
+    second = _save(index_root)
+    _hold(index_root, first, socket.gethostname(), _dead_pid())
+    _hold(index_root, second, "other-host", 1234)
+
+    assert index_store.reader_generations(index_root) == [second]
+    assert os.listdir(os.path.join(index_root, index_store.READERS_DIR)) == ["other-host.1234"]
+
+
+def test_register_and_unregister_reader(index_root):
+    generation = _save(index_root)
+    index_store.register_reader(index_root, generation)
+    assert index_store.reader_generations(index_root) == [generation]
+
+    index_store.unregister_reader(index_root)
+    assert index_store.reader_generations(index_root) == []
+
+
+def test_worker_follows_current_published_by_another_process(index_root, monkeypatch):
+    import rag_service
+
+    monkeypatch.setattr(rag_service, "INDEX_DIR", index_root)
+    monkeypatch.setattr(rag_service, "RAG_GENERATION_CHECK_SECONDS", 0)
+    monkeypatch.setattr(rag_service, "_generation", None)
+    monkeypatch.setattr(rag_service, "_current_checked_at", 0.0)
+    monkeypatch.setattr(rag_service, "_current_mtime_ns", None)
+    fields = {"embed_model_id": rag_service.BEDROCK_EMBED_MODEL_ID, "embed_dimensions": rag_service.EMBED_DIMENSIONS}
+
+    first = _save(index_root, fields=fields)
+    assert rag_service.current_generation().id == first
+    assert index_store.reader_generations(index_root) == [first]
+
+    second = _save(index_root, fields=fields)
+    # Both saves may land within the file system's timestamp granularity
+    current = os.path.join(index_root, index_store.CURRENT_FILE)
+    os.utime(current, ns=(os.stat(current).st_atime_ns, os.stat(current).st_mtime_ns + 1_000_000_000))
+    assert rag_service.current_generation().id == second
+    assert index_store.reader_generations(index_root) == [second]
+    index_store.unregister_reader(index_root)
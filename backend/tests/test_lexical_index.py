@@ -0,0 +1,125 @@
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+from lexical_index import BM25Index, tokenize
+
+WORDS = "photosynthesis light energy triangle theorem capital india delhi cell गणित प्रकाश atom".split()
+
+
+def _reference(docs, query, k, k1=1.5, b=0.75):
+    """Plain-Python BM25 over ``docs`` (id -> text)."""
+    tokens = {doc_id: tokenize(text) for doc_id, text in docs.items()}
+    n = len(docs)
+    avgdl = sum(len(t) for t in tokens.values()) / n
+    scores = {}
+    for term in set(tokenize(query)):
+        holders = [doc_id for doc_id, toks in tokens.items() if term in toks]
+        idf = math.log(1.0 + (n - len(holders) + 0.5) / (len(holders) + 0.5))
+        for doc_id in holders:
+            tf = tokens[doc_id].count(term)
+            denom = tf + k1 * (1.0 - b + b * len(tokens[doc_id]) / avgdl)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / denom
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def _assert_matches(index, docs):
+    assert len(index) == len(docs)
+    for query in ("light energy", "triangle theorem capital", "गणित प्रकाश", "atom cell delhi", "unknown"):
+        got = index.search(query, 8)
+        expected = _reference(docs, query, 8)
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+        # Documents tied with the k-th score may be cut either way
+        cutoff = expected[-1][1] * (1 + 1e-5) if expected else 0.0
+        assert [d for d, s in got if s > cutoff] == [d for d, s in expected if s > cutoff]
+
+
+def _corpus(start, count, seed):
+    rng = random.Random(seed)
+    return {doc_id: " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) for doc_id in range(start, start + count)}
+
+
+def test_search_matches_reference_bm25():
+    docs = _corpus(0, 60, seed=1)
+    _assert_matches(BM25Index.from_texts(docs.items()), docs)
+
+
+def test_removed_documents_are_not_returned():
+    docs = _corpus(0, 60, seed=2)
+    index = BM25Index.from_texts(docs.items())
+    for doc_id in range(0, 60, 3):
+        index.remove(doc_id)
+        del docs[doc_id]
+    index.remove(10_000)  # unknown ids are ignored
+    _assert_matches(index, docs)
+
+
+def test_saved_index_is_memory_mapped_and_accepts_changes(tmp_path):
+    docs = _corpus(0, 80, seed=3)
+    index = BM25Index.from_texts(docs.items())
+    for doc_id in (5, 6, 7):
+        index.remove(doc_id)
+        del docs[doc_id]
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert isinstance(loaded._doc_ids, np.memmap)
+    _assert_matches(loaded, docs)
+
+    # Changes after loading go to the append segment and tombstones
+    for doc_id in (0, 40, 79):
+        loaded.remove(doc_id)
+        del docs[doc_id]
+    extra = _corpus(100, 20, seed=4)
+    for doc_id, text in extra.items():
+        loaded.add(doc_id, text)
+    docs.update(extra)
+    loaded.remove(105)
+    del docs[105]
+    _assert_matches(loaded, docs)
+
+    loaded.save(str(tmp_path / "next"))
+    _assert_matches(BM25Index.load(str(tmp_path / "next")), docs)
+
+
+def test_search_can_be_restricted_to_allowed_ids():
+    docs = _corpus(0, 40, seed=5)
+    index = BM25Index.from_texts(docs.items())
+    allowed = set(range(10, 20))
+    hits = index.search("light energy atom cell", 40, allowed=allowed)
+    expected = _reference({i: docs[i] for i in allowed}, "light energy atom cell", 40)
+    # idf and avgdl come from the whole index, so compare membership only
+    assert {doc_id for doc_id, _ in hits} == {doc_id for doc_id, _ in expected}
+
+
+def test_ids_must_increase():
+    index = BM25Index.from_texts([(5, "light")])
+    with pytest.raises(ValueError):
+        index.add(5, "energy")
+
+
+def test_legacy_npz_index_is_readable(tmp_path):
+    docs = _corpus(0, 30, seed=6)
+    # Layout written before format 4: insertion-ordered terms and postings in one .npz
+    postings = {}
+    for doc_id, text in docs.items():
+        for term in tokenize(text):
+            postings.setdefault(term, {}).setdefault(doc_id, 0)
+            postings[term][doc_id] += 1
+    terms = list(postings)
+    offsets = np.cumsum([0] + [len(postings[t]) for t in terms]).astype("int64")
+    path = str(tmp_path / "lexical.npz")
+    np.savez(
+        path,
+        terms=np.frombuffer(json.dumps(terms, ensure_ascii=False).encode("utf-8"), dtype="uint8"),
+        offsets=offsets,
+        doc_ids=np.array([d for t in terms for d in postings[t]], dtype="int64"),
+        tfs=np.array([tf for t in terms for tf in postings[t].values()], dtype="int32"),
+        len_ids=np.array(list(docs)[::-1], dtype="int64"),
+        lens=np.array([len(tokenize(docs[d])) for d in list(docs)[::-1]], dtype="int32"),
+        params=np.array([1.5, 0.75]),
+    )
+    _assert_matches(BM25Index.load_legacy(path), docs)
@@ -0,0 +1,67 @@
+from io import BytesIO
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+import pdf_extract
+
+
+def _pdf(pages):
+    """A PDF whose page ``i`` shows the text ``page i`` (1-based)."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for i in range(1, pages + 1):
+        page = writer.add_blank_page(width=200, height=200)
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 20 100 Td (page {i}) Tj ET".encode("ascii"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)}),
+        })
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pdf_extract, "PDF_WORKERS", 2)
+    monkeypatch.setattr(pdf_extract, "PDF_PAGES_PER_TASK", 3)
+    pdf_extract.shutdown_pool()
+    yield
+    pdf_extract.shutdown_pool()
+
+
+def _expected(pages):
+    return [(i, f"page {i}") for i in range(1, pages + 1)]
+
+
+@pytest.mark.parametrize("pages", [2, 3, 10])
+def test_pages_come_back_in_order(pool, tmp_path, pages):
+    assert pdf_extract.extract_pdf_pages(_pdf(pages), spill_dir=str(tmp_path)) == _expected(pages)
+    assert list(tmp_path.iterdir()) == []  # the spill file is removed
+
+
+def test_pdf_is_not_parsed_on_the_calling_thread(pool, monkeypatch):
+    def refuse(source):
+        raise AssertionError("parsed in the caller")
+
+    # Pool workers import their own copy of the module
+    monkeypatch.setattr(pdf_extract, "_open_reader", refuse)
+    assert pdf_extract.extract_pdf_pages(_pdf(7)) == _expected(7)
+
+
+def test_broken_pool_is_replaced_and_the_document_retried(pool):
+    broken = pdf_extract._get_pool()
+    assert broken.submit(int, "1").result() == 1  # start the workers
+    for process in list(broken._processes.values()):
+        process.kill()
+        process.join()
+
+    assert pdf_extract.extract_pdf_pages(_pdf(4)) == _expected(4)
+    assert pdf_extract._get_pool() is not broken
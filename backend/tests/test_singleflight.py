@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+def _run_concurrently(flight, fn, callers=5):
+    """Start ``callers`` calls of ``fn`` under one key; return their futures once all have joined."""
+    pool = ThreadPoolExecutor(max_workers=callers)
+    futures = [pool.submit(flight.do, "key", fn)]
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    futures += [pool.submit(flight.do, "key", fn) for _ in range(callers - 1)]
+    _wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+    pool.shutdown(wait=False)
+    return futures
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    futures = _run_concurrently(flight, fn)
+    release.set()
+
+    assert [f.result(5) for f in futures] == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+def test_leader_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("throttled")
+
+    futures = _run_concurrently(flight, failing)
+    release.set()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="throttled"):
+            future.result(5)
+    assert flight.stats()["in_flight"] == 0
+    # The failure is forgotten: the next caller runs the function again
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats() == {"in_flight": 0, "calls": 2, "coalesced": 0}
+
+
+def test_async_callers_share_one_call():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fn) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+def test_async_leader_error_reaches_every_waiter_and_is_not_cached():
+    flight = AsyncSingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("throttled")
+
+    async def recovered():
+        return "recovered"
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(5)), return_exceptions=True)
+        return results, await flight.do("key", recovered)
+
+    results, retried = asyncio.run(main())
+    assert all(isinstance(r, ValueError) and str(r) == "throttled" for r in results)
+    assert retried == "recovered"
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_cancelled_waiter_does_not_cancel_the_shared_call():
+    flight = AsyncSingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", fn))
+        second = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("answer", True)
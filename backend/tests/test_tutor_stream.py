@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import ai_tutor
+import api_routes
+import bedrock_gateway
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(bedrock_gateway, "stream_text", lambda *args, **kwargs: iter(["Photo", "synthesis"]))
+    return TestClient(api_routes.app)
+
+
+def _auth():
+    return {"Authorization": "Bearer " + api_routes.generate_token("a@example.com", "student", "A", "u1")}
+
+
+def test_tutor_answer_streams_and_saves_the_chat(client, monkeypatch):
+    saved = []
+    monkeypatch.setattr(ai_tutor, "save_chat_to_dynamo", lambda *args: saved.append(args))
+
+    response = client.post("/tutor/ask/stream", json={"question": "What is photosynthesis?"}, headers=_auth())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: token", "event: token", "event: done"]
+    assert saved == [("u1", "What is photosynthesis?", "Photosynthesis", None)]
+
+
+def test_tutor_stream_needs_a_question_and_a_token(client):
+    assert client.post("/tutor/ask/stream", json={"question": " "}, headers=_auth()).status_code == 400
+    assert client.post("/tutor/ask/stream", json={"question": "hi"}).status_code in (401, 403)